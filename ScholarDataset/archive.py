@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 23:10
+# @File    : archive.py
+import hashlib
+import json
+import os
+import time
+import zlib
+
+compress_level = 6
+
+
+def encode_content(content) -> tuple:
+    """
+    :param content: item['content']：ACM为HTML文本，IEEExplore为元数据字典，Web of Science为导出文件的字节串
+    :return: (类型, 字节串)
+    """
+    if isinstance(content, bytes):
+        return 'bytes', content
+    if isinstance(content, str):
+        return 'text', content.encode('utf-8')
+    return 'json', json.dumps(content, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+
+def decode_content(kind: str, data: bytes):
+    if kind == 'bytes':
+        return data
+    if kind == 'text':
+        return data.decode('utf-8')
+    return json.loads(data.decode('utf-8'))
+
+
+class ResponseArchive:
+    """
+    爬虫下载的原始内容的本地存档，供离线重放。目录结构：
+        objects/ab/cdef...：以内容的sha256命名、zlib压缩的原始内容，相同的内容只存一份
+        index/爬虫名.jsonl：每行一条{query, paper_id, digest, kind, time}，同一题目以最后一条为准
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index_files = {}  # {爬虫名: 追加写入的索引文件}
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'index'), exist_ok=True)
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:])
+
+    def index_path(self, source: str) -> str:
+        return os.path.join(self.root, 'index', source + '.jsonl')
+
+    def put(self, source: str, query: str, paper_id, content) -> str:
+        """
+        :return: 内容的sha256
+        """
+        kind, data = encode_content(content)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(data, compress_level))
+            os.replace(temp_path, path)
+        # 内容写完之后再写索引，中断时索引不会指向不存在的内容
+        index_file = self.index_files.get(source)
+        if index_file is None:
+            index_file = self.index_files[source] = open(self.index_path(source), 'a', encoding='utf-8')
+        index_file.write(json.dumps({'query': query, 'paper_id': paper_id, 'digest': digest, 'kind': kind,
+                                     'time': time.time()}, ensure_ascii=False) + '\n')
+        index_file.flush()
+        return digest
+
+    def load_index(self, source: str) -> dict:
+        """
+        :return: {题目: 最新的索引条目}，忽略写了一半的行
+        """
+        entries = {}
+        if not os.path.exists(self.index_path(source)):
+            return entries
+        with open(self.index_path(source), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[entry['query']] = entry
+        return entries
+
+    def read(self, entry: dict):
+        """
+        :param entry: load_index返回的索引条目
+        :return: 与存档时相同的item['content']
+        """
+        with open(self.object_path(entry['digest']), 'rb') as f:
+            return decode_content(entry['kind'], zlib.decompress(f.read()))
+
+    def close(self):
+        for index_file in self.index_files.values():
+            index_file.close()
+        self.index_files.clear()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 22:40
+# @File    : extensions.py
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet.task import LoopingCall
+from ScholarDataset.metrics import stage_metrics
+
+
+class MetricsExporter:
+    """
+    每隔METRICS_INTERVAL秒把stage_metrics写入Scrapy stats（只计本次爬取的部分）和METRICS_FILE（Prometheus文本格式，
+    从进程启动起累计），爬虫结束时再导出一次
+    """
+
+    def __init__(self, stats, path: str, interval: float):
+        self.stats = stats
+        self.path = path
+        self.interval = interval
+        self.baseline = {}
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        interval = crawler.settings.getfloat('METRICS_INTERVAL', 30)
+        if interval <= 0:
+            raise NotConfigured
+        exporter = cls(crawler.stats, crawler.settings.get('METRICS_FILE', 'crawl_metrics.prom'), interval)
+        crawler.signals.connect(exporter.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(exporter.spider_closed, signal=signals.spider_closed)
+        return exporter
+
+    def spider_opened(self, spider):
+        self.baseline = stage_metrics.snapshot()
+        self.task = LoopingCall(self.export)
+        self.task.start(self.interval, now=False)
+
+    def export(self):
+        for key, value in stage_metrics.snapshot().items():
+            if value != self.baseline.get(key, 0):
+                self.stats.set_value(key, value - self.baseline.get(key, 0))
+        if self.path:
+            stage_metrics.write_prometheus(self.path)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.export()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 20:30
+# @File    : extractors.py
+import io
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+from lxml import etree
+import pandas as pd
+from twisted.internet import defer, reactor
+
+acm_entry_class = 'search__item issue-item-container'  # 搜索结果条目<li>的class
+acm_title_class = 'rlist organizational-chart'  # 论文题目所在<ol>的class
+acm_author_class = 'loa__item'  # 作者条目<li>的class之一
+
+# Web of Science导出文件中用到的字段：{制表符分隔格式中的字段标签: Excel格式中的列名}
+wos_fields = {'TI': 'Article Title', 'AU': 'Authors', 'AF': 'Author Full Names', 'C1': 'Addresses',
+              'RP': 'Reprint Addresses', 'EM': 'Email Addresses'}
+excel_magic_numbers = (b'\xd0\xcf\x11\xe0', b'PK\x03\x04')  # xls、xlsx文件的开头
+
+process_pool = None  # run_in_process使用的进程池，由start_process_pool创建
+
+
+def class_equals(class_value: str, class_name: str) -> bool:
+    """
+    与BeautifulSoup的find(class_='a b')相同：class属性去掉多余空白后与给定的字符串完全相等
+    """
+    return ' '.join(class_value.split()) == class_name
+
+
+def class_contains(class_value: str, class_name: str) -> bool:
+    """
+    与BeautifulSoup的find_all(class_='a')相同：class属性中含有该类名
+    """
+    return class_name in class_value.split()
+
+
+def find_elements(html: str, tag: str, class_match) -> List[etree.ElementBase]:
+    """
+    只解析页面中需要的元素：用正则表达式找到class属性符合class_match(class属性)的<tag>开始标签，按同名标签的嵌套
+    找到对应的结束标签，只把这一段交给lxml解析，页面其余部分不建立元素
+    :return: 选中的元素，按在页面中出现的顺序；每个元素各自是一棵独立的树
+    """
+    start_tags = re.compile(rf'<{tag}\s(?:[^>]*?\s)?class\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))',
+                            re.IGNORECASE)
+    tags = re.compile(rf'<(/?){tag}\b', re.IGNORECASE)
+    elements = []
+    for start_tag in start_tags.finditer(html):
+        if not class_match(next(value for value in start_tag.groups() if value is not None)):
+            continue
+        start = start_tag.start()
+        end = len(html)  # 没有结束标签时解析到页面末尾
+        depth = 0
+        for match in tags.finditer(html, start):
+            depth += -1 if match.group(1) else 1
+            if depth == 0:
+                end = html.find('>', match.end()) + 1 or len(html)
+                break
+        element = next(etree.HTML(html[start:end]).iter(tag), None)
+        if element is not None:
+            elements.append(element)
+    return elements
+
+
+def text_content(element: etree.ElementBase) -> str:
+    """
+    :return: 元素及其后代的全部文本，与BeautifulSoup的element.text相同
+    """
+    return ''.join(element.itertext())
+
+
+def first_descendant(element: etree.ElementBase, tag: str) -> etree.ElementBase:
+    """
+    :return: element下第一个名为tag的后代元素，与BeautifulSoup的element.tag相同，找不到时返回None
+    """
+    return next(element.iterdescendants(tag), None)
+
+
+def extract_acm_entries(html: str) -> List[Tuple[str, str]]:
+    """
+    :param html: ACM搜索结果页面
+    :return: [(题目, 链接), ...]，按搜索结果的顺序，链接为网站内的相对路径
+    """
+    entries = []
+    for entry in find_elements(html, 'li', lambda class_value: class_equals(class_value, acm_entry_class)):
+        heading = first_descendant(entry, 'h5')
+        link = first_descendant(heading if heading is not None else entry, 'a')
+        if link is None:
+            link = first_descendant(entry, 'a')
+        if link is not None and link.get('href'):
+            entries.append((text_content(link), link.get('href')))
+    return entries
+
+
+def extract_acm_article(html: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    :param html: ACM论文页面
+    :return: (论文题目, [(作者全名, 大学), ...])
+    """
+    chart = find_elements(html, 'ol', lambda class_value: class_equals(class_value, acm_title_class))[0]
+    title = text_content(first_descendant(first_descendant(chart, 'li'), 'h6'))
+    authors = []
+    for entry in find_elements(html, 'li', lambda class_value: class_contains(class_value, acm_author_class)):
+        full_name = first_descendant(entry, 'a').attrib['title']
+        university = text_content(first_descendant(entry, 'p')).split(',')[-1]
+        authors.append((full_name, university))
+    return title, authors
+
+
+def parse_wos_record(content: bytes) -> dict:
+    """
+    :param content: Web of Science导出的单条记录，制表符分隔格式（saveToFile）或Excel格式（saveToExcel）
+    :return: {Excel格式中的列名: 值}，只包含wos_fields中的字段，缺失的值为空字符串
+    """
+    if content.startswith(excel_magic_numbers):
+        row = pd.read_excel(io.BytesIO(content)).iloc[0]
+        return {column: '' if pd.isna(row.get(column)) else str(row[column]) for column in wos_fields.values()}
+    # 只按换行符分行：splitlines还会在\x0b、\x1c、\u2028等字符处断开，而这些字符可能出现在摘要等字段中
+    lines = [line[:-1] if line.endswith('\r') else line for line in content.decode('utf-8-sig').split('\n')]
+    header = lines[0].split('\t')
+    values = lines[1].split('\t')
+    record = dict(zip(header, values))
+    return {column: record.get(tag, '') for tag, column in wos_fields.items()}
+
+
+def start_process_pool(processes: int):
+    """
+    创建run_in_process使用的进程池，processes为0时不使用进程池
+    """
+    global process_pool
+    if processes > 0 and process_pool is None:
+        process_pool = ProcessPoolExecutor(processes)
+
+
+def stop_process_pool():
+    global process_pool
+    if process_pool is not None:
+        process_pool.shutdown(wait=False)
+        process_pool = None
+
+
+def run_in_process(function, *args) -> defer.Deferred:
+    """
+    在进程池中执行function(*args)，reactor线程不必等待解析；没有进程池时直接执行
+    :return: 以function的结果触发的Deferred
+    """
+    if process_pool is None:
+        return defer.maybeDeferred(function, *args)
+    d = defer.Deferred()
+
+    def done(future):
+        error = future.exception()
+        if error is None:
+            reactor.callFromThread(d.callback, future.result())
+        else:
+            reactor.callFromThread(d.errback, error)
+
+    process_pool.submit(function, *args).add_done_callback(done)
+    return d
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 22:10
+# @File    : matching.py
+import re
+from difflib import SequenceMatcher
+from typing import Any, Iterable, Optional, Tuple
+
+tag_pattern = re.compile(r'<[^>]+>')  # 搜索结果中的题目可能带有<i>、<highlight>等标签
+min_title_score = 0.9  # 题目得分不低于该值时认为是同一篇论文
+
+
+def normalize_title(title: str) -> str:
+    """
+    :return: 去掉标签后只保留字母并转为小写的题目，标点、空格、数字的差异不影响比较
+    """
+    return ''.join(filter(str.isalpha, tag_pattern.sub('', title).lower()))
+
+
+def title_score(expect: str, got: str) -> float:
+    """
+    :param expect: 经过normalize_title的期待题目
+    :param got: 经过normalize_title的候选题目
+    :return: 0到1之间的得分：
+        完全相等为1；
+        一方是另一方的前缀（多为副标题有无的差别）时在[0.9, 1)之间，总能达到min_title_score；
+        一方包含另一方时在[0.8, 0.9)之间；
+        其余情况及以上得分较低时取两者的相似度（SequenceMatcher.ratio）
+    """
+    if expect == got:
+        return 1.0
+    short, long = (expect, got) if len(expect) <= len(got) else (got, expect)
+    coverage = len(short) / len(long)
+    if long.startswith(short):
+        return 0.9 + 0.1 * coverage
+    score = 0.8 + 0.1 * coverage if short in long else 0.0
+    matcher = SequenceMatcher(None, expect, got, autojunk=False)
+    if matcher.real_quick_ratio() > score and matcher.quick_ratio() > score:
+        score = max(score, matcher.ratio())
+    return score
+
+
+def is_prefix_match(expect: str, got: str) -> bool:
+    """
+    :return: 经过normalize_title的两个题目中一方是另一方的前缀，即pipelines.is_same_title的判断
+    """
+    return expect.startswith(got) or got.startswith(expect)
+
+
+class TitleMatcher:
+    """
+    在一次搜索返回的所有候选中找出与期待题目最接近的一个，只需要抓取这一个的详情页面
+
+    默认只接受与期待题目互为前缀的候选，与pipeline中is_same_title的判断一致，得分只用于在其中排序；
+    fuzzy为True（TITLE_FUZZY_MATCH）时得分达到threshold的候选也被接受
+    """
+
+    def __init__(self, expect_title: str, threshold: float = min_title_score, fuzzy: bool = False):
+        self.expect = normalize_title(expect_title)
+        self.threshold = threshold
+        self.fuzzy = fuzzy
+
+    def score(self, title: str) -> float:
+        return title_score(self.expect, normalize_title(title))
+
+    def accepts(self, normalized: str, score: float) -> bool:
+        if self.fuzzy:
+            return score >= self.threshold
+        return is_prefix_match(self.expect, normalized)
+
+    def is_match(self, title: str) -> bool:
+        normalized = normalize_title(title)
+        return self.accepts(normalized, title_score(self.expect, normalized))
+
+    def best(self, candidates: Iterable[Tuple[str, Any]]) -> Optional[Tuple[float, str, Any]]:
+        """
+        :param candidates: [(候选题目, 附带的数据，如详情页面的链接), ...]，按搜索结果的顺序
+        :return: (得分, 题目, 附带的数据)，得分相同时取排在前面的；没有可接受的候选时返回None
+        """
+        best = None
+        for title, payload in candidates:
+            normalized = normalize_title(title)
+            if not normalized:  # 空题目是任何题目的前缀，不能作为候选
+                continue
+            score = title_score(self.expect, normalized)
+            if self.accepts(normalized, score) and (best is None or score > best[0]):
+                best = (score, title, payload)
+                if score == 1.0:
+                    break
+        return best
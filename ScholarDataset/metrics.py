@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 22:40
+# @File    : metrics.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 各阶段耗时直方图的桶上界（秒），最后还有一个+Inf桶
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(latency_buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(latency_buckets):
+            if seconds <= bound:
+                break
+        else:
+            i = len(latency_buckets)
+        self.bucket_counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class StageMetrics:
+    """
+    爬取、更新过程中各阶段（stage）按来源（source，即爬虫名）的次数、耗时直方图、出错次数，以及item被丢弃的原因。
+    数据库写入在连接池的线程中记录，所以所有操作都加锁。数值从进程启动起累计，由extensions.MetricsExporter定期导出
+    """
+
+    def __init__(self):
+        self.histograms = {}  # {(stage, source): Histogram}
+        self.errors = {}  # {(stage, source): 出错次数}
+        self.drops = {}  # {(source, reason): 丢弃的item数}
+        self.lock = threading.Lock()
+
+    def observe(self, stage: str, source: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get((stage, source))
+            if histogram is None:
+                histogram = self.histograms[(stage, source)] = Histogram()
+            histogram.observe(seconds)
+
+    def error(self, stage: str, source: str):
+        with self.lock:
+            self.errors[(stage, source)] = self.errors.get((stage, source), 0) + 1
+
+    def drop(self, source: str, reason: str):
+        with self.lock:
+            self.drops[(source, reason)] = self.drops.get((source, reason), 0) + 1
+
+    @contextmanager
+    def timer(self, stage: str, source: str):
+        """
+        记录with语句块的耗时；语句块抛出异常时同时记一次出错
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.error(stage, source)
+            raise
+        finally:
+            self.observe(stage, source, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """
+        :return: {Scrapy stats的键: 累计值}
+        """
+        values = {}
+        with self.lock:
+            for (stage, source), histogram in self.histograms.items():
+                values[f'metrics/{source}/{stage}/count'] = histogram.count
+                values[f'metrics/{source}/{stage}/seconds'] = histogram.sum
+            for (stage, source), count in self.errors.items():
+                values[f'metrics/{source}/{stage}/errors'] = count
+            for (source, reason), count in self.drops.items():
+                values[f'metrics/{source}/dropped/{reason}'] = count
+        return values
+
+    def to_prometheus(self) -> str:
+        """
+        :return: Prometheus文本格式的全部指标
+        """
+        lines = ['# HELP scholar_stage_seconds Latency of each crawl/update stage.',
+                 '# TYPE scholar_stage_seconds histogram']
+        with self.lock:
+            for (stage, source), histogram in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",source="{source}"'
+                cumulative = 0
+                for bound, count in zip(latency_buckets + ('+Inf',), histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'scholar_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'scholar_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'scholar_stage_seconds_count{{{labels}}} {histogram.count}')
+            lines += ['# HELP scholar_stage_errors_total Stage runs that raised an exception.',
+                      '# TYPE scholar_stage_errors_total counter']
+            for (stage, source), count in sorted(self.errors.items()):
+                lines.append(f'scholar_stage_errors_total{{stage="{stage}",source="{source}"}} {count}')
+            lines += ['# HELP scholar_dropped_items_total Queries or items that were not written, by reason.',
+                      '# TYPE scholar_dropped_items_total counter']
+            for (source, reason), count in sorted(self.drops.items()):
+                lines.append(f'scholar_dropped_items_total{{source="{source}",reason="{reason}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """
+        先写临时文件再替换，node_exporter等读取时不会读到写了一半的文件
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+
+stage_metrics = StageMetrics()  # 进程内共用
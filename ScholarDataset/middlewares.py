@@ -3,12 +3,24 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import logging
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
 
+logger = logging.getLogger(__name__)
+
+# 出现这些内容的页面是验证码或人机验证页面，而不是正常的结果
+captcha_markers = (b'g-recaptcha', b'h-captcha', b'cf-chl-', b'captcha-delivery', b'Incapsula incident',
+                   b'<title>Just a moment...</title>')
+captcha_scan_bytes = 65536  # 只检查页面开头的部分
+throttle_statuses = (429, 503)
+
+
 class ScholardatasetSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the spider middleware does not modify the
@@ -18,7 +30,7 @@ class ScholardatasetSpiderMiddleware:
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
         s = cls()
-        crawler.signals.__connection_config(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
     def process_spider_input(self, response, spider):
@@ -65,7 +77,7 @@ class ScholardatasetDownloaderMiddleware:
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
         s = cls()
-        crawler.signals.__connection_config(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
     def process_request(self, request, spider):
@@ -101,3 +113,176 @@ class ScholardatasetDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class SourceBudget:
+    """
+    一个来源（网站）的并发数和请求速率。按AIMD调整：每个窗口内延迟和错误率正常时速率加上rate_step、并发数加1；
+    窗口内不正常或遇到限流时，速率和并发数减半
+    """
+
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.domains = config['domains']
+        self.min_rate = 1 / config.get('max_delay', 60)
+        self.max_rate = 1 / config.get('min_delay', 0.25)
+        self.max_concurrency = config.get('max_concurrency', 8)
+        self.rate = min(max(1 / config.get('delay', 2), self.min_rate), self.max_rate)  # 每秒请求数
+        self.concurrency = min(config.get('concurrency', 1), self.max_concurrency)
+        self.responses = 0  # 当前窗口内的响应数（包括下载出错）
+        self.errors = 0
+        self.latency = 0.0
+
+    def matches(self, host: str) -> bool:
+        return any(host == domain or host.endswith('.' + domain) for domain in self.domains)
+
+    def record(self, latency: float, error: bool):
+        self.responses += 1
+        self.errors += error
+        self.latency += latency
+
+    def reset_window(self):
+        self.responses = 0
+        self.errors = 0
+        self.latency = 0.0
+
+    def increase(self, rate_step: float):
+        self.rate = min(self.rate + rate_step, self.max_rate)
+        self.concurrency = min(self.concurrency + 1, self.max_concurrency)
+
+    def decrease(self, min_interval: float = 0.0):
+        """
+        :param min_interval: 请求间隔至少为该秒数，来自Retry-After
+        """
+        self.rate = max(self.rate / 2, self.min_rate)
+        if min_interval > 0:
+            self.rate = max(min(self.rate, 1 / min_interval), self.min_rate)
+        self.concurrency = max(self.concurrency // 2, 1)
+
+
+class AdaptiveRateMiddleware:
+    """
+    为ieeexplore、dl.acm.org、webofknowledge各自维护并发数和请求速率（RATE_CONTROL_SOURCES），代替统一的
+    CONCURRENT_REQUESTS和DOWNLOAD_DELAY。同一来源的请求放在同一个下载槽（download_slot）中，调整的是该槽的
+    concurrency和delay；当前的速率、并发数和限流次数写入Scrapy stats的rate_control/来源/...
+
+    放在RetryMiddleware（550）和HttpCompressionMiddleware（590）之间：响应先解压再检查验证码标记，429/503响应先经过这里
+    再被重试。不能用600，那是RedirectMiddleware的位置
+    """
+
+    def __init__(self, crawler, sources: dict, window: int, target_latency: float, max_error_rate: float,
+                 rate_step: float, max_captcha_retries: int):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.budgets = [SourceBudget(name, config) for name, config in sources.items()]
+        self.window = window
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.rate_step = rate_step
+        self.max_captcha_retries = max_captcha_retries
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('RATE_CONTROL_ENABLED'):
+            raise NotConfigured
+        middleware = cls(crawler,
+                         settings.getdict('RATE_CONTROL_SOURCES'),
+                         settings.getint('RATE_CONTROL_WINDOW', 20),
+                         settings.getfloat('RATE_CONTROL_TARGET_LATENCY', 5.0),
+                         settings.getfloat('RATE_CONTROL_MAX_ERROR_RATE', 0.05),
+                         settings.getfloat('RATE_CONTROL_RATE_STEP', 0.1),
+                         settings.getint('RATE_CONTROL_MAX_CAPTCHA_RETRIES', 3))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        return middleware
+
+    def spider_opened(self, spider):
+        for budget in self.budgets:
+            self.update_stats(budget)
+
+    def get_budget(self, request) -> SourceBudget:
+        host = urlparse_cached(request).hostname or ''
+        for budget in self.budgets:
+            if budget.matches(host):
+                return budget
+        return None
+
+    def apply(self, budget: SourceBudget):
+        """
+        把预算写入下载槽；槽在第一个请求进入下载器时才建立，之前使用DOWNLOAD_DELAY和CONCURRENT_REQUESTS_PER_DOMAIN
+        """
+        slot = self.crawler.engine.downloader.slots.get(budget.name)
+        if slot is not None:
+            slot.delay = 1 / budget.rate
+            slot.concurrency = budget.concurrency
+
+    def update_stats(self, budget: SourceBudget):
+        self.stats.set_value(f'rate_control/{budget.name}/rate', round(budget.rate, 3))
+        self.stats.set_value(f'rate_control/{budget.name}/concurrency', budget.concurrency)
+
+    def adjust(self, budget: SourceBudget, increase: bool, min_interval: float = 0.0):
+        if increase:
+            budget.increase(self.rate_step)
+        else:
+            budget.decrease(min_interval)
+            self.stats.inc_value(f'rate_control/{budget.name}/backoffs')
+            logger.warning(f'{budget.name}限流，速率降为每秒{budget.rate:.3f}个请求，并发数{budget.concurrency}')
+        budget.reset_window()
+        self.apply(budget)
+        self.update_stats(budget)
+
+    def observe(self, budget: SourceBudget, latency: float, error: bool):
+        budget.record(latency, error)
+        if budget.responses >= self.window:
+            healthy = budget.errors / budget.responses <= self.max_error_rate and \
+                      budget.latency / budget.responses <= self.target_latency
+            self.adjust(budget, healthy)
+
+    def process_request(self, request, spider):
+        budget = self.get_budget(request)
+        if budget is not None:
+            request.meta.setdefault('download_slot', budget.name)
+            self.apply(budget)
+        return None
+
+    def process_response(self, request, response, spider):
+        budget = self.get_budget(request)
+        if budget is None:
+            return response
+        latency = request.meta.get('download_latency', 0.0)
+        if response.status in throttle_statuses:
+            self.adjust(budget, False, self.retry_after(response))
+            return response
+        if self.is_captcha(response):
+            self.stats.inc_value(f'rate_control/{budget.name}/captchas')
+            self.adjust(budget, False)
+            retries = request.meta.get('captcha_retries', 0)
+            if retries < self.max_captcha_retries:
+                retry_request = request.copy()
+                retry_request.meta['captcha_retries'] = retries + 1
+                retry_request.dont_filter = True
+                return retry_request
+            return response
+        self.observe(budget, latency, response.status >= 500)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        budget = self.get_budget(request)
+        if budget is not None:
+            self.observe(budget, request.meta.get('download_latency', 0.0), True)
+        return None
+
+    @staticmethod
+    def retry_after(response) -> float:
+        value = response.headers.get('Retry-After')
+        try:
+            return float(value) if value is not None else 0.0
+        except ValueError:  # HTTP日期格式，不解析
+            return 0.0
+
+    @staticmethod
+    def is_captcha(response) -> bool:
+        if response.status != 200:
+            return False
+        head = response.body[:captcha_scan_bytes]
+        return any(marker in head for marker in captcha_markers)
@@ -8,13 +8,21 @@
 import re
 import pymysql
 import json
-import pandas as pd
-from pymysql.converters import escape_string
-from scrapy.exceptions import DropItem
+from scrapy.exceptions import DropItem, NotConfigured
 import logging
+import threading
+import time
 import traceback
-from bs4 import BeautifulSoup
+from collections import OrderedDict
 from typing import List
+from twisted.enterprise import adbapi
+from twisted.internet import defer
+from twisted.python.failure import Failure
+from ScholarDataset.archive import ResponseArchive
+from ScholarDataset.extractors import extract_acm_article, parse_wos_record, run_in_process, start_process_pool, \
+    stop_process_pool
+from ScholarDataset.matching import TitleMatcher
+from ScholarDataset.metrics import stage_metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.INFO)
@@ -25,6 +33,10 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.propagate = False
 
+trailing_digit_pattern = re.compile(r'[0-9]$')  # researcher表中重名者的姓名末尾带有消歧数字
+name_index_batch_size = 1000  # ResearcherNameIndex一次查询的论文数上限
+missing_email = 'nan'  # Web of Science记录没有邮箱时第一个作者的邮箱，与之前的数据保持一致
+
 
 class Author:
     abbr_name = ''
@@ -37,164 +49,414 @@ class Author:
     researcher_id = None
 
 
-def is_same_title(expect_title: str, got_title: str) -> bool:
+def is_same_title(expect_title: str, got_title: str, fuzzy: bool = False) -> bool:
     """
     :param expect_title: 期待的目标题目
     :param got_title: 实际得到的题目
+    :param fuzzy: 为True时两者足够相似（见matching.title_score）也返回True，对应TITLE_FUZZY_MATCH
     :return: 如果其中一方以另一方为前缀，则返回True；否则返回False
     """
+    if fuzzy:
+        return TitleMatcher(expect_title, fuzzy=True).is_match(got_title)
     cond = lambda c: str.isalpha(c)
     expect_chars = ''.join(list(filter(cond, expect_title.lower())))
     got_chars = ''.join(list(filter(cond, got_title.lower())))
     return expect_chars.startswith(got_chars) or got_chars.startswith(expect_chars)
 
 
-def is_same_name(name1: str, name2: str) -> bool:
-    """
-    :param name1: 第一个名字
-    :param name2: 第二个名字
-    :return: 两名字相等返回True，否则False（注意姓和名的先后顺序不影响）
-    """
-    return name1 == name2 or ' '.join(name1.split(' ')[::-1]) == name2
-
-
 def update_sql_from_author_list(conn: pymysql.connections.Connection, author_list: List[Author], paper_id: int):
     """
     :param conn: 数据库连接
     :param author_list: 作者列表
     :param paper_id: 论文id
-    :return: None，有可能抛出sql数据库的异常
+    :return: None，有可能抛出sql数据库的异常。所有修改在同一个事务中完成，出错时全部回滚
+    """
+    # UPDATE有rid的Author，没有rid关联的情况，暂时忽略掉
+    authors = [author for author in author_list if author.researcher_id]
+    if not authors:
+        return
+    try:
+        with conn.cursor() as cursor:
+            author_ids = resolve_author_ids(cursor, authors)
+            updates = get_author_paper_updates(cursor, authors, author_ids, paper_id)
+            apply_author_paper_updates(cursor, updates, paper_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f'成功更新pid={paper_id}的{len(updates)}条author_paper记录')
+
+
+def resolve_author_ids(cursor: pymysql.cursors.Cursor, authors: List[Author]) -> List[int]:
+    """
+    :param cursor: 数据库游标
+    :param authors: 有rid的作者列表
+    :return: 每个作者对应的author id。邮箱、机构等信息与已有的作者相同时取已有的id，否则插入新的作者
+    """
+    author_ids = []
+    # 同一rid的作者先后出现时，后一个可能匹配到前一个刚插入的作者，因此按rid不重复的连续片段依次处理
+    segment, segment_rids = [], set()
+    for author in authors + [None]:
+        if author is not None and author.researcher_id not in segment_rids:
+            segment.append(author)
+            segment_rids.add(author.researcher_id)
+            continue
+        found = select_author_ids(cursor, segment)
+        missing = [author_ for author_ in segment if author_ not in found]
+        if missing:
+            insert_authors(cursor, missing)
+            found.update(select_author_ids(cursor, missing))
+        author_ids.extend(found[author_] for author_ in segment)
+        segment, segment_rids = [author], {author.researcher_id} if author is not None else set()
+    return author_ids
+
+
+def select_author_ids(cursor: pymysql.cursors.Cursor, authors: List[Author]) -> dict:
+    """
+    :return: {Author: author id}，只包含表中已有的作者。比较由数据库完成，与逐个WHERE rid=... AND email=...的结果一致
+    """
+    query_table = ' UNION ALL '.join(
+        ['SELECT %s AS i, %s AS rid, %s AS email, %s AS university, %s AS college, %s AS lab'] * len(authors))
+    cursor.execute(f"SELECT q.i, MIN(author.id) FROM ({query_table}) q JOIN author ON author.rid = q.rid "
+                   f"AND author.email = q.email AND author.university = q.university AND author.college = q.college "
+                   f"AND author.lab = q.lab GROUP BY q.i;",
+                   [value for i, author in enumerate(authors)
+                    for value in (i, author.researcher_id, author.email, author.university, author.college,
+                                  author.lab)])
+    return {authors[int(i)]: author_id for i, author_id in cursor.fetchall()}
+
+
+def insert_authors(cursor: pymysql.cursors.Cursor, authors: List[Author]):
+    """
+    插入新的作者，并与researcher表建立联系，作者的rid互不相同
+    """
+    # 如果已有的数据无需消歧，新生成的作者自然也无需消歧，他们只是邮箱、机构信息不同而已。反之同理
+    cursor.execute("SELECT author.rid, author.need_disambiguation FROM author JOIN "
+                   "(SELECT MIN(id) AS id FROM author WHERE rid IN %s GROUP BY rid) first_author "
+                   "ON first_author.id = author.id;", ([author.researcher_id for author in authors],))
+    need_disambiguation = dict(cursor.fetchall())
+    for author in authors:
+        if author.researcher_id not in need_disambiguation:
+            raise ValueError(f'rid={author.researcher_id}的researcher没有任何author记录')
+    cursor.execute("INSERT INTO author(rid, email, university, college, lab, need_disambiguation) VALUES " +
+                   ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(authors)) + ';',
+                   [value for author in authors
+                    for value in (author.researcher_id, author.email, author.university, author.college, author.lab,
+                                  need_disambiguation[author.researcher_id])])
+    logger.info(f'成功建立{len(authors)}个新的Author')
+
+
+def get_author_paper_updates(cursor: pymysql.cursors.Cursor, authors: List[Author], author_ids: List[int],
+                             paper_id: int) -> list:
+    """
+    :return: 按作者顺序逐条执行时确实会修改某一行的UPDATE参数[(author id, 贡献, rid, 论文id), ...]，
+        同时更新每个作者的contribution
     """
-    with conn.cursor() as cursor:
-        # UPDATE有rid的Author，INSERT无rid的Author
-        for author in author_list:
-            if author.researcher_id:
-                # 寻找已有的作者信息：包括邮箱、机构等，是否在表中
-                sql = "SELECT id FROM author WHERE rid={} AND email='{}' AND university='{}' AND college='{}' AND lab='{}';".format(
-                    author.researcher_id,
-                    escape_string(author.email),
-                    escape_string(author.university),
-                    escape_string(author.college),
-                    escape_string(author.lab))
-                cursor.execute(sql)
-                result = cursor.fetchone()
-
-                if not result:  # 没有该作者信息，需要插入，并与researcher表建立联系
-                    # 如果已有的数据无需消歧，新生成的作者自然也无需消歧，他们只是邮箱、机构信息不同而已。反之同理
-                    sql = f"SELECT need_disambiguation from author WHERE rid ={author.researcher_id};"
-                    cursor.execute(sql)
-                    need_disambiguation = cursor.fetchone()[0]
-
-                    sql = "INSERT INTO author(rid, email, university, college, lab, need_disambiguation) VALUES('{}', '{}', '{}', '{}', '{}', {});".format(
-                        author.researcher_id,
-                        escape_string(author.email),
-                        escape_string(author.university),
-                        escape_string(author.college),
-                        escape_string(author.lab),
-                        need_disambiguation
-                    )
-                    cursor.execute(sql)
-                    conn.commit()
-                    logger.info(f'成功建立新的Author：{sql}')
-                    cursor.execute('SELECT last_insert_id();')
-                    author_id = cursor.fetchone()[0]
-                else:  # 已有作者信息，直接取id即可
-                    author_id = result[0]
-
-                # 更新author_id与贡献，初始情况aid的值为researcher_id，已有作者信息数据时aid为author_id
-                sql = f"SELECT contribution FROM author_paper WHERE (aid = {author.researcher_id} OR aid = {author_id}) AND pid={paper_id};"
-                cursor.execute(sql)
-                current_contribution = cursor.fetchone()[0]
-                if current_contribution != 'PAPER_AUTHOR':
-                    author.contribution = current_contribution
-                sql = f"UPDATE author_paper SET aid = {author_id}, contribution = '{escape_string(author.contribution)}' WHERE aid = {author.researcher_id} AND pid = {paper_id};"
-                cursor.execute(sql)
-                conn.commit()
-                logger.info(f'成功执行更新语句："{sql}"')
-            else:  # 没有rid关联的情况，暂时忽略掉
-                pass
-    return
-
-
-def fill_rid(cursor: pymysql.connections.Cursor, author_list: List[Author], paper_id: int) -> List[Author]:
+    # 一次读出该论文的所有author_paper行，按作者顺序模拟之前的UPDATE，得到每个作者当时读到的贡献
+    cursor.execute("SELECT aid, contribution FROM author_paper WHERE pid = %s;", (paper_id,))
+    contributions = dict(cursor.fetchall())
+    updates = []
+    for author, author_id in zip(authors, author_ids):
+        # 更新author_id与贡献，初始情况aid的值为researcher_id，已有作者信息数据时aid为author_id
+        aids = [aid for aid in sorted({author.researcher_id, author_id}) if aid in contributions]
+        if not aids:
+            raise ValueError(f'pid={paper_id}的论文没有aid为{author.researcher_id}或{author_id}的author_paper记录')
+        current_contribution = contributions[aids[0]]
+        if current_contribution != 'PAPER_AUTHOR':
+            author.contribution = current_contribution
+        if author.researcher_id in contributions:  # 否则逐条执行时该UPDATE不修改任何行
+            updates.append((author_id, author.contribution, author.researcher_id, paper_id))
+            del contributions[author.researcher_id]
+            contributions[author_id] = author.contribution
+    return updates
+
+
+def apply_author_paper_updates(cursor: pymysql.cursors.Cursor, updates: list, paper_id: int):
+    """
+    :param updates: get_author_paper_updates的结果，其中的rid互不相同
+    用一条UPDATE执行所有修改，结果与按顺序逐条执行UPDATE author_paper SET aid = ..., contribution = ... 相同
+    """
+    if not updates:
+        return
+    old_aids = [rid for author_id, contribution, rid, pid in updates]
+    new_aids = {author_id for author_id, contribution, rid, pid in updates if author_id != rid}
+    if new_aids & set(old_aids):
+        # 某个作者的新aid恰好是另一个作者修改前的aid，结果取决于执行顺序，只能逐条执行
+        for update in updates:
+            cursor.execute("UPDATE author_paper SET aid = %s, contribution = %s WHERE aid = %s AND pid = %s;", update)
+        return
+    # MySQL按从左到右的顺序赋值，contribution必须在aid之前，按修改前的aid取值
+    cases = ' '.join(['WHEN %s THEN %s'] * len(updates))
+    cursor.execute(f"UPDATE author_paper SET contribution = CASE aid {cases} END, aid = CASE aid {cases} END "
+                   f"WHERE pid = %s AND aid IN %s;",
+                   [value for author_id, contribution, rid, pid in updates for value in (rid, contribution)] +
+                   [value for author_id, contribution, rid, pid in updates for value in (rid, author_id)] +
+                   [paper_id, old_aids])
+
+
+def canonical_name(name: str, strip_suffix: bool = False) -> str:
+    """
+    :param name: 姓名
+    :param strip_suffix: 是否去掉末尾带数字的部分，如"Wei Li 0001"中的"0001"
+    :return: 与姓和名的先后顺序无关的比较键，两个姓名只是各部分顺序不同时比较键相等
+    """
+    tokens = name.split()
+    if strip_suffix and trailing_digit_pattern.search(name):
+        tokens = tokens[:-1]
+    return ' '.join(sorted(tokens))
+
+
+class ResearcherNameIndex:
+    """
+    论文 → {researcher姓名的比较键: researcher id}的缓存，多篇论文的researcher用一次连接查询读入
+
+    爬虫开始时用expect登记本次要处理的论文，第一次查询其中任何一篇时，一起读入最多name_index_batch_size篇。
+    论文的作者更新后用forget删除其缓存，缓存的大小不会随爬取的论文数增长
+    """
+
+    def __init__(self):
+        self.papers = {}  # {论文id: {比较键: researcher id}}
+        self.expected = OrderedDict()  # 登记了但还没有读入的论文id，按登记顺序
+        self.lock = threading.Lock()
+
+    def expect(self, paper_ids):
+        with self.lock:
+            self.expected.update(dict.fromkeys(paper_ids))
+
+    def get(self, cursor: pymysql.cursors.Cursor, paper_id: int) -> dict:
+        """
+        :return: {researcher姓名的比较键: researcher id}，多个researcher的比较键相同时取id最大的
+        """
+        with self.lock:
+            names = self.papers.get(paper_id)
+            if names is not None:
+                return names
+            paper_ids = [paper_id]
+            self.expected.pop(paper_id, None)
+            while self.expected and len(paper_ids) < name_index_batch_size:
+                paper_ids.append(self.expected.popitem(last=False)[0])  # 按登记顺序，与爬取的顺序一致
+        loaded = self.load(cursor, paper_ids)
+        with self.lock:
+            self.papers.update(loaded)
+        return loaded[paper_id]
+
+    @staticmethod
+    def load(cursor: pymysql.cursors.Cursor, paper_ids: list) -> dict:
+        cursor.execute("SELECT author_paper.pid, researcher.id, researcher.name FROM author_paper "
+                       "JOIN author ON author.id = author_paper.aid JOIN researcher ON researcher.id = author.rid "
+                       "WHERE author_paper.pid IN %s ORDER BY researcher.id;", (paper_ids,))
+        papers = {paper_id: {} for paper_id in paper_ids}
+        for paper_id, rid, name in cursor.fetchall():
+            papers[paper_id][canonical_name(name, strip_suffix=True)] = rid
+        return papers
+
+    def forget(self, paper_id: int):
+        with self.lock:
+            self.papers.pop(paper_id, None)
+
+
+def fill_rid(cursor: pymysql.connections.Cursor, author_list: List[Author], paper_id: int,
+             name_index: ResearcherNameIndex = None) -> List[Author]:
     """
     :param cursor: 数据库游标，该函数不需要更新操作
     :param author_list: 作者列表
     :param paper_id: 论文id
+    :param name_index: 爬虫共用的ResearcherNameIndex，不指定时只查询这一篇论文
     :return: author_list: 作者列表，只修改了researcher_id的值
     """
-    # 为每个Author填充researcher_id
-    sql = f"SELECT id, name FROM researcher WHERE id in (SELECT rid FROM author WHERE id in (SELECT aid FROM author_paper WHERE pid = {paper_id}));"
-    cursor.execute(sql)
-    result = cursor.fetchall()
-    for item in result:
-        rid = item[0]
-        # 如果作者姓名后面有个数字，把最后的数字部分去掉
-        target_researcher_name = item[1] if not re.compile(r".*[0-9]$").match(item[1]) else ' '.join(
-            item[1].split(' ')[:-1])
-        for author in author_list:
-            if is_same_name(author.full_name, target_researcher_name):
-                author.researcher_id = rid
+    # 为每个Author填充researcher_id：作者姓名与researcher姓名（去掉末尾的数字）只是姓和名的顺序不同也算同一人
+    names = (name_index or ResearcherNameIndex()).get(cursor, paper_id)
+    for author in author_list:
+        rid = names.get(canonical_name(author.full_name))
+        if rid is not None:
+            author.researcher_id = rid
     return author_list
 
 
-class ACMPipeline:
-    def __init__(self):
-        self.__connection_config = json.load(open('./ScholarDataset/config.json'))
+def write_author_list(conn: pymysql.connections.Connection, author_list: List[Author], paper_id: int,
+                      name_index: ResearcherNameIndex, source: str):
+    """
+    在连接池的线程中执行：填充researcher_id，再更新数据库
+    :param source: 爬虫名，用于记录各阶段的耗时
+    """
+    with stage_metrics.timer('fill_rid', source), conn.cursor() as cursor:
+        fill_rid(cursor, author_list, paper_id, name_index)
+    with stage_metrics.timer('sql_update', source):
+        update_sql_from_author_list(conn, author_list, paper_id)
+    name_index.forget(paper_id)  # 更新后该论文的作者已经变了
+
+
+class ArchivePipeline:
+    """
+    在写入数据库之前把item['content']（下载的原始内容）存入ResponseArchive，之后可以用update_mysql.py --replay_dir离线重放
+    """
+
+    def __init__(self, archive_dir: str):
+        self.__archive = ResponseArchive(archive_dir)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        archive_dir = crawler.settings.get('ARCHIVE_DIR', '')
+        if not archive_dir:
+            raise NotConfigured
+        return cls(archive_dir)
+
+    def process_item(self, item, spider):
+        if not getattr(spider, 'replaying', False):
+            self.__archive.put(spider.name, item['query'], item['paper_id'], item['content'])
+        return item
+
+    def close_spider(self, spider):
+        self.__archive.close()
+
+
+class MySQLPipeline:
+    """
+    各网站Pipeline的基类：解析在reactor线程中进行，数据库读写交给adbapi连接池的线程，process_item返回Deferred，
+    下载不会因为等待数据库而停顿
+
+    同时等待写入的item最多MYSQL_MAX_PENDING_WRITES个，超出的item排队等待；未完成的item占着Scrapy的处理槽位，
+    数据库跟不上时下载会随之放慢
+    """
+    spider_name = ''  # 只处理该爬虫的item
+    db_api_module = 'pymysql'  # 连接池使用的DB-API模块，基准测试（benchmarks.pipeline）中换成本地的替身数据库
+    fuzzy_title_match = False  # 题目足够相似也视为同一篇论文，由TITLE_FUZZY_MATCH设置
+
+    def __init__(self, pool_size: int = 4, max_pending_writes: int = 16, connection_config: dict = None):
+        """
+        :param pool_size: 数据库连接数，即同时写入的线程数
+        :param max_pending_writes: 同时提交给连接池的item数上限
+        :param connection_config: 数据库连接信息，不指定时读取./ScholarDataset/config.json
+        """
+        self.__connection_config = connection_config or json.load(open('./ScholarDataset/config.json'))
+        self.__pool_size = pool_size
+        self.__semaphore = defer.DeferredSemaphore(max_pending_writes)
+        self.__pending = set()
+        self.__name_index = ResearcherNameIndex()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler.settings.getint('MYSQL_POOL_SIZE', 4),
+                       crawler.settings.getint('MYSQL_MAX_PENDING_WRITES', 16))
+        pipeline.fuzzy_title_match = crawler.settings.getbool('TITLE_FUZZY_MATCH')
+        return pipeline
 
     def open_spider(self, spider):
-        self.__conn = pymysql.connect(user=self.__connection_config['user'],
-                                      password=self.__connection_config['password'],
-                                      host=self.__connection_config['host'],
-                                      database=self.__connection_config['database'],
-                                      charset='utf8mb4')
-        self.__cursor = self.__conn.cursor()
-
-    def init_author_list(self, soup) -> List[Author]:
-        author_list = []
-        for i in soup.find_all('li', class_='loa__item'):
-            author = Author()
-            author.full_name = i.a['title']
-            author.university = i.p.text.split(',')[-1]
-            author_list.append(author)
-        return author_list
+        self.__dbpool = adbapi.ConnectionPool(self.db_api_module,
+                                              user=self.__connection_config['user'],
+                                              password=self.__connection_config['password'],
+                                              host=self.__connection_config['host'],
+                                              database=self.__connection_config['database'],
+                                              charset='utf8mb4',
+                                              cp_min=1,
+                                              cp_max=self.__pool_size,
+                                              cp_reconnect=True)
+        if spider.name == self.spider_name:
+            self.__name_index.expect(getattr(spider, 'query_list', {}))
+
+    def get_author_list(self, item) -> List[Author]:
+        """
+        :return: 从item['content']中解析出的作者列表（或以其触发的Deferred），题目不符时抛出DropItem
+        """
+        raise NotImplementedError
 
     def process_item(self, item, spider):
-        if spider.name != 'ACM':
+        if spider.name != self.spider_name:
             return item
         expect_title = item['query']
         paper_id = item['paper_id']
-        try:
-            soup = BeautifulSoup(item['content'], 'lxml')
-            got_title = soup.find('ol', class_='rlist organizational-chart').li.h6.text
-            if not is_same_title(expect_title, got_title):
-                raise DropItem(f"未能在{spider.name}上找到题目完全一样的论文，只找到了'{got_title}'。")
-
-            author_list = self.init_author_list(soup)
-            author_list = fill_rid(self.__cursor, author_list, paper_id)
-            update_sql_from_author_list(self.__conn, author_list, paper_id)
-        except Exception as e:
-            logger.error(
-                f"发生类型为{type(e)}的错误：'{repr(e)}'。请检查pid={paper_id}，论文题目为{expect_title}。追踪位置：{traceback.format_exc()}。")
-            raise
-        return item
+        start = time.perf_counter()
+        d = defer.maybeDeferred(self.get_author_list, item)
+        d.addBoth(self.observe_parse, start)
+        d.addCallback(lambda author_list: self.__semaphore.run(self.__dbpool.runWithConnection, write_author_list,
+                                                                author_list, paper_id, self.__name_index,
+                                                                self.spider_name))
+        d.addCallbacks(lambda _: item, self.log_failure, errbackArgs=(expect_title, paper_id))
+        self.__pending.add(d)
+        d.addBoth(self.forget_pending, d)
+        return d
+
+    def forget_pending(self, result, d: defer.Deferred):
+        self.__pending.discard(d)
+        return result
+
+    def observe_parse(self, result, start: float):
+        """
+        记录解析的耗时（使用进程池时包括排队时间），题目不符以外的异常记为解析出错
+        """
+        stage_metrics.observe('parse', self.spider_name, time.perf_counter() - start)
+        if isinstance(result, Failure) and not result.check(DropItem):
+            stage_metrics.error('parse', self.spider_name)
+        return result
+
+    def log_failure(self, failure, expect_title: str, paper_id: int):
+        stage_metrics.drop(self.spider_name, 'title_mismatch' if failure.check(DropItem) else failure.type.__name__)
+        logger.error(
+            f"发生类型为{failure.type}的错误：'{repr(failure.value)}'。请检查pid={paper_id}，论文题目为{expect_title}。追踪位置：{failure.getTraceback()}。")
+        return failure
 
     def close_spider(self, spider):
-        self.__cursor.close()
-        self.__conn.close()
+        # 等待已经提交的item写完再关闭连接池
+        d = defer.DeferredList(list(self.__pending), consumeErrors=True)
+        d.addBoth(lambda _: self.__dbpool.close())
+        return d
 
 
-class IEEEPipeline:
-    def __init__(self):
-        self.__connection_config = json.load(open('./ScholarDataset/config.json'))
+class ACMPipeline(MySQLPipeline):
+    """
+    论文页面用lxml只读取题目和作者两部分；设置了EXTRACT_PROCESSES时在进程池中解析
+    """
+    spider_name = 'ACM'
+
+    def __init__(self, pool_size: int = 4, max_pending_writes: int = 16, extract_processes: int = 0,
+                 connection_config: dict = None):
+        """
+        :param extract_processes: 解析页面的进程数，为0时在reactor线程中解析
+        """
+        super().__init__(pool_size, max_pending_writes, connection_config)
+        self.__extract_processes = extract_processes
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler.settings.getint('MYSQL_POOL_SIZE', 4),
+                       crawler.settings.getint('MYSQL_MAX_PENDING_WRITES', 16),
+                       crawler.settings.getint('EXTRACT_PROCESSES', 0))
+        pipeline.fuzzy_title_match = crawler.settings.getbool('TITLE_FUZZY_MATCH')
+        return pipeline
 
     def open_spider(self, spider):
-        self.__conn = pymysql.connect(user=self.__connection_config['user'],
-                                      password=self.__connection_config['password'],
-                                      host=self.__connection_config['host'],
-                                      database=self.__connection_config['database'],
-                                      charset='utf8mb4')
-        self.__cursor = self.__conn.cursor()
+        super().open_spider(spider)
+        if spider.name == self.spider_name:
+            start_process_pool(self.__extract_processes)
+
+    def init_author_list(self, article, expect_title: str) -> List[Author]:
+        """
+        :param article: extract_acm_article的结果
+        """
+        got_title, authors = article
+        if not is_same_title(expect_title, got_title, self.fuzzy_title_match):
+            raise DropItem(f"未能在{self.spider_name}上找到题目完全一样的论文，只找到了'{got_title}'。")
+        author_list = []
+        for full_name, university in authors:
+            author = Author()
+            author.full_name = full_name
+            author.university = university
+            author_list.append(author)
+        return author_list
+
+    def get_author_list(self, item) -> defer.Deferred:
+        d = run_in_process(extract_acm_article, item['content'])
+        d.addCallback(self.init_author_list, item['query'])
+        return d
+
+    def close_spider(self, spider):
+        d = super().close_spider(spider)
+        d.addBoth(lambda _: stop_process_pool())
+        return d
+
+
+class IEEEPipeline(MySQLPipeline):
+    spider_name = 'IEEExplore'
 
     def init_author_list(self, content) -> List[Author]:
         author_list = []
@@ -213,64 +475,34 @@ class IEEEPipeline:
             author_list.append(author)
         return author_list
 
-    def process_item(self, item, spider):
-        if spider.name != 'IEEExplore':
-            return item
+    def get_author_list(self, item) -> List[Author]:
+        got_title = item['content']['formulaStrippedArticleTitle']
+        if not is_same_title(item['query'], got_title, self.fuzzy_title_match):
+            raise DropItem(f"未能在{self.spider_name}上找到题目完全一样的论文，只找到了'{got_title}'。")
+        return self.init_author_list(item['content'])
 
-        expect_title = item['query']
-        paper_id = item['paper_id']
-        try:
-            got_title = item['content']['formulaStrippedArticleTitle']
-            if not is_same_title(expect_title, got_title):
-                raise DropItem(f"未能在{spider.name}上找到题目完全一样的论文，只找到了'{got_title}'。")
-
-            author_list = self.init_author_list(item['content'])
-            author_list = fill_rid(self.__cursor, author_list, paper_id)
-            update_sql_from_author_list(self.__conn, author_list, paper_id)
-        except Exception as e:
-            logger.error(
-                f"发生类型为{type(e)}的错误：'{repr(e)}'。请检查pid={paper_id}，论文题目为{expect_title}。追踪位置：{traceback.format_exc()}。")
-            raise
-        return item
 
-    def close_spider(self, spider):
-        self.__cursor.close()
-        self.__conn.close()
+class WebOfSciencePipeline(MySQLPipeline):
+    spider_name = 'WebOfScience'
 
+    def init_author_list(self, record: dict) -> List[Author]:
+        """
+        :param record: parse_wos_record的结果
+        """
+        # 计算姓名简称列表，全名列表，邮箱列表，以及{全名: 地址}
+        abbr_name_list = [s.replace(',', '') for s in record['Authors'].split('; ')]
+        full_name_list = [s.replace(',', '') for s in record['Author Full Names'].split('; ')]
+        # 没有邮箱时沿用之前读取Excel得到的'nan'（str(NaN)）：select_author_ids按邮箱匹配已有的作者，
+        # 改为空字符串会对已导入的数据重复建立作者
+        email_list = (record['Email Addresses'] or missing_email).split('; ')
+        # 同一作者有多个地址时取最后一个
+        address_dict = dict(self.get_author_address_tuple(record['Addresses']))
 
-class WebOfSciencePipeline:
-    def __init__(self):
-        self.__connection_config = json.load(open('./ScholarDataset/config.json'))
+        # 在大多数论文中，这几个列表一一对应，但少数情况下邮箱较少，因此需要下面的补全操作
+        if len(email_list) < len(abbr_name_list):
+            email_list.extend([''] * (len(abbr_name_list) - len(email_list)))
 
-    def open_spider(self, spider):
-        self.__conn = pymysql.connect(user=self.__connection_config['user'],
-                                      password=self.__connection_config['password'],
-                                      host=self.__connection_config['host'],
-                                      database=self.__connection_config['database'],
-                                      charset='utf8mb4')
-        self.__cursor = self.__conn.cursor()
-
-    def init_author_list(self, xls_df) -> List[Author]:
-        # 计算姓名简称列表，全名列表，地址列表，邮箱列表
-        abbr_name_list = [s.replace(',', '') for s in xls_df['Authors'][0].split('; ')]
-        full_name_list = [s.replace(',', '') for s in xls_df['Author Full Names'][0].split('; ')]
-        address_list = self.get_author_address_tuple(str(xls_df['Addresses'][0]))
-        email_list = [s for s in str(xls_df['Email Addresses'][0]).split('; ')]
-
-        # 在大多数论文中，这四个表一一对应，但少数情况下不是，因此需要下面的补全操作
-        len_an = len(abbr_name_list)
-        len_fn = len(full_name_list)
-        len_ad = len(address_list)
-        len_em = len(email_list)
-        max_length = max(len_an, len_fn, len_ad, len_em)
-        if len_ad < max_length:
-            for i in range(len_ad, max_length):
-                address_list.append('')
-        if len_em < max_length:
-            for i in range(len_em, max_length):
-                email_list.append('')
-
-        corresponding_author_name = self.get_corresponding_author(xls_df['Reprint Addresses'][0])
+        corresponding_author_name = self.get_corresponding_author(record['Reprint Addresses'])
 
         # 为每个Author填充姓名，机构，邮箱等基本信息；并识别通讯作者
         author_list = []
@@ -283,38 +515,20 @@ class WebOfSciencePipeline:
                 author.contribution = 'CORRESPONDING_AUTHOR'
             else:
                 author.contribution = 'PAPER_AUTHOR'
-            for name_address in address_list:
-                if name_address[0] == author.full_name:
-                    address_list__ = name_address[1].split(', ')
-                    author.university = address_list__[0]
-                    author.college = address_list__[1] if len(address_list__) > 3 else ''
+            address = address_dict.get(author.full_name)
+            if address is not None:
+                address_list__ = address.split(', ')
+                author.university = address_list__[0]
+                author.college = address_list__[1] if len(address_list__) > 3 else ''
             author_list.append(author)
         return author_list
 
-    def process_item(self, item, spider):
-        if spider.name != 'WebOfScience':
-            return item
-        expect_title = item['query']
-        paper_id = item['paper_id']
-        try:
-            xls_df = pd.read_excel(item['content'])
-            got_title = xls_df['Article Title'][0]
-            if not is_same_title(expect_title, got_title):
-                raise DropItem(f"未能在{spider.name}上找到题目完全一样的论文，只找到了'{got_title}'。")
-
-            author_list = self.init_author_list(xls_df)
-            author_list = fill_rid(self.__cursor, author_list, paper_id)
-            update_sql_from_author_list(self.__conn, author_list, paper_id)
-        except Exception as e:
-            logger.error(
-                f"发生类型为{type(e)}的错误：'{repr(e)}'。请检查pid={paper_id}，论文题目为{expect_title}。追踪位置：{traceback.format_exc()}。")
-            raise
-
-        return item
-
-    def close_spider(self, spider):
-        self.__cursor.close()
-        self.__conn.close()
+    def get_author_list(self, item) -> List[Author]:
+        record = parse_wos_record(item['content'])
+        got_title = record['Article Title']
+        if not is_same_title(item['query'], got_title, self.fuzzy_title_match):
+            raise DropItem(f"未能在{self.spider_name}上找到题目完全一样的论文，只找到了'{got_title}'。")
+        return self.init_author_list(record)
 
     def get_author_address_tuple(self, addresses: str) -> [(str, str)]:
         """
@@ -322,6 +536,8 @@ class WebOfSciencePipeline:
         :return: [name, address]. Example: [("A B", "ADD1"), ("C D", "ADD1"), ("E F", "ADD1"), ("G H", "ADD2")]
         """
         result = []
+        if not addresses.startswith('['):  # 没有地址
+            return result
         name_addresses = [[names, address] for (names, address) in
                           [(j[0], j[1]) for j in [i.split('] ') for i in addresses[1:].split('; [')]]]
         for i in range(0, len(name_addresses)):
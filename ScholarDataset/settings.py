@@ -20,7 +20,8 @@ NEWSPIDER_MODULE = 'ScholarDataset.spiders'
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-CONCURRENT_REQUESTS = 1
+# 各网站的并发数和速率由AdaptiveRateMiddleware分别控制，这里只是总的上限
+CONCURRENT_REQUESTS = 16
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -28,7 +29,8 @@ CONCURRENT_REQUESTS = 1
 DOWNLOAD_DELAY = 2
 DOWNLOAD_TIMEOUT = 180
 # The item_download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+# 下载槽建立时的初始值，之后由AdaptiveRateMiddleware调整
+CONCURRENT_REQUESTS_PER_DOMAIN = 1
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -58,20 +60,56 @@ DEFAULT_REQUEST_HEADERS = {
 #DOWNLOADER_MIDDLEWARES = {
 #    'ScholarDataset.middlewares.ScholardatasetDownloaderMiddleware': 543,
 #}
+DOWNLOADER_MIDDLEWARES = {
+    'ScholarDataset.middlewares.AdaptiveRateMiddleware': 580,
+}
+# 各来源的初始并发数、请求间隔（秒），以及调整的范围
+RATE_CONTROL_ENABLED = True
+RATE_CONTROL_SOURCES = {
+    'ieeexplore': {'domains': ['ieeexplore.ieee.org'], 'concurrency': 1, 'delay': 2, 'max_concurrency': 8,
+                   'min_delay': 0.25, 'max_delay': 60},
+    'acm': {'domains': ['dl.acm.org'], 'concurrency': 1, 'delay': 2, 'max_concurrency': 8,
+            'min_delay': 0.25, 'max_delay': 60},
+    'webofknowledge': {'domains': ['webofknowledge.com'], 'concurrency': 1, 'delay': 2, 'max_concurrency': 4,
+                       'min_delay': 0.5, 'max_delay': 60},
+}
+# 每RATE_CONTROL_WINDOW个响应评估一次：平均延迟不超过RATE_CONTROL_TARGET_LATENCY秒、错误率不超过
+# RATE_CONTROL_MAX_ERROR_RATE时，每秒请求数加RATE_CONTROL_RATE_STEP、并发数加1；否则减半。429/503和验证码页面立即减半
+RATE_CONTROL_WINDOW = 20
+RATE_CONTROL_TARGET_LATENCY = 5.0
+RATE_CONTROL_MAX_ERROR_RATE = 0.05
+RATE_CONTROL_RATE_STEP = 0.1
+RATE_CONTROL_MAX_CAPTCHA_RETRIES = 3
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
 #EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 #}
+EXTENSIONS = {
+    'ScholarDataset.extensions.MetricsExporter': 500,
+}
+# 各阶段耗时等指标的导出间隔（秒，0表示不导出）和Prometheus文本文件（空字符串表示只写入Scrapy stats）
+METRICS_INTERVAL = 30
+METRICS_FILE = 'crawl_metrics.prom'
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
+    'ScholarDataset.pipelines.ArchivePipeline': 100,
     'ScholarDataset.pipelines.WebOfSciencePipeline': 300,
     'ScholarDataset.pipelines.ACMPipeline': 400,
     'ScholarDataset.pipelines.IEEEPipeline': 500
 }
+# 写入数据库的连接数，以及同时等待写入的item数上限，超出时item排队，下载随之放慢
+MYSQL_POOL_SIZE = 4
+MYSQL_MAX_PENDING_WRITES = 16
+# ACMPipeline解析论文页面的进程数，0表示在reactor线程中解析
+EXTRACT_PROCESSES = 0
+# 为True时，题目不互为前缀但足够相似（matching.title_score不低于0.9）也视为同一篇论文，可能把作者写入错误的论文
+TITLE_FUZZY_MATCH = False
+# 下载的原始内容的存档目录，空字符串表示不存档
+ARCHIVE_DIR = 'response_archive'
 LOG_LEVEL = 'WARNING'
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -3,9 +3,10 @@
 # @Author  : 12897
 # @File    : ACM.py
 import scrapy
-from bs4 import BeautifulSoup
-import requests
 from ScholarDataset.items import ScholardatasetItem
+from ScholarDataset.extractors import extract_acm_entries
+from ScholarDataset.matching import TitleMatcher
+from ScholarDataset.metrics import stage_metrics
 import logging
 from scrapy import Request
 
@@ -53,15 +54,31 @@ class ACMDigitalLibrarySpider(scrapy.Spider):
     def parse(self, response, **kwargs):
         paper_title = response.meta['query']
         paper_id = response.meta['paper_id']
-        soup = BeautifulSoup(response.text, 'lxml')
-        entry = soup.find('li', class_='search__item issue-item-container')
-        if entry is None:
+        stage_metrics.observe('search', self.name, response.meta.get('download_latency', 0.0))
+        entries = extract_acm_entries(response.text)
+        if not entries:
+            stage_metrics.drop(self.name, 'no_result')
             logger.warning(f"对于'{paper_title}'，未在ACM网站上找到任何内容")
             return
-        entry_url = 'https://dl.acm.org' + entry.find('a').get('href')
+        # 在所有搜索结果中选出题目最接近的一篇，只抓取这一篇的详情页面
+        best = TitleMatcher(paper_title, fuzzy=self.settings.getbool('TITLE_FUZZY_MATCH')).best(entries)
+        if best is None:
+            stage_metrics.drop(self.name, 'no_match')
+            logger.warning(f"对于'{paper_title}'，ACM网站的{len(entries)}条搜索结果中没有题目相同的论文")
+            return
+        entry_url = 'https://dl.acm.org' + best[2]
+
+        # 详情页面同样交给Scrapy下载，不阻塞reactor，并发数由CONCURRENT_REQUESTS等设置控制
+        yield Request(url=entry_url,
+                      headers=self.headers,
+                      dont_filter=True,
+                      callback=self.parse_article,
+                      meta={'query': paper_title, 'paper_id': paper_id})
 
+    def parse_article(self, response):
+        stage_metrics.observe('detail', self.name, response.meta.get('download_latency', 0.0))
         item = ScholardatasetItem()
-        item['content'] = (requests.get(url=entry_url)).text
-        item['query'] = paper_title
-        item['paper_id'] = paper_id
+        item['content'] = response.text
+        item['query'] = response.meta['query']
+        item['paper_id'] = response.meta['paper_id']
         yield item
@@ -8,7 +8,10 @@ from ScholarDataset.items import ScholardatasetItem
 import json
 import re
 import logging
-import requests
+from scrapy import Request
+from scrapy.http import JsonRequest
+from ScholarDataset.matching import TitleMatcher
+from ScholarDataset.metrics import stage_metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.INFO)
@@ -21,7 +24,6 @@ class IEEExploreSpider(scrapy.Spider):
     """
     name = 'IEEExplore'
     allowed_domains = ['ieeexplore.ieee.org']
-    start_urls = ['https://ieeexplore.ieee.org/']
 
     pattern = 'xplGlobal.document.metadata=\{.*\};'
 
@@ -35,7 +37,7 @@ class IEEExploreSpider(scrapy.Spider):
         handler.setFormatter(formatter)
         logger.addHandler(handler)
 
-    def parse(self, response, **kwargs):
+    def start_requests(self):
         search_url = 'https://ieeexplore.ieee.org/rest/search'
         for paper_id, paper_title in self.query_list.items():
             headers = {
@@ -43,8 +45,6 @@ class IEEExploreSpider(scrapy.Spider):
                 'Accept-Encoding': 'gzip,deflate,br',
                 'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
                 'Connection': 'keep-alive',
-                'Content-Length': '122',
-                'Content-Type': 'application/json',
                 'Referer': f'https://ieeexplore.ieee.org/search/searchresult.jsp?newsearch=true&queryText={quote(paper_title)}',
                 'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:27.0) Gecko/20100101 Firefox/27.0'
 
@@ -53,21 +53,50 @@ class IEEExploreSpider(scrapy.Spider):
                 'newsearch': 'true',
                 'queryText': paper_title,
             }
+            # 每个查询都是独立的请求，由Scrapy并发下载
+            yield JsonRequest(url=search_url,
+                              data=query_form,
+                              headers=headers,
+                              dont_filter=True,
+                              callback=self.parse,
+                              meta={'query': paper_title, 'paper_id': paper_id})
+
+    def parse(self, response, **kwargs):
+        paper_title = response.meta['query']
+        paper_id = response.meta['paper_id']
+        stage_metrics.observe('search', self.name, response.meta.get('download_latency', 0.0))
+        search_result = json.loads(response.text)
+        papers = search_result.get('records')
+        if not papers:
+            stage_metrics.drop(self.name, 'no_result')
+            logger.warning(f"对于'{paper_title}'，未在IEEExplore网站上找到任何内容")
+            return
+        # 在所有搜索结果中选出题目最接近的一篇，只抓取这一篇的详情页面
+        matcher = TitleMatcher(paper_title, fuzzy=self.settings.getbool('TITLE_FUZZY_MATCH'))
+        best = matcher.best((paper.get('articleTitle', ''), paper) for paper in papers if paper.get('htmlLink'))
+        if best is None:
+            stage_metrics.drop(self.name, 'no_match')
+            logger.warning(f"对于'{paper_title}'，IEEExplore网站的{len(papers)}条搜索结果中没有题目相同的论文")
+            return
+        html_link = best[2]['htmlLink']
+        document_url = f'https://ieeexplore.ieee.org{html_link}'
+        yield Request(url=document_url,
+                      dont_filter=True,
+                      callback=self.parse_document,
+                      meta={'query': paper_title, 'paper_id': paper_id})
 
-            search_response = requests.post(url=search_url, data=json.dumps(query_form), headers=headers)
-            search_result = json.loads(search_response.text)
-            papers = search_result.get('records')
-            if papers is None:
-                logger.warning(f"对于'{paper_title}'，未在IEEExplore网站上找到任何内容")
-                return
-            html_link = papers[0]['htmlLink']
-            document_url = f'https://ieeexplore.ieee.org{html_link}'
-            document_response = requests.get(url=document_url)
-            data = re.search(self.pattern, document_response.text)
-            s = data.group()
-            content = json.loads(s[len('xplGlobal.document.metadata='): -1])
-            item = ScholardatasetItem()
-            item['content'] = content
-            item['query'] = paper_title
-            item['paper_id'] = paper_id
-            yield item
+    def parse_document(self, response):
+        paper_title = response.meta['query']
+        stage_metrics.observe('detail', self.name, response.meta.get('download_latency', 0.0))
+        data = re.search(self.pattern, response.text)
+        if data is None:
+            stage_metrics.drop(self.name, 'no_metadata')
+            logger.warning(f"对于'{paper_title}'，未能在IEEExplore论文页面{response.url}中找到元数据")
+            return
+        s = data.group()
+        content = json.loads(s[len('xplGlobal.document.metadata='): -1])
+        item = ScholardatasetItem()
+        item['content'] = content
+        item['query'] = paper_title
+        item['paper_id'] = response.meta['paper_id']
+        yield item
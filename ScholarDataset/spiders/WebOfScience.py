@@ -10,6 +10,7 @@ from scrapy.http import FormRequest
 import logging
 from urllib.parse import unquote
 from ScholarDataset.items import ScholardatasetItem
+from ScholarDataset.metrics import stage_metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.INFO)
@@ -101,12 +102,14 @@ class WebOfScienceSpider(scrapy.Spider):
     def parse_query_response(self, response):
         sid = response.meta['sid']
         query = response.meta['query']
+        stage_metrics.observe('search', self.name, response.meta.get('download_latency', 0.0))
 
         # 通过bs4解析html找到检索结果的入口
         soup = BeautifulSoup(response.text, 'lxml')
         entry = soup.find('a', attrs={'title': 'Click to view the results'})
 
         if not entry:
+            stage_metrics.drop(self.name, 'no_result')
             logger.warning(f"对于'{query}'，未在Web of Science上找到任何内容")
             return
         entry_url = 'https://apps.webofknowledge.com' + entry.get('href')
@@ -117,6 +120,7 @@ class WebOfScienceSpider(scrapy.Spider):
         if result:
             qid = result.group(1)
             if qid in self.qid_list:
+                stage_metrics.drop(self.name, 'duplicate')
                 logger.warning(f"发现重复爬取现象，可能是因为'{query}'未在Web of Science上找到任何内容")
                 return
             self.qid_list.append(qid)
@@ -146,7 +150,7 @@ class WebOfScienceSpider(scrapy.Spider):
             "mode": "OpenOutputService",
             "qid": str(qid),
             "SID": str(sid),
-            "format": "saveToExcel",  # txt: saveToFile
+            "format": "saveToFile",  # 制表符分隔格式，比Excel格式解析快得多；Excel格式为saveToExcel
             "filters": "HIGHLY_CITED HOT_PAPER OPEN_ACCESS PMID USAGEIND AUTHORSIDENTIFIERS ACCESSION_NUM FUNDING SUBJECT_CATEGORY JCR_CATEGORY LANG IDS PAGEC SABBR CITREFC ISSN PUBINFO KEYWORDS CITTIMES ADDRS CONFERENCE_SPONSORS DOCTYPE CITREF ABSTRACT CONFERENCE_INFO SOURCE TITLE AUTHORS  ",
             "mark_to": str(end),
             "mark_from": str(start),
@@ -158,15 +162,16 @@ class WebOfScienceSpider(scrapy.Spider):
             "markFrom": str(start),
             "markTo": str(end),
             "fields_selection": "HIGHLY_CITED HOT_PAPER OPEN_ACCESS PMID USAGEIND AUTHORSIDENTIFIERS ACCESSION_NUM FUNDING SUBJECT_CATEGORY JCR_CATEGORY LANG IDS PAGEC SABBR CITREFC ISSN PUBINFO KEYWORDS CITTIMES ADDRS CONFERENCE_SPONSORS DOCTYPE CITREF ABSTRACT CONFERENCE_INFO SOURCE TITLE AUTHORS  ",
-            # "save_options": "xls"
+            # "save_options": "tabWinUTF8"
         }
 
-        output_url = 'https://apps.webofknowledge.com/OutboundService.do?action=go&&save_options=xls'
+        output_url = 'https://apps.webofknowledge.com/OutboundService.do?action=go&&save_options=tabWinUTF8'
         yield FormRequest(output_url, method='POST', formdata=output_form, dont_filter=True,
                           callback=self.item_download,
                           meta={'query': query, 'paper_id': response.meta['paper_id']})
 
     def item_download(self, response):
+        stage_metrics.observe('detail', self.name, response.meta.get('download_latency', 0.0))
         item = ScholardatasetItem()
         item['content'] = response.body
         item['query'] = response.meta['query']
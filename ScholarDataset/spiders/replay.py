@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 23:10
+# @File    : replay.py
+import logging
+import scrapy
+from ScholarDataset.archive import ResponseArchive
+from ScholarDataset.items import ScholardatasetItem
+from ScholarDataset.metrics import stage_metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+logger.propagate = False
+
+
+class ArchiveReplaySpider(scrapy.Spider):
+    """
+    从ResponseArchive读出存档的原始内容，不访问网络，直接交给对应爬虫的pipeline处理。
+    爬虫名（name参数）取被重放的爬虫名，pipeline据此选择解析方式
+    """
+    name = 'replay'
+    start_urls = ['data:,']  # 只需要一次回调来产生item，data:链接不会访问网络
+    replaying = True  # ArchivePipeline不再重复存档
+
+    def __init__(self, *args, **kwargs):
+        """
+        :param kwargs:
+            {name}: 被重放的爬虫名，WebOfScience/ACM/IEEExplore
+            {query_list}: 与其他爬虫相同，{paper_id: paper_title}
+            {archive_dir}: 存档目录
+        """
+        super().__init__(*args, **kwargs)
+        self.query_list = kwargs['query_list']
+        self.archive = ResponseArchive(kwargs['archive_dir'])
+
+        if not logger.handlers:
+            handler = logging.FileHandler('replay_log.txt', encoding='utf-8')
+            handler.setLevel(logging.WARNING)
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+
+    def parse(self, response, **kwargs):
+        entries = self.archive.load_index(self.name)
+        for paper_id, paper_title in self.query_list.items():
+            entry = entries.get(paper_title)
+            if entry is None:
+                stage_metrics.drop(self.name, 'not_archived')
+                logger.warning(f"对于'{paper_title}'，{self.name}的存档中没有内容")
+                continue
+            item = ScholardatasetItem()
+            item['content'] = self.archive.read(entry)
+            item['query'] = paper_title
+            item['paper_id'] = paper_id
+            yield item
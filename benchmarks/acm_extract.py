@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 21:00
+# @File    : acm_extract.py
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+from ScholarDataset.extractors import extract_acm_article, extract_acm_entries
+
+
+def soup_entries(html: str) -> list:
+    """
+    extract_acm_entries的BeautifulSoup写法，沿用原先ACM爬虫查找搜索结果条目的方式
+    """
+    entries = []
+    for entry in BeautifulSoup(html, 'lxml').find_all('li', class_='search__item issue-item-container'):
+        link = (entry.h5 or entry).a or entry.a
+        if link is not None and link.get('href'):
+            entries.append((link.text, link.get('href')))
+    return entries
+
+
+def soup_article(html: str) -> tuple:
+    """
+    原先ACMPipeline中的写法
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    got_title = soup.find('ol', class_='rlist organizational-chart').li.h6.text
+    authors = [(i.a['title'], i.p.text.split(',')[-1]) for i in soup.find_all('li', class_='loa__item')]
+    return got_title, authors
+
+
+def filler(count: int) -> str:
+    """
+    :return: 模拟页面中与提取无关的大量标签
+    """
+    return ''.join(f'<div class="section section-{i}"><p>Paragraph {i} with <a href="/doi/{i}">a link</a> and '
+                   f'<span class="ref">reference {i}</span>.</p><ul><li>item</li><li>item</li></ul></div>'
+                   for i in range(count))
+
+
+def synthetic_search_page(index: int) -> str:
+    results = ''.join(f'<li class="search__item issue-item-container"><div class="issue-item">'
+                      f'<h5><a href="/doi/10.1145/{index}.{i}">Result {i} of query {index}</a></h5></div></li>'
+                      for i in range(20))
+    return f'<html><head><title>Search</title></head><body>{filler(300)}<ul class="items-results">{results}</ul>' \
+           f'{filler(300)}</body></html>'
+
+
+def synthetic_article_page(index: int) -> str:
+    authors = ''.join(f'<li class="loa__item"><a title="Author {index} {i}" href="/profile/{i}">Author {i}</a>'
+                      f'<p>Lab {i}, Some College, University {i}</p></li>' for i in range(8))
+    chart = f'<ol class="rlist organizational-chart"><li><h6>Paper Title {index}: A <i>Study</i></h6></li></ol>'
+    return f'<html><head><title>Article</title></head><body>{filler(500)}<ul class="loa">{authors}</ul>' \
+           f'{chart}{filler(500)}</body></html>'
+
+
+def load_pages(pages_dir: str, count: int) -> tuple:
+    """
+    :return: (搜索结果页面列表, 论文页面列表)。pages_dir中有录制的页面时使用录制的页面，否则生成模拟页面
+    """
+    if pages_dir:
+        pages = [open(path, encoding='utf-8').read() for path in sorted(glob.glob(os.path.join(pages_dir, '*.html')))]
+        return [p for p in pages if 'search__item' in p], [p for p in pages if 'organizational-chart' in p]
+    return [synthetic_search_page(i) for i in range(count)], [synthetic_article_page(i) for i in range(count)]
+
+
+def measure(function, pages: list) -> tuple:
+    """
+    :return: (每个页面的平均耗时，单位毫秒, 结果列表)
+    """
+    start = time.perf_counter()
+    results = [function(page) for page in pages]
+    return (time.perf_counter() - start) * 1000 / max(len(pages), 1), results
+
+
+def main(args_):
+    search_pages, article_pages = load_pages(args_.pages_dir, args_.count)
+    print(f'搜索结果页面{len(search_pages)}个，论文页面{len(article_pages)}个')
+    for name, pages, baseline, fast in (('搜索结果', search_pages, soup_entries, extract_acm_entries),
+                                        ('论文', article_pages, soup_article, extract_acm_article)):
+        if not pages:
+            continue
+        baseline_ms, expected = measure(baseline, pages)
+        fast_ms, got = measure(fast, pages)
+        mismatches = sum(1 for a, b in zip(expected, got) if a != b)
+        print(f'{name}页面：BeautifulSoup {baseline_ms:.2f} ms/页，lxml {fast_ms:.2f} ms/页，'
+              f'加速{baseline_ms / fast_ms:.1f}倍，结果不一致{mismatches}个')
+
+    if args_.processes > 0 and article_pages:
+        with ProcessPoolExecutor(args_.processes) as pool:
+            list(pool.map(extract_acm_article, article_pages[:args_.processes]))  # 预热进程
+            start = time.perf_counter()
+            list(pool.map(extract_acm_article, article_pages, chunksize=8))
+            elapsed = time.perf_counter() - start
+        print(f'{args_.processes}个进程解析论文页面：{len(article_pages) / elapsed:.0f}页/秒')
+
+
+# 在项目根目录执行：python -m benchmarks.acm_extract --pages_dir data/acm_pages
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages_dir', help='录制的ACM页面（*.html）所在文件夹，不指定时使用模拟页面', dest='pages_dir',
+                    type=str, default=None)
+    ap.add_argument('--count', help='模拟页面的数量', dest='count', type=int, default=50)
+    ap.add_argument('--processes', help='同时测试进程池解析的进程数，0表示不测试', dest='processes', type=int, default=0)
+    args = ap.parse_args()
+    main(args)
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 23:40
+# @File    : pipeline.py
+import argparse
+import collections
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
+from scrapy.exceptions import DropItem
+from ScholarDataset.archive import ResponseArchive
+from ScholarDataset.items import ScholardatasetItem
+from ScholarDataset.metrics import stage_metrics
+from ScholarDataset.pipelines import ACMPipeline, IEEEPipeline, WebOfSciencePipeline, ResearcherNameIndex, \
+    canonical_name, fill_rid, update_sql_from_author_list
+from benchmarks import standin_db
+from benchmarks.acm_extract import filler
+
+source_pipelines = {'ACM': ACMPipeline, 'IEEExplore': IEEEPipeline, 'WebOfScience': WebOfSciencePipeline}
+stages = ('parse', 'fill_rid', 'sql_update')
+
+given_names = ['Wei', 'Ann', 'Jun', 'Maria', 'Lei', 'Olga', 'Ravi', 'Sara', 'Tom', 'Yu', 'Hans', 'Ines', 'Kenji',
+               'Lina', 'Marco', 'Nadia', 'Omar', 'Pia', 'Qiang', 'Rosa', 'Sven', 'Tara', 'Umar', 'Vera', 'Xin']
+family_names = ['Li', 'Wang', 'Zhang', 'Smith', 'Garcia', 'Muller', 'Rossi', 'Tanaka', 'Kim', 'Novak', 'Silva',
+                'Chen', 'Liu', 'Khan', 'Ivanov', 'Jensen', 'Moreau', 'Costa', 'Sato', 'Park', 'Nguyen', 'Lopez',
+                'Fischer', 'Weber', 'Yang', 'Zhao', 'Huang', 'Wu', 'Zhou', 'Xu']
+title_words = ['adaptive', 'graph', 'learning', 'scalable', 'query', 'neural', 'robust', 'distributed', 'index',
+               'retrieval', 'optimization', 'streaming', 'network', 'model', 'secure', 'federated', 'compiler',
+               'storage', 'vision', 'language']
+
+
+class BenchmarkSpider:
+    """
+    pipeline只用到爬虫的name和query_list
+    """
+
+    def __init__(self, name: str, query_list: dict):
+        self.name = name
+        self.query_list = query_list
+
+
+def synthetic_name(index: int) -> str:
+    name = f'{given_names[index % len(given_names)]} {family_names[index // len(given_names) % len(family_names)]}'
+    rounds = index // (len(given_names) * len(family_names))
+    return name if rounds == 0 else f'{name} {chr(ord("A") + rounds - 1)}.'
+
+
+def synthetic_title(index: int, rng: random.Random) -> str:
+    return ' '.join(rng.choice(title_words) for _ in range(rng.randint(4, 9))).capitalize() + f' {index}'
+
+
+def acm_payload(title: str, names: list) -> str:
+    authors = ''.join(f'<li class="loa__item"><a title="{name}" href="/profile/{i}">{name}</a>'
+                      f'<p>Lab {i}, College {i}, University {i}</p></li>' for i, name in enumerate(names))
+    chart = f'<ol class="rlist organizational-chart"><li><h6>{title}</h6></li></ol>'
+    return f'<html><head><title>{title}</title></head><body>{filler(300)}<ul class="loa">{authors}</ul>{chart}' \
+           f'{filler(300)}</body></html>'
+
+
+def ieee_payload(title: str, names: list) -> dict:
+    return {'title': title, 'formulaStrippedArticleTitle': title, 'abstract': ' '.join([title] * 20),
+            'authors': [{'name': name, 'affiliation': [f'College {i}, University {i}, City, Country']}
+                        for i, name in enumerate(names)]}
+
+
+def wos_payload(title: str, names: list) -> bytes:
+    full_names, abbr_names = [], []
+    for name in names:
+        given, family = name.split(' ', 1)
+        full_names.append(f'{family}, {given}')
+        abbr_names.append(f'{family}, {given[0]}')
+    addresses = '; '.join(f'[{full_name}] University {i}, College {i}, City, Country'
+                          for i, full_name in enumerate(full_names))
+    record = {'PT': 'J', 'AU': '; '.join(abbr_names), 'AF': '; '.join(full_names), 'TI': title,
+              'SO': 'JOURNAL OF BENCHMARKS', 'C1': addresses,
+              'RP': f'{abbr_names[0]} (corresponding author), University 0, City, Country',
+              'EM': '; '.join(f'{name.split()[0].lower()}@university{i}.edu' for i, name in enumerate(names)),
+              'PY': '2021'}
+    return ('\t'.join(record) + '\r\n' + '\t'.join(record.values()) + '\r\n').encode('utf-8-sig')
+
+
+payload_builders = {'ACM': acm_payload, 'IEEExplore': ieee_payload, 'WebOfScience': wos_payload}
+
+
+def synthetic_fixtures(source: str, count: int, name_count: int, rng: random.Random) -> list:
+    """
+    :param name_count: 作者姓名从前name_count个姓名中抽取
+    :return: [(题目, item['content'])]，约5%的内容题目与查询不符
+    """
+    fixtures = []
+    for i in range(count):
+        title = synthetic_title(i, rng)
+        # 不放回地抽取，一篇论文中不会出现两个同名作者
+        names = [synthetic_name(index) for index in rng.sample(range(name_count), min(rng.randint(2, 8), name_count))]
+        got_title = title if rng.random() >= 0.05 else 'Unrelated ' + synthetic_title(i + count, rng)
+        fixtures.append((title, payload_builders[source](got_title, names)))
+    return fixtures
+
+
+def recorded_fixtures(source: str, archive_dir: str, count: int) -> list:
+    """
+    :return: ResponseArchive中录制的前count条[(题目, item['content'])]
+    """
+    archive = ResponseArchive(archive_dir)
+    entries = list(archive.load_index(source).values())[:count]
+    return [(entry['query'], archive.read(entry)) for entry in entries]
+
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures')  # 随代码提交的少量录制内容
+
+
+def file_fixtures(source: str, directory: str, count: int) -> list:
+    """
+    :param directory: 每个来源一个索引文件（来源.jsonl，每行{query, file}），内容文件与索引放在同一文件夹：
+        ACM为HTML文本，IEEExplore为元数据JSON，Web of Science为制表符分隔格式的导出文件
+    :return: 前count条[(题目, item['content'])]
+    """
+    fixtures = []
+    with open(os.path.join(directory, source + '.jsonl'), encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            with open(os.path.join(directory, entry['file']), 'rb') as content_file:
+                content = content_file.read()
+            if source == 'ACM':
+                content = content.decode('utf-8')
+            elif source == 'IEEExplore':
+                content = json.loads(content)
+            fixtures.append((entry['query'], content))
+    return fixtures[:count]
+
+
+def resolve(result):
+    """
+    :return: get_author_list的结果；没有进程池时ACMPipeline返回的Deferred已经触发
+    """
+    if isinstance(result, defer.Deferred):
+        results = []
+        result.addBoth(results.append)
+        result = results[0]
+        if isinstance(result, Failure):
+            result.raiseException()
+    return result
+
+
+def parse_authors(pipeline, item) -> list:
+    try:
+        return resolve(pipeline.get_author_list(item))
+    except DropItem:
+        return []
+
+
+def seed_database(path: str, pipeline, items: list, researcher_count: int, rng: random.Random):
+    """
+    建立替身数据库：researcher及其author、待更新的论文，以及author_paper中aid为researcher id的初始记录。
+    约80%的作者是已有的researcher，其中一部分姓名为相反顺序或带有消歧数字
+    """
+    standin_db.create_database(path)
+    researchers = {}  # {比较键: (researcher id, 姓名)}
+    for i in range(researcher_count):
+        researchers.setdefault(canonical_name(synthetic_name(i)), synthetic_name(i))
+    parsed = [parse_authors(pipeline, item) for item in items]
+    for author_list in parsed:
+        for author in author_list:
+            if rng.random() < 0.8:
+                researchers.setdefault(canonical_name(author.full_name), author.full_name)
+    rids = {}
+    connection = standin_db.connect(database=path)
+    with connection.cursor() as cursor:
+        for rid, (key, name) in enumerate(researchers.items(), start=1):
+            if rng.random() < 0.2:
+                name = ' '.join(name.split()[::-1])
+            elif rng.random() < 0.1:
+                name += ' 0001'
+            rids[key] = rid
+            cursor.execute("INSERT INTO researcher(id, name, title, affiliation) VALUES (%s, %s, %s, %s);",
+                           (rid, name, 'Professor', f'University {rid}'))
+        # 每个researcher的第一个author的id与researcher id相同，部分researcher还有带邮箱和机构的第二个author
+        cursor.executemany("INSERT INTO author(id, rid, need_disambiguation) VALUES (%s, %s, %s);",
+                           [(rid, rid, rng.randint(0, 1)) for rid in rids.values()])
+        cursor.executemany("INSERT INTO author(rid, email, university, need_disambiguation) VALUES (%s, %s, %s, 0);",
+                           [(rid, f'r{rid}@university.edu', f' University {rid % 8}') for rid in rids.values()
+                            if rng.random() < 0.3])
+        for item, author_list in zip(items, parsed):
+            cursor.execute("INSERT INTO paper(id, title) VALUES (%s, %s);", (item['paper_id'], item['query']))
+            paper_rids = {rids[key] for key in (canonical_name(author.full_name) for author in author_list)
+                          if key in rids}
+            paper_rids.add(rng.randint(1, len(rids)))  # 不在作者列表中的researcher
+            cursor.executemany("INSERT INTO author_paper(aid, pid, contribution) VALUES (%s, %s, %s);",
+                               [(rid, item['paper_id'], 'FIRST_AUTHOR' if i == 0 else 'PAPER_AUTHOR')
+                                for i, rid in enumerate(sorted(paper_rids))])
+    connection.commit()
+    connection.close()
+    return len(rids)
+
+
+def measure_stages(pipeline, items: list, db_path: str, allocations: bool) -> dict:
+    """
+    用一个连接依次执行各阶段，分别计时；allocations为True时同时用tracemalloc记录各阶段的峰值内存
+    :return: ({阶段: {'times': [秒], 'peaks': [字节]}}, {出错的异常类名: item数})。某个item出错时记为丢弃，
+        继续处理之后的item
+    """
+    results = {stage: {'times': [], 'peaks': []} for stage in stages}
+    dropped = collections.Counter()
+    name_index = ResearcherNameIndex()
+    name_index.expect([item['paper_id'] for item in items])
+    connection = standin_db.connect(database=db_path)
+    if allocations:
+        tracemalloc.start()
+
+    def run(stage, function, *args):
+        if allocations:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = function(*args)
+        results[stage]['times'].append(time.perf_counter() - start)
+        if allocations:
+            results[stage]['peaks'].append(tracemalloc.get_traced_memory()[1] - before)
+        return result
+
+    for item in items:
+        try:
+            author_list = run('parse', parse_authors, pipeline, item)
+            if not author_list:
+                continue
+            with connection.cursor() as cursor:
+                run('fill_rid', fill_rid, cursor, author_list, item['paper_id'], name_index)
+            run('sql_update', update_sql_from_author_list, connection, author_list, item['paper_id'])
+        except Exception as e:
+            # 与爬虫中相同，一个item出错不影响其他item；update_sql_from_author_list出错时已经回滚
+            dropped[type(e).__name__] += 1
+        finally:
+            name_index.forget(item['paper_id'])
+    if allocations:
+        tracemalloc.stop()
+    connection.close()
+    return results, dict(dropped)
+
+
+@defer.inlineCallbacks
+def measure_pipeline(pipeline, spider: BenchmarkSpider, items: list):
+    """
+    与爬虫中相同，经过process_item、连接池写入
+    :return: (耗时秒数, 写入成功的item数)
+    """
+    pipeline.open_spider(spider)
+    start = time.perf_counter()
+    results = yield defer.DeferredList([defer.maybeDeferred(pipeline.process_item, item, spider) for item in items],
+                                       consumeErrors=True)
+    yield pipeline.close_spider(spider)
+    return time.perf_counter() - start, sum(1 for success, _ in results if success)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(args_, results: dict):
+    print(f"{results['source']}：{results['items']}个item，{results['researchers']}个researcher")
+    for stage, stats in results['stages'].items():
+        line = f"  {stage:<10} {stats['count']:>6}次  平均{stats['avg_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms"
+        if args_.allocations:
+            line += f"  平均峰值内存{stats['avg_peak_kib']:.1f} KiB"
+        print(line)
+    if results['dropped']:
+        print(f"  各阶段计时时出错丢弃的item：{results['dropped']}")
+    print(f"  process_item + 连接池写入：{results['items_per_sec']:.1f} item/秒，成功{results['written']}个，"
+          f"连接池各阶段平均耗时（ms）：{results['pool_stage_ms']}")
+
+
+def compare_baseline(results: dict, baseline_path: str, tolerance: float) -> bool:
+    """
+    :return: 吞吐量没有比基准低于tolerance时返回True
+    """
+    baseline = json.load(open(baseline_path, encoding='utf-8'))
+    ratio = results['items_per_sec'] / baseline['items_per_sec']
+    print(f"  与基准相比吞吐量为{ratio:.2f}倍")
+    return ratio >= 1 - tolerance
+
+
+def main(args_):
+    rng = random.Random(args_.seed)
+    pipeline_class = type(source_pipelines[args_.source].__name__, (source_pipelines[args_.source],),
+                          {'db_api_module': 'benchmarks.standin_db'})
+    if args_.archive_dir:
+        fixtures = recorded_fixtures(args_.source, args_.archive_dir, args_.count)
+    elif args_.fixtures:
+        fixtures = file_fixtures(args_.source, args_.fixtures, args_.count)
+    else:
+        fixtures = synthetic_fixtures(args_.source, args_.count, args_.researchers * 5 // 4, rng)
+    items = []
+    for paper_id, (query, content) in enumerate(fixtures, start=1):
+        item = ScholardatasetItem()
+        item['content'] = content
+        item['query'] = query
+        item['paper_id'] = paper_id
+        items.append(item)
+
+    work_dir = tempfile.mkdtemp(prefix='pipeline_benchmark_')
+    try:
+        seed_path = os.path.join(work_dir, 'seed.db')
+        connection_config = {'user': '', 'password': '', 'host': '', 'database': seed_path}
+        researcher_count = seed_database(seed_path, pipeline_class(connection_config=connection_config), items,
+                                         args_.researchers, rng)
+
+        # 各阶段单独计时
+        stages_path = os.path.join(work_dir, 'stages.db')
+        shutil.copy(seed_path, stages_path)
+        stage_results, dropped = measure_stages(pipeline_class(connection_config=connection_config), items, stages_path,
+                                       args_.allocations)
+
+        # 完整的process_item，在连接池中写入
+        pool_path = os.path.join(work_dir, 'pool.db')
+        shutil.copy(seed_path, pool_path)
+        kwargs = {'extract_processes': args_.processes} if args_.source == 'ACM' else {}
+        pipeline = pipeline_class(args_.pool_size, args_.max_pending_writes,
+                                  connection_config=dict(connection_config, database=pool_path), **kwargs)
+        spider = BenchmarkSpider(args_.source, {item['paper_id']: item['query'] for item in items})
+        baseline = stage_metrics.snapshot()
+        outcome = []
+        d = measure_pipeline(pipeline, spider, items)
+        d.addBoth(outcome.append)
+        d.addBoth(lambda _: reactor.stop())
+        reactor.run()
+        if isinstance(outcome[0], Failure):
+            outcome[0].raiseException()
+        elapsed, written = outcome[0]
+        snapshot = stage_metrics.snapshot()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    def pool_stage_ms(stage):
+        prefix = f'metrics/{args_.source}/{stage}/'
+        count = snapshot.get(prefix + 'count', 0) - baseline.get(prefix + 'count', 0)
+        seconds = snapshot.get(prefix + 'seconds', 0) - baseline.get(prefix + 'seconds', 0)
+        return round(seconds * 1000 / count, 3) if count else 0.0
+
+    results = {
+        'source': args_.source, 'items': len(items), 'researchers': researcher_count,
+        'items_per_sec': len(items) / elapsed, 'written': written, 'dropped': dropped,
+        'pool_stage_ms': {stage: pool_stage_ms(stage) for stage in stages},
+        'stages': {stage: {'count': len(values['times']),
+                           'avg_ms': sum(values['times']) * 1000 / max(len(values['times']), 1),
+                           'p95_ms': percentile(values['times'], 0.95) * 1000,
+                           'avg_peak_kib': sum(values['peaks']) / 1024 / max(len(values['peaks']), 1)}
+                   for stage, values in stage_results.items()},
+    }
+    report(args_, results)
+    if args_.output:
+        with open(args_.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args_.baseline and not compare_baseline(results, args_.baseline, args_.tolerance):
+        print(f'  吞吐量比基准低了{args_.tolerance:.0%}以上')
+        exit(1)
+
+
+# 在项目根目录执行：python -m benchmarks.pipeline --source ACM --count 2000
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--source', help='测试的pipeline', dest='source', type=str, default='ACM',
+                    choices=list(source_pipelines))
+    ap.add_argument('--count', help='item数', dest='count', type=int, default=1000)
+    ap.add_argument('--researchers', help='替身数据库中的researcher数（不含录制内容中的作者）', dest='researchers',
+                    type=int, default=2000)
+    ap.add_argument('--archive_dir', help='使用该ResponseArchive中录制的内容，不指定时生成模拟内容',
+                    dest='archive_dir', type=str, default=None)
+    ap.add_argument('--fixtures', help=f'使用该文件夹中的内容文件（格式见file_fixtures），如随代码提交的{fixtures_dir}',
+                    dest='fixtures', type=str, default=None)
+    ap.add_argument('--pool_size', help='连接池的连接数', dest='pool_size', type=int, default=1)
+    ap.add_argument('--max_pending_writes', help='同时提交给连接池的item数上限', dest='max_pending_writes', type=int,
+                    default=16)
+    ap.add_argument('--processes', help='ACM页面解析的进程数', dest='processes', type=int, default=0)
+    ap.add_argument('--allocations', help='用tracemalloc记录各阶段的峰值内存（计时会变慢）', dest='allocations',
+                    action='store_true')
+    ap.add_argument('--seed', help='随机数种子', dest='seed', type=int, default=0)
+    ap.add_argument('--output', help='把结果写入该JSON文件', dest='output', type=str, default=None)
+    ap.add_argument('--baseline', help='与该JSON文件（之前的--output）比较吞吐量', dest='baseline', type=str,
+                    default=None)
+    ap.add_argument('--tolerance', help='吞吐量允许比基准低的比例，超出时以状态码1退出', dest='tolerance',
+                    type=float, default=0.2)
+    args = ap.parse_args()
+    main(args)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 23:40
+# @File    : standin_db.py
+"""
+基准测试用的替身数据库：在SQLite上提供pipelines.py用到的那部分pymysql接口（DB-API模块，可交给adbapi连接池），
+不需要MySQL服务器。只翻译参数格式：%s换成?，列表参数展开为(?, ?, ...)，用于IN
+"""
+import sqlite3
+
+threadsafety = 1  # adbapi要求
+paramstyle = 'format'
+Error = sqlite3.Error
+OperationalError = sqlite3.OperationalError
+
+# 与MySQL中的表结构对应，只包含pipelines.py和insert_mysql.py用到的列
+schema = '''
+CREATE TABLE researcher(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, title TEXT NOT NULL DEFAULT '',
+                        affiliation TEXT NOT NULL DEFAULT '', UNIQUE(name, affiliation));
+CREATE TABLE author(id INTEGER PRIMARY KEY AUTOINCREMENT, rid INTEGER NOT NULL, email TEXT NOT NULL DEFAULT '',
+                    university TEXT NOT NULL DEFAULT '', college TEXT NOT NULL DEFAULT '', lab TEXT NOT NULL DEFAULT '',
+                    need_disambiguation INTEGER NOT NULL DEFAULT 0);
+CREATE INDEX author_rid ON author(rid);
+CREATE TABLE venue(name TEXT PRIMARY KEY, kind TEXT NOT NULL);
+CREATE TABLE paper(id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, venue TEXT, year TEXT,
+                   author_count INTEGER);
+CREATE TABLE author_paper(aid INTEGER NOT NULL, pid INTEGER NOT NULL, contribution TEXT NOT NULL,
+                          PRIMARY KEY(aid, pid));
+CREATE INDEX author_paper_pid ON author_paper(pid);
+'''
+
+
+def translate(sql: str, args) -> tuple:
+    """
+    :return: (SQLite的语句, 参数列表)
+    """
+    if args is None:
+        return sql, ()
+    parts = sql.split('%s')
+    if len(parts) - 1 != len(args):
+        raise sqlite3.ProgrammingError(f'语句中有{len(parts) - 1}个参数，给出了{len(args)}个')
+    statement, params = [parts[0]], []
+    for arg, part in zip(args, parts[1:]):
+        if isinstance(arg, (list, tuple)):
+            statement.append('(' + ', '.join(['?'] * len(arg)) + ')')
+            params.extend(arg)
+        else:
+            statement.append('?')
+            params.append(arg)
+        statement.append(part)
+    return ''.join(statement), params
+
+
+class Cursor:
+    def __init__(self, connection: sqlite3.Connection):
+        self.cursor = connection.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def execute(self, sql: str, args=None) -> int:
+        self.cursor.execute(*translate(sql, args))
+        return self.cursor.rowcount
+
+    def executemany(self, sql: str, args_list) -> int:
+        count = 0
+        for args in args_list:
+            count += self.execute(sql, args)
+        return count
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+class Connection:
+    def __init__(self, database: str):
+        # 连接池在工作线程中建立连接，关闭连接时却在reactor线程中
+        self.connection = sqlite3.connect(database, timeout=60, check_same_thread=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def cursor(self, cursor_class=None) -> Cursor:
+        return Cursor(self.connection)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+def connect(database: str, **kwargs) -> Connection:
+    """
+    :param database: SQLite数据库文件，其余参数（user、host等）被忽略
+    """
+    return Connection(database)
+
+
+def create_database(path: str):
+    connection = sqlite3.connect(path)
+    connection.executescript(schema)
+    connection.close()
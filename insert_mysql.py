@@ -10,9 +10,36 @@ import pandas as pd
 import logging
 import json
 import argparse
+import multiprocessing
+import tempfile
+import unicodedata
+import hashlib
+import uuid
+import time
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
 need_disambiguation_pattern = '*_disambiguation_article.csv'
 dont_need_disambiguation_pattern = '*_undisambiguation_article.csv'
+upsert_lock_name = 'insert_mysql.upsert'  # 并行导入时写入venue、paper所持有的数据库命名锁
+upsert_lock_timeout = 600
+worker_inserter = None  # 并行导入时每个进程各自的BulkInserter，由init_worker创建
+worker_stop_event = None  # 并行导入时某个文件出错后设置，各进程不再开始导入新的文件
+max_cached_venues = 100000
+hash_block_size = 1 << 20
+# DBLP导出的csv文件的列，按位置读取，表头的名称不影响导入
+csv_columns = ['name', 'key', 'title', 'year', 'kind', 'venue', 'author_count', 'is_first_author']
+csv_dtypes = {'name': str, 'key': str, 'title': str, 'year': str, 'kind': str, 'venue': str, 'author_count': 'float64'}
+csv_chunk_size = 5000  # 每次从csv文件读取的行数
+csv_queue_size = 4  # 读取线程最多领先写入线程的块数
+max_pending_rows = 100000  # 单个文件的行数超过此数时，不等文件读完就提交
+# 与get_venue_kind、逐行导入中判断第一作者的逻辑相同，用于staging模式的合并语句
+venue_kind_sql = "CASE WHEN CAST(s.kind AS BINARY) LIKE '<journal>%' THEN 'journal' " \
+                 "WHEN CAST(s.kind AS BINARY) LIKE '<crossref>%' THEN 'conference' ELSE s.kind END"
+contribution_sql = "CASE WHEN LOWER(TRIM(s.is_first_author)) IN ('true', '1') THEN 'FIRST_AUTHOR' " \
+                   "ELSE 'PAPER_AUTHOR' END"
 
 logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.INFO)
@@ -23,6 +50,26 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
+def get_venue_kind(kind: str) -> str:
+    journal_pattern = '<journal>'
+    crossref_pattern = '<crossref>'
+    if kind.startswith(journal_pattern):
+        return 'journal'
+    elif kind.startswith(crossref_pattern):
+        return 'conference'
+    else:
+        return kind
+
+
+def title_key(title: str) -> str:
+    """
+    :param title: 论文题目
+    :return: 忽略大小写、重音和末尾空格的比较键，在MySQL默认的排序规则下相等的题目，比较键也相等
+    """
+    decomposed = unicodedata.normalize('NFKD', title)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().rstrip()
+
+
 def insert_csv_into_mysql(csv_file: str, need_disambiguation: bool, author_title: str,
                           university: str, mysql_connect):
     """
@@ -35,16 +82,6 @@ def insert_csv_into_mysql(csv_file: str, need_disambiguation: bool, author_title
 
     csv文件格式请参照DBLP爬虫部分
     """
-    def get_venue_kind(kind: str) -> str:
-        journal_pattern = '<journal>'
-        crossref_pattern = '<crossref>'
-        if kind.startswith(journal_pattern):
-            return 'journal'
-        elif kind.startswith(crossref_pattern):
-            return 'conference'
-        else:
-            return kind
-
     def execute_insert_sql(connection_: pymysql.connections.Connection, sql_: str):
         with connection_.cursor() as cursor:
             try:
@@ -104,9 +141,755 @@ def insert_csv_into_mysql(csv_file: str, need_disambiguation: bool, author_title
             execute_insert_sql(connection, sql)
 
 
-def main(args_):
-    data_dirs = args_.data_dirs
-    connection_config = json.load(open('./ScholarDataset/config.json'))
+class IngestManifest:
+    """
+    导入清单：每个csv文件一行JSON，记录路径、大小、修改时间、内容哈希和导入结果，追加写入
+
+    再次运行时跳过已成功导入到同一数据库、且内容没有变化的文件。文件的所有行都提交之后才记为done，
+    中断的运行再次启动时，从没有记为done的文件继续
+    """
+
+    def __init__(self, path: str, database: str):
+        """
+        :param path: 清单文件路径，不存在时新建
+        :param database: 数据库的标识，导入到其他数据库时不跳过任何文件
+        """
+        self.path = path
+        self.database = database
+        self.entries = {}  # {文件绝对路径: 最后一条记录}
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning(f'导入清单中有无法解析的行，已忽略：{line!r}')  # 中断时可能只写了半行
+                        continue
+                    self.entries[entry['path']] = entry
+            self.compact()
+        self.file = open(path, 'a', encoding='utf8')
+
+    def compact(self):
+        """
+        每个文件只保留最后一条记录，重写清单
+        """
+        with open(self.path + '.tmp', 'w', encoding='utf8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(self.path + '.tmp', self.path)
+
+    def is_done(self, csv_file: str) -> bool:
+        """
+        :return: 该文件是否已成功导入到当前数据库且内容没有变化。大小和修改时间都相同时不再计算哈希
+        """
+        entry = self.entries.get(os.path.abspath(csv_file))
+        if entry is None or entry['status'] != 'done' or entry['database'] != self.database:
+            return False
+        stat = os.stat(csv_file)
+        if (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime']):
+            return True
+        if file_hash(csv_file) != entry['hash']:
+            return False
+        self.record(csv_file, 'done')  # 只是修改时间变了，更新记录，下次不必再算哈希
+        return True
+
+    def record(self, csv_file: str, status: str, error: str = None):
+        """
+        :param status: done：所有行都已提交；failed：导入出错
+        :param error: 导入出错时的错误信息
+        """
+        stat = os.stat(csv_file)
+        entry = {'path': os.path.abspath(csv_file), 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                 'hash': file_hash(csv_file), 'database': self.database, 'status': status, 'error': error,
+                 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+        self.entries[entry['path']] = entry
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def file_hash(path: str) -> str:
+    """
+    :return: 文件内容的sha1
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(hash_block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class IngestCache:
+    """
+    导入过程中已知的venue名称和{题目: paper id}，启动时从数据库预热一次，之后随写入更新
+
+    两者都是LRU，条目数有上限，多百万论文的库也不会占满内存。题目以其哈希值为键，只有与缓存中的题目完全相同才命中，
+    大小写等不同的写法仍交给数据库比较，结果与逐行查询一致
+    """
+
+    def __init__(self, max_papers: int, max_venues: int = max_cached_venues):
+        """
+        :param max_papers: 最多缓存的论文数
+        :param max_venues: 最多缓存的venue数
+        """
+        self.max_papers = max_papers
+        self.max_venues = max_venues
+        self.venues = OrderedDict()  # {venue名称: None}
+        self.papers = OrderedDict()  # {题目哈希: paper id}
+
+    def warm(self, connection: pymysql.connections.Connection):
+        """
+        读入库中的venue和最新插入的max_papers篇论文
+        """
+        with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute("SELECT name FROM venue LIMIT %s;", (self.max_venues,))
+            for name, in cursor:
+                self.add_venue(name)
+            # 按id降序读取，再按升序放入，最新的论文最后被淘汰
+            cursor.execute("SELECT id, title FROM paper ORDER BY id DESC LIMIT %s;", (self.max_papers,))
+            papers = [(self.title_digest(title), paper_id) for paper_id, title in cursor]
+        for digest, paper_id in reversed(papers):
+            self.put_lru(self.papers, digest, paper_id, self.max_papers)
+        logger.info(f'缓存预热完成：{len(self.venues)}个venue，{len(self.papers)}篇论文')
+
+    @staticmethod
+    def title_digest(title: str) -> bytes:
+        return hashlib.blake2b(title.encode('utf8'), digest_size=8).digest()
+
+    @staticmethod
+    def put_lru(entries: OrderedDict, key, value, max_size: int):
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > max_size:
+            entries.popitem(last=False)
+
+    def has_venue(self, name: str) -> bool:
+        if name not in self.venues:
+            return False
+        self.venues.move_to_end(name)
+        return True
+
+    def add_venue(self, name: str):
+        self.put_lru(self.venues, name, None, self.max_venues)
+
+    def get_paper(self, title: str) -> int:
+        """
+        :return: 缓存的paper id，未命中时返回None
+        """
+        digest = self.title_digest(title)
+        paper_id = self.papers.get(digest)
+        if paper_id is not None:
+            self.papers.move_to_end(digest)
+        return paper_id
+
+    def add_paper(self, title: str, paper_id: int):
+        self.put_lru(self.papers, self.title_digest(title), paper_id, self.max_papers)
+
+
+class BulkInserter:
+    """
+    批量导入模式：整个运行过程只用一个数据库连接，论文按批写入
+
+    每个researcher的researcher、author两行仍逐条插入（需要其自增id），论文行则先缓存起来，
+    每个文件读完后，若已攒够batch_size行，就用几条多行INSERT（或LOAD DATA LOCAL INFILE）写入venue、paper、author_paper，每批只提交一次。
+    写入结果与insert_csv_into_mysql逐行导入相同
+    """
+
+    def __init__(self, connection: pymysql.connections.Connection, batch_size: int = 1000, load_data: bool = False,
+                 upsert_lock: bool = False, cache: IngestCache = None, manifest: IngestManifest = None):
+        """
+        :param connection: 数据库连接，使用LOAD DATA时需要以local_infile=True建立
+        :param batch_size: 每批写入的论文行数
+        :param load_data: 是否用LOAD DATA LOCAL INFILE写入venue、paper。服务器不允许时自动退回多行INSERT
+        :param upsert_lock: 多个进程同时导入时为True：写入venue、paper期间持有数据库命名锁，并在释放前提交，
+            避免不同进程重复插入同一篇论文。researcher、author插入后立即提交，论文行每攒够batch_size行提交一次，
+            不在整个文件期间持有锁，其他进程不会因此等锁超时
+        :param cache: 已预热的IngestCache。venue、论文都命中缓存的批次不再查询venue、paper表，也不需要命名锁
+        :param manifest: 导入清单，文件的所有行提交后记为done
+        """
+        self.connection = connection
+        self.cache = cache
+        self.manifest = manifest
+        self.batch_size = batch_size
+        self.upsert_lock = upsert_lock
+        self.load_data = load_data and self.local_infile_allowed()
+        if load_data and not self.load_data:
+            logger.warning('服务器未开启local_infile，改用多行INSERT导入')
+        # 缓存的论文行：(author_id, venue名称, venue类型, 题目, 年份, 作者数, 贡献)
+        self.pending = []
+        self.completed_files = []  # 所有行都已放入pending、但还没有提交的csv文件
+
+    def local_infile_allowed(self) -> bool:
+        with self.connection.cursor() as cursor:
+            cursor.execute("SHOW VARIABLES LIKE 'local_infile';")
+            result = cursor.fetchone()
+        return bool(result) and result[1].upper() == 'ON'
+
+    def insert_csv(self, csv_file: str, need_disambiguation: bool, author_title: str, university: str):
+        """
+        参数含义同insert_csv_into_mysql。文件分块读取，论文行可能要等到之后的flush才真正写入
+        """
+        author_id = None
+        for author_name, rows in read_csv_rows(csv_file):
+            if author_id is None:
+                author_id = self.insert_author(author_name, need_disambiguation, author_title, university)
+            self.add_rows(author_id, rows)
+        self.finish_file(csv_file)
+
+    def insert_stream(self, stream):
+        """
+        :param stream: CsvStream，导入其中的所有文件。出错的文件记入导入清单后重新抛出异常
+        """
+        author_id = None
+        for (csv_file, need_disambiguation, author_title, university), author_name, rows, error in stream:
+            try:
+                if error is not None:
+                    raise error
+                if rows is None:
+                    self.finish_file(csv_file)
+                    author_id = None
+                    continue
+                if author_id is None:
+                    author_id = self.insert_author(author_name, need_disambiguation, author_title, university)
+                self.add_rows(author_id, rows)
+            except Exception as e:
+                if self.manifest is not None:
+                    self.manifest.record(csv_file, 'failed', repr(e))
+                raise
+
+    def insert_author(self, author_name: str, need_disambiguation: bool, author_title: str, university: str) -> int:
+        """
+        :return: 插入researcher后的last_insert_id，即之后author_paper行的aid
+        """
+        need_disambiguation = '1' if need_disambiguation else '0'
+        with self.connection.cursor() as cursor:
+            self.execute(cursor, "INSERT IGNORE INTO researcher(name, title, affiliation) VALUES (%s, %s, %s);",
+                         (author_name, author_title, university))
+            # 与逐行导入时新建连接后的last_insert_id()一致：被IGNORE的researcher得到0
+            author_id = cursor.lastrowid
+            self.execute(cursor, "INSERT IGNORE INTO author(rid, need_disambiguation) VALUES (%s, %s);",
+                         (str(author_id), need_disambiguation))
+        if self.upsert_lock:
+            self.connection.commit()
+        return author_id
+
+    def add_rows(self, author_id: int, rows: list):
+        """
+        :param rows: parse_csv_chunk的结果
+        """
+        self.pending.extend((author_id,) + row for row in rows)
+        if len(self.pending) >= (self.batch_size if self.upsert_lock else max_pending_rows):
+            self.flush()
+
+    def finish_file(self, csv_file: str):
+        self.completed_files.append(csv_file)
+        # 通常只在文件之间提交，中断后按导入清单重新开始时不会有导入了一半的文件
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        写入缓存的所有论文行并提交
+        """
+        rows, self.pending = self.pending, []
+        completed_files, self.completed_files = self.completed_files, []
+        try:
+            with self.connection.cursor() as cursor:
+                if rows:
+                    venues = self.new_venues(rows)
+                    first_rows = {}
+                    for row in rows:
+                        first_rows.setdefault(row[3], row)
+                    paper_ids = self.cached_paper_ids(first_rows)
+                    if venues or len(paper_ids) < len(first_rows):
+                        with self.locked_upsert(cursor):
+                            self.insert_venues(cursor, venues)
+                            paper_ids.update(self.upsert_papers(cursor, first_rows, paper_ids))
+                    self.execute_many(cursor, "INSERT IGNORE INTO author_paper(aid, pid, contribution) VALUES (%s, %s, %s);",
+                                      [(str(row[0]), str(paper_ids[row[3]]), row[6]) for row in rows])
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        if self.manifest is not None:
+            for csv_file in completed_files:
+                self.manifest.record(csv_file, 'done')
+        # 提交成功后才写入缓存，回滚的数据不会留在缓存里
+        if self.cache is not None and rows:
+            for name, kind in venues:
+                self.cache.add_venue(name)
+            for title, paper_id in paper_ids.items():
+                self.cache.add_paper(title, paper_id)
+
+    def discard(self):
+        """
+        导入出错时调用：丢弃还没有提交的所有行
+        """
+        self.pending = []
+        self.completed_files = []
+        self.connection.rollback()
+
+    @contextmanager
+    def locked_upsert(self, cursor):
+        """
+        upsert_lock为True时，在数据库命名锁内执行写入venue、paper的代码，进入前和退出前各提交一次
+        """
+        if not self.upsert_lock:
+            yield
+            return
+        cursor.execute("SELECT GET_LOCK(%s, %s);", (upsert_lock_name, upsert_lock_timeout))
+        if cursor.fetchone()[0] != 1:
+            raise TimeoutError(f'等待数据库命名锁{upsert_lock_name}超过{upsert_lock_timeout}秒')
+        try:
+            self.connection.commit()  # 开始新的事务，才能看到其他进程刚提交的论文
+            yield
+            self.connection.commit()
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s);", (upsert_lock_name,))
+
+    def new_venues(self, rows: list) -> list:
+        """
+        :return: [(venue名称, venue类型), ...]，不含缓存中已有的venue
+        """
+        venues = {}
+        for row in rows:
+            venues.setdefault(row[1], row[2])  # 同名取第一次出现的类型
+        if self.cache is None:
+            return list(venues.items())
+        return [(name, kind) for name, kind in venues.items() if not self.cache.has_venue(name)]
+
+    def insert_venues(self, cursor, venues: list):
+        if not venues:
+            return
+        if self.load_data:
+            self.load_rows(cursor, 'venue', ('name', 'kind'), venues)
+        else:
+            self.execute_many(cursor, "INSERT IGNORE INTO venue(name, kind) VALUES (%s, %s);", venues)
+
+    def cached_paper_ids(self, first_rows: dict) -> dict:
+        """
+        :return: 命中缓存的{题目: paper id}
+        """
+        if self.cache is None:
+            return {}
+        paper_ids = {}
+        for title in first_rows:
+            paper_id = self.cache.get_paper(title)
+            if paper_id is not None:
+                paper_ids[title] = paper_id
+        return paper_ids
+
+    def upsert_papers(self, cursor, first_rows: dict, known_ids: dict) -> dict:
+        """
+        :param first_rows: {题目: 该题目第一次出现的行}
+        :param known_ids: 已知id的{题目: paper id}，这些题目不再查询
+        :return: {题目: paper id}。已存在的题目沿用原有的id，新题目按第一次出现的行插入
+        """
+        paper_ids = self.select_paper_ids(cursor, [title for title in first_rows if title not in known_ids])
+
+        # 按数据库的排序规则，比较键相同的新题目可能是同一篇论文：每个比较键第一次出现的题目批量插入，
+        # 再次出现的题目先写入之前的批次，再逐个按原先的方式查询、插入。插入顺序与逐行导入相同
+        batch, seen_keys = [], set()
+        for title in first_rows:
+            if title in paper_ids or title in known_ids:
+                continue
+            key = title_key(title)
+            if key not in seen_keys:
+                seen_keys.add(key)
+                batch.append(title)
+                continue
+            paper_ids.update(self.insert_new_papers(cursor, batch, first_rows))
+            batch = []
+            found = self.select_paper_ids(cursor, [title])
+            paper_ids.update(found or self.insert_new_papers(cursor, [title], first_rows))
+        paper_ids.update(self.insert_new_papers(cursor, batch, first_rows))
+        return paper_ids
+
+    def insert_new_papers(self, cursor, titles: list, first_rows: dict) -> dict:
+        """
+        :return: 插入titles后查到的{题目: paper id}
+        """
+        if not titles:
+            return {}
+        papers = [(title, first_rows[title][1], first_rows[title][4], str(first_rows[title][5])) for title in titles]
+        if self.load_data:
+            self.load_rows(cursor, 'paper', ('title', 'venue', 'year', 'author_count'), papers)
+        else:
+            self.execute_many(cursor, "INSERT IGNORE INTO paper(title, venue, year, author_count) VALUES (%s, %s, %s, %s);",
+                              papers)
+        return self.select_paper_ids(cursor, titles)
+
+    def select_paper_ids(self, cursor, titles: list) -> dict:
+        """
+        :return: {题目: paper id}，只包含表中已有的题目。题目的比较由数据库完成，与WHERE title=...的结果一致
+        """
+        if not titles:
+            return {}
+        # 把查询的题目连同序号作为派生表与paper连接，这样即使数据库返回的题目大小写不同也能对应回来
+        query_table = ' UNION ALL '.join(['SELECT %s AS i, %s AS title'] * len(titles))
+        cursor.execute(f"SELECT q.i, MIN(paper.id) FROM ({query_table}) q JOIN paper ON paper.title = q.title GROUP BY q.i;",
+                       [value for i, title in enumerate(titles) for value in (i, title)])
+        return {titles[int(i)]: paper_id for i, paper_id in cursor.fetchall()}
+
+    def load_rows(self, cursor, table: str, columns: tuple, rows: list):
+        """
+        用LOAD DATA LOCAL INFILE把rows写入table，重复的行被忽略
+        """
+        with tempfile.NamedTemporaryFile('w', encoding='utf8', suffix='.tsv', delete=False) as f:
+            for row in rows:
+                f.write(load_data_line(row))
+        try:
+            sql = f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {table} CHARACTER SET utf8mb4 " \
+                  f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({', '.join(columns)});"
+            self.execute(cursor, sql, (f.name,))
+        finally:
+            os.remove(f.name)
+
+    def execute(self, cursor, sql_: str, args_: tuple):
+        try:
+            cursor.execute(sql_, args_)
+        except Exception as e:
+            logger.error(f'Meet an error: {e=}, {type(e)=}, when executing sql query "{sql_}" with {args_}')
+            raise
+
+    def execute_many(self, cursor, sql_: str, rows: list):
+        try:
+            cursor.executemany(sql_, rows)
+        except Exception as e:
+            logger.error(f'Meet an error: {e=}, {type(e)=}, when executing sql query "{sql_}" with {len(rows)} rows')
+            raise
+
+
+class StagingInserter(BulkInserter):
+    """
+    staging导入模式：整个运行的csv原始行先写入暂存表，最后在一个事务中用几条INSERT ... SELECT合并到
+    researcher、author、venue、paper、author_paper。写入结果与insert_csv_into_mysql逐行导入相同
+
+    暂存表的题目、姓名等列按原表建立，比较时与原表使用相同的排序规则。表名带有本次运行的后缀，同一个库上同时进行的
+    多次导入互不影响；合并的语句要多次引用同一张暂存表，因此不能用只能引用一次的TEMPORARY表
+    """
+    staging_tables = {
+        'stg_researcher': "CREATE TABLE {table}(seq INT NOT NULL PRIMARY KEY, need_disambiguation CHAR(1)) "
+                          "SELECT name, title, affiliation FROM researcher WHERE FALSE;",
+        'stg_researcher_id': "CREATE TABLE {table}(seq INT NOT NULL PRIMARY KEY, rid INT NOT NULL);",
+        'stg_paper': "CREATE TABLE {table}(seq BIGINT NOT NULL PRIMARY KEY, file_seq INT NOT NULL, year VARCHAR(32), "
+                     "kind VARCHAR(255), author_count INT, is_first_author VARCHAR(16)) "
+                     "SELECT title, venue FROM paper WHERE FALSE;",
+    }
+
+    def __init__(self, connection: pymysql.connections.Connection, batch_size: int = 1000, load_data: bool = False,
+                 manifest: IngestManifest = None, run_id: str = None):
+        """
+        参数含义同BulkInserter。合并期间持有与并行导入相同的数据库命名锁
+        :param run_id: 暂存表名的后缀，默认随机生成
+        """
+        super().__init__(connection, batch_size, load_data, upsert_lock=True, manifest=manifest)
+        self.pending_researchers = []  # (序号, 姓名, 职称, 大学, 是否需要消歧)
+        self.file_count = 0
+        self.row_count = 0
+        run_id = run_id or uuid.uuid4().hex[:12]
+        self.tables = {name: f'{name}_{run_id}' for name in self.staging_tables}
+        self.stg_researcher = self.tables['stg_researcher']
+        self.stg_researcher_id = self.tables['stg_researcher_id']
+        self.stg_paper = self.tables['stg_paper']
+        self.create_staging_tables()
+
+    def create_staging_tables(self):
+        with self.connection.cursor() as cursor:
+            for name, sql_ in self.staging_tables.items():
+                self.execute(cursor, sql_.format(table=self.tables[name]), None)
+
+    def drop_staging_tables(self):
+        """
+        运行结束时调用，出错时也要调用。删除失败时只记录日志，不掩盖导入本身的异常
+        """
+        try:
+            with self.connection.cursor() as cursor:
+                for table in self.tables.values():
+                    self.execute(cursor, f"DROP TABLE IF EXISTS {table};", None)
+        except Exception as e:
+            logger.warning(f'删除暂存表{list(self.tables.values())}失败，需要手动删除：{repr(e)}')
+
+    def insert_author(self, author_name: str, need_disambiguation: bool, author_title: str, university: str) -> int:
+        """
+        :return: 该文件在stg_researcher中的序号
+        """
+        self.file_count += 1
+        self.pending_researchers.append((self.file_count, author_name, author_title, university,
+                                         '1' if need_disambiguation else '0'))
+        return self.file_count
+
+    def add_rows(self, file_seq: int, rows: list):
+        """
+        :param rows: read_raw_csv_rows产生的论文行
+        """
+        for row in rows:
+            self.row_count += 1
+            self.pending.append((self.row_count, file_seq) + row)
+        if len(self.pending) >= max_pending_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        把缓存的行写入暂存表并提交。此时还没有写入正式的表，文件也不记入导入清单
+        """
+        researchers, self.pending_researchers = self.pending_researchers, []
+        rows, self.pending = self.pending, []
+        try:
+            with self.connection.cursor() as cursor:
+                if self.load_data:
+                    self.load_rows(cursor, self.stg_researcher,
+                                   ('seq', 'name', 'title', 'affiliation', 'need_disambiguation'), researchers)
+                    self.load_rows(cursor, self.stg_paper, ('seq', 'file_seq', 'title', 'year', 'kind', 'venue',
+                                                         'author_count', 'is_first_author'), rows)
+                else:
+                    self.execute_many(cursor, f"INSERT INTO {self.stg_researcher}(seq, name, title, affiliation, "
+                                              f"need_disambiguation) VALUES (%s, %s, %s, %s, %s);", researchers)
+                    self.execute_many(cursor, f"INSERT INTO {self.stg_paper}(seq, file_seq, title, year, kind, venue, "
+                                              f"author_count, is_first_author) VALUES (%s, %s, %s, %s, %s, %s, %s, %s);",
+                                      rows)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def merge(self):
+        """
+        把暂存表合并到正式的表，所有语句在同一个事务中执行，成功后把所有文件记入导入清单
+        """
+        self.flush()
+        try:
+            with self.connection.cursor() as cursor:
+                with self.locked_upsert(cursor):
+                    self.merge_researchers(cursor)
+                    self.merge_papers(cursor)
+        except Exception:
+            self.connection.rollback()
+            raise
+        completed_files, self.completed_files = self.completed_files, []
+        if self.manifest is not None:
+            for csv_file in completed_files:
+                self.manifest.record(csv_file, 'done')
+        logger.info(f'staging合并完成：{self.file_count}个文件，{self.row_count}行')
+
+    def merge_researchers(self, cursor):
+        """
+        写入researcher、author，并在stg_researcher_id中记下每个文件的researcher id
+        """
+        self.execute(cursor, "SELECT IFNULL(MAX(id), 0) FROM researcher;", None)
+        watermark = cursor.fetchone()[0]
+        self.execute(cursor, f"INSERT IGNORE INTO researcher(name, title, affiliation) "
+                             f"SELECT name, title, affiliation FROM {self.stg_researcher} ORDER BY seq;", None)
+        # 逐行导入时每个文件取插入researcher后的last_insert_id，被IGNORE时为0。新插入的researcher按id顺序
+        # 与暂存表中相同(姓名, 职称, 大学)的文件按序号顺序一一对应，没有对应上的文件即被IGNORE
+        self.execute(cursor, f"INSERT INTO {self.stg_researcher_id}(seq, rid) SELECT s.seq, r.id "
+                             f"FROM (SELECT seq, name, title, affiliation, ROW_NUMBER() OVER "
+                             f"(PARTITION BY name, title, affiliation ORDER BY seq) AS k FROM {self.stg_researcher}) s "
+                             f"JOIN (SELECT id, name, title, affiliation, ROW_NUMBER() OVER "
+                             f"(PARTITION BY name, title, affiliation ORDER BY id) AS k FROM researcher WHERE id > %s) r "
+                             f"ON r.name = s.name AND r.title = s.title AND r.affiliation = s.affiliation AND r.k = s.k;",
+                     (watermark,))
+        self.execute(cursor, f"INSERT IGNORE INTO author(rid, need_disambiguation) "
+                             f"SELECT IFNULL(i.rid, 0), s.need_disambiguation FROM {self.stg_researcher} s "
+                             f"LEFT JOIN {self.stg_researcher_id} i ON i.seq = s.seq ORDER BY s.seq;", None)
+
+    def merge_papers(self, cursor):
+        """
+        写入venue、paper、author_paper。author_paper的aid与逐行导入相同，为researcher id
+        """
+        self.execute(cursor, f"INSERT IGNORE INTO venue(name, kind) SELECT s.venue, {venue_kind_sql} "
+                             f"FROM {self.stg_paper} s ORDER BY s.seq;", None)
+        # 每个题目只插入第一次出现的行，库中已有的题目不再插入
+        self.execute(cursor, f"INSERT IGNORE INTO paper(title, venue, year, author_count) "
+                             f"SELECT s.title, s.venue, s.year, s.author_count FROM {self.stg_paper} s "
+                             f"JOIN (SELECT MIN(seq) AS seq FROM {self.stg_paper} GROUP BY title) f ON f.seq = s.seq "
+                             f"WHERE NOT EXISTS (SELECT 1 FROM paper WHERE paper.title = s.title) ORDER BY s.seq;", None)
+        self.execute(cursor, f"INSERT IGNORE INTO author_paper(aid, pid, contribution) "
+                             f"SELECT IFNULL(i.rid, 0), p.pid, {contribution_sql} FROM {self.stg_paper} s "
+                             f"JOIN (SELECT s2.seq, MIN(paper.id) AS pid FROM {self.stg_paper} s2 "
+                             f"JOIN paper ON paper.title = s2.title GROUP BY s2.seq) p ON p.seq = s.seq "
+                             f"LEFT JOIN {self.stg_researcher_id} i ON i.seq = s.file_seq ORDER BY s.seq;", None)
+
+
+class CsvStream:
+    """
+    在后台线程中分块读取、解析csv文件，解析结果经有界队列交给写入数据库的线程，
+    读取与写入同时进行，内存中最多有csv_queue_size块未写入的数据
+    """
+
+    def __init__(self, csv_files: list, read_rows=None, queue_size: int = csv_queue_size):
+        """
+        :param csv_files: find_csv_files的结果
+        :param read_rows: 读取单个文件的函数，默认为read_csv_rows
+        """
+        self.csv_files = csv_files
+        self.read_rows = read_rows or read_csv_rows
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.read_all, daemon=True)
+
+    def __iter__(self):
+        """
+        :return: 依次产生(csv文件信息, 作者姓名, 论文行, 错误)。一个文件的所有块之后是论文行为None的结束标记；
+            读取出错时产生该文件带错误的一项，之后不再产生
+        """
+        self.thread.start()
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                yield item
+                if item[3] is not None:
+                    return
+        finally:
+            self.stopped.set()  # 写入线程出错或提前结束时，通知读取线程退出
+            self.thread.join()
+
+    def read_all(self):
+        for csv_file_info in self.csv_files:
+            try:
+                for author_name, rows in self.read_rows(csv_file_info[0]):
+                    if not self.put((csv_file_info, author_name, rows, None)):
+                        return
+            except Exception as e:
+                self.put((csv_file_info, None, None, e))
+                return
+            if not self.put((csv_file_info, None, None, None)):
+                return
+        self.put(None)
+
+    def put(self, item) -> bool:
+        """
+        :return: 放入队列时返回True，写入线程已经停止时返回False
+        """
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+
+def read_csv_chunks(csv_file: str, chunk_size: int = csv_chunk_size, raw: bool = False):
+    """
+    按csv_columns分块读取csv文件，跳过空块
+    :param raw: 为True时is_first_author保留文件中的原文，否则转换为bool
+    """
+    if raw:
+        options = {'dtype': dict(csv_dtypes, is_first_author=str)}
+    else:
+        options = {'dtype': csv_dtypes, 'converters': {'is_first_author': parse_bool}}
+    for chunk in pd.read_csv(csv_file, header=0, names=csv_columns, usecols=range(len(csv_columns)),
+                             chunksize=chunk_size, **options):
+        if not chunk.empty:
+            yield chunk
+
+
+def read_csv_rows(csv_file: str):
+    """
+    :return: 依次产生(作者姓名, 该块的论文行)，作者姓名取自该块的第一行。空文件不产生任何结果
+    """
+    for chunk in read_csv_chunks(csv_file):
+        yield chunk['name'].iat[0], parse_csv_chunk(chunk)
+
+
+def read_raw_csv_rows(csv_file: str):
+    """
+    :return: 同read_csv_rows，但论文行为未经转换的(题目, 年份, venue类型, venue名称, 作者数, 是否第一作者)，缺失值为None
+    """
+    for chunk in read_csv_chunks(csv_file, raw=True):
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        rows = [(title, year, kind, venue, None if author_count is None else int(author_count), is_first_author)
+                for title, year, kind, venue, author_count, is_first_author
+                in zip(chunk['title'], chunk['year'], chunk['kind'], chunk['venue'], chunk['author_count'],
+                       chunk['is_first_author'])]
+        yield chunk['name'].iat[0], rows
+
+
+def parse_csv_chunk(chunk: pd.DataFrame) -> list:
+    """
+    :return: [(venue名称, venue类型, 题目, 年份, 作者数, 贡献), ...]
+    """
+    return [(venue, get_venue_kind(kind), title, str(year), int(author_count),
+             'FIRST_AUTHOR' if is_first_author else 'PAPER_AUTHOR')
+            for venue, kind, title, year, author_count, is_first_author
+            in zip(chunk['venue'], chunk['kind'], chunk['title'], chunk['year'], chunk['author_count'],
+                   chunk['is_first_author'])]
+
+
+def parse_bool(value: str) -> bool:
+    return value.strip().lower() in ('true', '1')
+
+
+def escape_load_data_field(value: str) -> str:
+    """
+    :return: 按LOAD DATA默认的转义规则转义反斜杠、制表符和换行符
+    """
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def load_data_line(row: tuple) -> str:
+    """
+    :return: LOAD DATA文件中的一行。None写作\\N，导入后为NULL，与executemany插入None的结果相同
+    """
+    return '\t'.join('\\N' if value is None else escape_load_data_field(str(value)) for value in row) + '\n'
+
+
+def create_cache(connection: pymysql.connections.Connection, cache_size: int) -> IngestCache:
+    """
+    :return: 已预热的IngestCache，cache_size为0时返回None，不使用缓存
+    """
+    if cache_size <= 0:
+        return None
+    cache = IngestCache(cache_size)
+    cache.warm(connection)
+    return cache
+
+
+def init_worker(connection_config: dict, batch_size: int, load_data: bool, cache_size: int,
+                stop_event: multiprocessing.Event):
+    """
+    进程池的初始化函数：每个进程建立自己的数据库连接、缓存和BulkInserter
+    """
+    global worker_inserter, worker_stop_event
+    worker_stop_event = stop_event
+    connection = pymysql.connect(host=connection_config['host'],
+                                 user=connection_config['user'],
+                                 password=connection_config['password'],
+                                 database=connection_config['database'],
+                                 local_infile=load_data)
+    worker_inserter = BulkInserter(connection, batch_size, load_data, upsert_lock=True,
+                                   cache=create_cache(connection, cache_size))
+
+
+def insert_csv_in_worker(csv_file_info: tuple) -> tuple:
+    """
+    :param csv_file_info: find_csv_files结果中的一项
+    :return: (csv文件路径, 状态, 错误信息)。状态为done时该文件的所有行都已提交；failed时丢弃还没有提交的行，
+        已按批提交的行保留，重新导入时被忽略；其他文件出错后还没有开始的文件为skipped
+    """
+    if worker_stop_event.is_set():
+        return csv_file_info[0], 'skipped', None
+    try:
+        worker_inserter.insert_csv(*csv_file_info)
+        worker_inserter.flush()
+    except Exception as e:
+        worker_inserter.discard()
+        return csv_file_info[0], 'failed', repr(e)
+    return csv_file_info[0], 'done', None
+
+
+def find_csv_files(data_dirs: list) -> list:
+    """
+    :param data_dirs: 输入文件夹列表
+    :return: [(csv文件路径, 是否需要消歧, 职称, 大学), ...]，按遍历顺序
+    """
+    csv_files = []
     # 文件结构示例：计算机/哈尔滨工业大学/AssociateProfessor/小明/*.csv
     for data_dir in data_dirs:
         for university in os.listdir(data_dir):
@@ -119,13 +902,91 @@ def main(args_):
                     dis_arti = glob.glob(author_dir + '/' + need_disambiguation_pattern)
                     undis_arti = glob.glob(author_dir + '/' + dont_need_disambiguation_pattern)
                     if dis_arti:
-                        insert_csv_into_mysql(dis_arti[0], True, title, university, connection_config)
+                        csv_files.append((dis_arti[0], True, title, university))
                         logger.info(f'{author}需要消歧')
                     elif undis_arti:
-                        insert_csv_into_mysql(undis_arti[0], False, title, university, connection_config)
+                        csv_files.append((undis_arti[0], False, title, university))
                         logger.info(f'{author}不需要消歧')
                     else:
                         logger.warning(f'{author}找不到csv文件')
+    return csv_files
+
+
+def main(args_):
+    data_dirs = args_.data_dirs
+    connection_config = json.load(open('./ScholarDataset/config.json'))
+    manifest = IngestManifest(args_.manifest, f"{connection_config['host']}/{connection_config['database']}")
+    try:
+        csv_files = find_csv_files(data_dirs)
+        if not args_.force:
+            total = len(csv_files)
+            csv_files = [csv_file_info for csv_file_info in csv_files if not manifest.is_done(csv_file_info[0])]
+            logger.info(f'共{total}个csv文件，跳过{total - len(csv_files)}个已导入且没有变化的文件')
+        insert_csv_files(args_, connection_config, csv_files, manifest)
+    finally:
+        manifest.close()
+
+
+def insert_csv_files(args_, connection_config: dict, csv_files: list, manifest: IngestManifest):
+    """
+    按args_指定的方式导入csv_files，每个文件导入完成后记入manifest。某个文件出错时记为failed并停止导入
+    """
+    if args_.workers > 1 and args_.mode != 'bulk':
+        raise ValueError(f'--workers大于1时只支持bulk模式，而不是{args_.mode}')
+    if args_.workers > 1:
+        # 出错后不立即终止进程池：通知各进程不再开始新的文件，等正在导入的文件结束并记入清单后再抛出异常
+        stop_event = multiprocessing.Event()
+        failure = None
+        with multiprocessing.Pool(args_.workers, initializer=init_worker,
+                                  initargs=(connection_config, args_.batch_size, args_.load_data,
+                                            args_.cache_size, stop_event)) as pool:
+            for csv_file, status, error in pool.imap_unordered(insert_csv_in_worker, csv_files):
+                if status == 'skipped':
+                    continue
+                manifest.record(csv_file, status, error)
+                if status == 'failed':
+                    logger.error(f'{csv_file}导入失败：{error}')
+                    stop_event.set()
+                    failure = failure or (csv_file, error)
+                else:
+                    logger.info(f'{csv_file}导入完成')
+        if failure is not None:
+            raise RuntimeError(f'{failure[0]}导入失败：{failure[1]}')
+        return
+
+    if args_.mode == 'staging':
+        with pymysql.connect(host=connection_config['host'],
+                             user=connection_config['user'],
+                             password=connection_config['password'],
+                             database=connection_config['database'],
+                             local_infile=args_.load_data) as connection:
+            inserter = StagingInserter(connection, args_.batch_size, args_.load_data, manifest=manifest)
+            try:
+                inserter.insert_stream(CsvStream(csv_files, read_raw_csv_rows))
+                inserter.merge()
+            finally:
+                inserter.drop_staging_tables()
+        return
+
+    if args_.mode == 'bulk':
+        with pymysql.connect(host=connection_config['host'],
+                             user=connection_config['user'],
+                             password=connection_config['password'],
+                             database=connection_config['database'],
+                             local_infile=args_.load_data) as connection:
+            inserter = BulkInserter(connection, args_.batch_size, args_.load_data,
+                                    cache=create_cache(connection, args_.cache_size), manifest=manifest)
+            inserter.insert_stream(CsvStream(csv_files))
+            inserter.flush()
+        return
+
+    for csv_file, need_disambiguation, title, university in csv_files:
+        try:
+            insert_csv_into_mysql(csv_file, need_disambiguation, title, university, connection_config)
+        except Exception as e:
+            manifest.record(csv_file, 'failed', repr(e))
+            raise
+        manifest.record(csv_file, 'done')
 
 
 # 参数示例： --data_dirs C:/Users/12897/Documents/PythonProjects/ScholarDataset/data/input/计算机
@@ -133,5 +994,19 @@ if __name__ == '__main__':
     ap = argparse.ArgumentParser()
     ap.add_argument('--data_dirs', help='Input directory paths', dest='data_dirs', action="extend", nargs='+', type=str,
                     required=True)
+    ap.add_argument('--mode', help='row: 逐行导入；bulk: 单连接批量导入；staging: 先写入暂存表再一次性合并',
+                    dest='mode', type=str, default='row', choices=['row', 'bulk', 'staging'])
+    ap.add_argument('--batch_size', help='bulk模式每批写入的论文行数，只在文件之间提交，一批可能略多于此数', dest='batch_size', type=int, default=1000)
+    ap.add_argument('--load_data', help='bulk模式用LOAD DATA LOCAL INFILE写入，需服务器开启local_infile',
+                    dest='load_data', action='store_true')
+    ap.add_argument('--workers', help='并行导入的进程数，大于1时须与--mode bulk一起使用', dest='workers', type=int,
+                    default=1)
+    ap.add_argument('--cache_size', help='bulk模式在内存中缓存的论文数，0表示不缓存', dest='cache_size', type=int,
+                    default=500000)
+    ap.add_argument('--manifest', help='导入清单文件，已导入且没有变化的csv文件不再导入', dest='manifest', type=str,
+                    default='./ingest_manifest.jsonl')
+    ap.add_argument('--force', help='忽略导入清单，导入所有csv文件', dest='force', action='store_true')
     args = ap.parse_args()
+    if args.workers > 1 and args.mode != 'bulk':
+        ap.error('--workers大于1时只支持--mode bulk')
     main(args)
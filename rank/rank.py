@@ -2,83 +2,364 @@
 # @Time    : 2021/10/16 20:26
 # @Author  : Mike
 # @File    : rank
+import argparse
+import glob
 import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from typing import List
+import numpy as np
 import pandas as pd
 import pymysql
-from multidict import CIMultiDict
-from pymysql.converters import escape_string
 
+rank_dir = os.path.dirname(os.path.abspath(__file__))
+rid_batch_size = 1000  # rank_many每次查询数据库的researcher数
+insert_batch_size = 1000  # refresh_venue_year_rank每次写入的行数
+materialize_version = 2  # venue_year_rank及其变更跟踪的表结构版本，有变化时重建并全量重算
+# 在paper表上标记受影响的(venue, year)：新增和删除的论文，以及venue或年份有变化的论文的新旧两个键
+venue_year_triggers = {
+    'paper_venue_year_insert': "AFTER INSERT ON paper FOR EACH ROW "
+                               "INSERT IGNORE INTO venue_year_dirty(venue, year) SELECT NEW.venue, NEW.year "
+                               "FROM DUAL WHERE NEW.venue IS NOT NULL AND NEW.year IS NOT NULL",
+    'paper_venue_year_update': "AFTER UPDATE ON paper FOR EACH ROW "
+                               "INSERT IGNORE INTO venue_year_dirty(venue, year) SELECT k.venue, k.year FROM "
+                               "(SELECT OLD.venue AS venue, OLD.year AS year UNION ALL SELECT NEW.venue, NEW.year) k "
+                               "WHERE k.venue IS NOT NULL AND k.year IS NOT NULL AND NOT ("
+                               "CAST(OLD.venue AS BINARY) <=> CAST(NEW.venue AS BINARY) AND OLD.year <=> NEW.year)",
+    'paper_venue_year_delete': "AFTER DELETE ON paper FOR EACH ROW "
+                               "INSERT IGNORE INTO venue_year_dirty(venue, year) SELECT OLD.venue, OLD.year "
+                               "FROM DUAL WHERE OLD.venue IS NOT NULL AND OLD.year IS NOT NULL",
+}
+rank_db_file = os.path.join(rank_dir, 'rank.db')  # build_rank_db的编译结果
+rank_db_version = 2  # 编译格式有变化时加1，已有的编译结果会被重新编译
+rank_tables = ('jcr', 'cas', 'ccf')
+rank_db_mmap_size = 64 * 1024 * 1024
+researchers_per_task = 100  # rank_many每个进程池任务包含的researcher数
+achievement_columns = ['title', 'contribution', 'venue', 'venue_kind', 'year']
+venue_fuzzy_threshold = 0.9  # Venue名称近似匹配的相似度下限
+# normalize_venue展开的常见缩写，以及去掉的虚词
+venue_abbreviations = {
+    'trans': 'transactions', 'tran': 'transactions', 'j': 'journal', 'jour': 'journal', 'int': 'international',
+    'intl': 'international', 'conf': 'conference', 'proc': 'proceedings', 'symp': 'symposium', 'lett': 'letters',
+    'syst': 'systems', 'sys': 'systems', 'eng': 'engineering', 'sci': 'science', 'technol': 'technology',
+    'tech': 'technology', 'inf': 'information', 'inform': 'information', 'commun': 'communications',
+    'netw': 'networks', 'intell': 'intelligence', 'artif': 'artificial', 'anal': 'analysis', 'mach': 'machine',
+    'appl': 'applications', 'comp': 'computer', 'res': 'research', 'rev': 'review', 'softw': 'software',
+    'adv': 'advances', 'mag': 'magazine', 'q': 'quarterly', 'am': 'american', 'assoc': 'association',
+}
+venue_stop_words = {'on', 'of', 'the', 'and', 'for', 'in', 'an', 'a'}
 
-def get_rank_dict(rid: int):
+
+def get_rank_dict(rid: int, connection: pymysql.connections.Connection = None):
     """
     :param rid researcher的id
+    :param connection 数据库连接，为None时新建一个连接，用完即关闭
     :return 该researcher的所有学术成果的字典
     """
-    connection_config = json.load(open('../ScholarDataset/config.json'))
+    if connection is None:
+        with connect_mysql() as connection:
+            return get_rank_dict(rid, connection)
+
     result = {}
-    with pymysql.connect(host=connection_config['host'],
-                         user=connection_config['user'],
-                         password=connection_config['password'],
-                         database=connection_config['database']) as connection:
-        with connection.cursor() as cursor:
-            sql = f"SELECT name FROM researcher WHERE id = {rid};"
-            cursor.execute(sql)
-            name = cursor.fetchall()
-            if name:
-                result['Researcher Name'] = name[0]
-                result['Achievements'] = []
-            else:
-                return
-
-            sql = f"SELECT title, venue, year, author_count, contribution FROM paper LEFT JOIN author_paper ON paper.id = author_paper.pid WHERE aid in (SELECT id FROM author WHERE rid = {rid});"
-            count = cursor.execute(sql)
-            for i in range(0, count):
-                ac = {
-                    'Paper Title': '',
-                    'Contribution': '',
-                    'Venue': {},
-                    '汤森路透分区': {},
-                    '中科院分区': {},
-                    'CCF': {}
-                }
-                item = cursor.fetchone()
-                ac['Paper Title'] = item[0]
-                ac['Contribution'] = item[4]
-                venue = item[1]
-                ac['Venue'] = {get_venue(venue, connection): venue}
-
-                pub_year = item[2]
-                jcr_rank_dict = get_jcr_rank_dict(venue, pub_year)
-                if jcr_rank_dict:
-                    ac['汤森路透分区'] = jcr_rank_dict
-
-                cas_rank_dict = get_cas_rank_dict(venue, pub_year)
-                if cas_rank_dict:
-                    ac['中科院分区'] = cas_rank_dict
-
-                ccf_rank_dict = get_ccf_rank_dict(venue, pub_year)
-                if ccf_rank_dict:
-                    ac['CCF'] = ccf_rank_dict
-
-                result['Achievements'].append(ac)
+    with connection.cursor() as cursor:
+        sql = f"SELECT name FROM researcher WHERE id = {rid};"
+        cursor.execute(sql)
+        name = cursor.fetchall()
+        if name:
+            result['Researcher Name'] = name[0]
+            result['Achievements'] = []
+        else:
+            return
+
+        # Venue类型与论文一起查出；venue_year_rank可用时分区也一起查出
+        materialized = materialized_ranks_available(connection)
+        sql = f"SELECT paper.title, paper.venue, paper.year, paper.author_count, author_paper.contribution, " \
+              f"IFNULL(venue.kind, '') {', r.jcr, r.cas, r.ccf' if materialized else ''} " \
+              f"FROM paper LEFT JOIN author_paper ON paper.id = author_paper.pid " \
+              f"LEFT JOIN venue ON venue.name = paper.venue " \
+              f"{'LEFT JOIN venue_year_rank r ON r.venue = paper.venue AND r.year = paper.year ' if materialized else ''}" \
+              f"WHERE aid in (SELECT id FROM author WHERE rid = {rid});"
+        count = cursor.execute(sql)
+        for i in range(0, count):
+            item = cursor.fetchone()
+            ranks = None
+            if materialized and item[6] is not None:  # 没有物化的(venue, year)现场计算
+                ranks = (json.loads(item[6]), json.loads(item[7]), json.loads(item[8]))
+            ac = build_achievement(item[0], item[4], item[1], item[5], item[2], ranks)
+            result['Achievements'].append(ac)
 
     return result
 
 
-def get_venue(venue: str, mysql_connection: pymysql.connections.Connection) -> str:
+def build_achievement(title: str, contribution: str, venue: str, venue_kind: str, pub_year, ranks: tuple = None) -> dict:
     """
+    :param title: 论文题目
+    :param contribution: 该researcher在论文中的贡献
     :param venue: Venue名称
-    :param mysql_connection: 数据库连接，需要创建一个新的游标，以免和之前冲突
-    :return: Venue对应的Kind列的值
-    """
-    with mysql_connection.cursor() as cur:
-        sql = f"SELECT kind FROM venue WHERE name = '{escape_string(venue)}';"
-        cur.execute(sql)
-        r = cur.fetchone()
-    if r:
-        return r[0]
-    else:
-        return ''
+    :param venue_kind: Venue对应的Kind列的值
+    :param pub_year: 发表年份
+    :param ranks: 预先算好的(JCR, 中科院, CCF)分区字典，为None时现场查表
+    :return: 一条学术成果的字典，包含三种分区信息
+    """
+    ac = {
+        'Paper Title': title,
+        'Contribution': contribution,
+        'Venue': {venue_kind: venue},
+        '汤森路透分区': {},
+        '中科院分区': {},
+        'CCF': {}
+    }
+    if ranks is not None:
+        ac['汤森路透分区'], ac['中科院分区'], ac['CCF'] = ranks
+        return ac
+
+    jcr_rank_dict = get_jcr_rank_dict(venue, pub_year)
+    if jcr_rank_dict:
+        ac['汤森路透分区'] = jcr_rank_dict
+
+    cas_rank_dict = get_cas_rank_dict(venue, pub_year)
+    if cas_rank_dict:
+        ac['中科院分区'] = cas_rank_dict
+
+    ccf_rank_dict = get_ccf_rank_dict(venue, pub_year)
+    if ccf_rank_dict:
+        ac['CCF'] = ccf_rank_dict
+    return ac
+
+
+def rank_all(output_file: str, processes: int = None) -> int:
+    """
+    :param output_file: 输出的JSON Lines文件路径
+    :param processes: 进程池大小，默认为CPU核数
+    :return: 写出的researcher数量
+
+    为researcher表中的所有researcher计算分区，见rank_many
+    """
+    with connect_mysql() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id FROM researcher ORDER BY id;")
+            rids = [row[0] for row in cursor.fetchall()]
+    return rank_many(rids, output_file, processes)
+
+
+def rank_many(rids: List[int], output_file: str, processes: int = None) -> int:
+    """
+    :param rids: researcher的id列表
+    :param output_file: 输出的JSON Lines文件路径，每行是一个researcher的结果，比get_rank_dict的结果多一个rid字段
+    :param processes: 进程池大小，默认为CPU核数
+    :return: 写出的researcher数量
+
+    每rid_batch_size个researcher只查询两次数据库：一次取姓名，一次连接author_paper、paper、venue取全部论文及Venue类型。
+    分区计算分摊到进程池中，结果按rids的顺序边算边写入文件。数据库里不存在的rid会被跳过
+    """
+    build_rank_db()  # 在fork出进程池之前编译好，避免每个进程都去编译
+    written = 0
+    with connect_mysql() as connection, \
+            ProcessPoolExecutor(max_workers=processes, initializer=get_rank_index) as executor, \
+            open(output_file, 'w', encoding='utf8') as f:
+        for start in range(0, len(rids), rid_batch_size):
+            researchers = fetch_researcher_achievements(connection, rids[start: start + rid_batch_size])
+            tasks = [researchers[i: i + researchers_per_task] for i in range(0, len(researchers), researchers_per_task)]
+            for lines in executor.map(annotate_researchers, tasks):
+                f.writelines(lines)
+                written += len(lines)
+    return written
+
+
+def fetch_researcher_achievements(connection: pymysql.connections.Connection, rids: List[int]) -> list:
+    """
+    :param connection: 数据库连接
+    :param rids: researcher的id列表
+    :return: [(rid, researcher姓名, [(题目, 贡献, Venue名称, Venue类型, 年份), ...]), ...]，顺序与rids一致。
+        论文各列的顺序即achievement_columns
+    """
+    if not rids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT id, name FROM researcher WHERE id IN %s;", (rids,))
+        names = dict(cursor.fetchall())
+        sql = "SELECT author.rid, paper.title, author_paper.contribution, paper.venue, IFNULL(venue.kind, ''), paper.year " \
+              "FROM author JOIN author_paper ON author_paper.aid = author.id " \
+              "JOIN paper ON paper.id = author_paper.pid " \
+              "LEFT JOIN venue ON venue.name = paper.venue " \
+              "WHERE author.rid IN %s;"
+        cursor.execute(sql, (rids,))
+        achievements = {}
+        for row in cursor.fetchall():
+            achievements.setdefault(row[0], []).append(row[1:])
+    return [(rid, names[rid], achievements.get(rid, [])) for rid in rids if rid in names]
+
+
+def annotate_researchers(researchers: list) -> List[str]:
+    """
+    :param researchers: fetch_researcher_achievements结果的一段
+    :return: 每个researcher一行JSON，结构与get_rank_dict相同，另加rid字段。在进程池中执行
+    """
+    rows = [(i, *row) for i, (_, _, achievements) in enumerate(researchers) for row in achievements]
+    achievements = annotate_achievements(pd.DataFrame(rows, columns=['researcher'] + achievement_columns))
+    grouped = [[] for _ in researchers]
+    for i, title, contribution, venue, venue_kind, jcr, cas, ccf in zip(
+            achievements['researcher'], achievements['title'], achievements['contribution'],
+            achievements['venue'], achievements['venue_kind'],
+            achievements['汤森路透分区'], achievements['中科院分区'], achievements['CCF']):
+        grouped[i].append({
+            'Paper Title': title,
+            'Contribution': contribution,
+            'Venue': {venue_kind: venue},
+            '汤森路透分区': jcr,
+            '中科院分区': cas,
+            'CCF': ccf
+        })
+    return [json.dumps({
+        'rid': rid,
+        'Researcher Name': (name,),  # 与get_rank_dict一致，保持数据库行的形式
+        'Achievements': grouped[i]
+    }, ensure_ascii=False) + '\n' for i, (rid, name, _) in enumerate(researchers)]
+
+
+def annotate_achievements(achievements: pd.DataFrame, rank_index: 'RankIndex' = None) -> pd.DataFrame:
+    """
+    :param achievements: 至少包含venue、year两列的学术成果表
+    :param rank_index: 默认为进程内共享的RankIndex
+    :return: 增加了“汤森路透分区”、“中科院分区”、“CCF”三列的新表，查不到的为空字典
+
+    与逐条调用get_*_rank_dict的结果相同，但按年份版本和Venue键对整张分区表做哈希连接，耗时与行数成线性关系。
+    规范键和近似匹配只对精确查询查不到的Venue名称各做一次
+    """
+    rank_index = rank_index or get_rank_index()
+    result = achievements.reset_index(drop=True)
+    venue = result['venue'].where(result['venue'].notna(), None)
+    keys = pd.DataFrame({'venue': venue, 'lower': venue.str.lower(), 'upper': venue.str.upper()})
+    for table, column in (('jcr', '汤森路透分区'), ('cas', '中科院分区')):
+        data = rank_index.join(table, result['year'], keys['lower'], 'name', decode=False)
+        result[column] = rank_index.decode(rank_index.join_resolved(table, result['year'], venue, data))
+    # 依次查“索引”（全称）、“DBLP简称”、“CCF简称”，最后查全称的规范键
+    ccf = rank_index.join('ccf', result['year'], keys['venue'], 'index', decode=False)
+    ccf = ccf.fillna(rank_index.join('ccf', result['year'], keys['venue'], 'dblp', decode=False))
+    ccf = ccf.fillna(rank_index.join('ccf', result['year'], keys['upper'], 'abbr', decode=False))
+    result['CCF'] = rank_index.decode(rank_index.join_resolved('ccf', result['year'], venue, ccf))
+    return result
+
+
+def rank_fingerprint() -> str:
+    """
+    :return: 决定分区结果的所有因素：分区表文件、编译格式版本与近似匹配的相似度下限
+    """
+    return json.dumps([source_fingerprint(), get_rank_index().fuzzy_threshold])
+
+
+def materialized_ranks_available(connection: pymysql.connections.Connection) -> bool:
+    """
+    :param connection: 数据库连接
+    :return: venue_year_rank表存在，且是用当前的分区表和表结构算出来的
+    """
+    with connection.cursor() as cursor:
+        if not cursor.execute("SHOW TABLES LIKE 'rank_watermark';"):
+            return False
+        cursor.execute("SELECT name, value FROM rank_watermark WHERE name IN ('rank_fingerprint', 'materialize_version');")
+        watermark = dict(cursor.fetchall())
+    return watermark.get('materialize_version') == str(materialize_version) and \
+        watermark.get('rank_fingerprint') == rank_fingerprint()
+
+
+def create_venue_year_tables(cursor, rebuild: bool):
+    """
+    :param cursor: 数据库游标
+    :param rebuild: 为True时删除旧的表和触发器后重建
+
+    venue列使用utf8mb4_bin：大小写或重音不同的venue各是一个键，不会在主键上冲突而互相覆盖
+    """
+    if rebuild:
+        for trigger in venue_year_triggers:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger};")
+        cursor.execute("DROP TABLE IF EXISTS venue_year_rank, venue_year_dirty;")
+    cursor.execute("CREATE TABLE IF NOT EXISTS venue_year_rank("
+                   "venue VARCHAR(255) COLLATE utf8mb4_bin NOT NULL, year INT NOT NULL, jcr TEXT, cas TEXT, ccf TEXT, "
+                   "PRIMARY KEY (venue, year)) DEFAULT CHARSET = utf8mb4;")
+    cursor.execute("CREATE TABLE IF NOT EXISTS venue_year_dirty("
+                   "venue VARCHAR(255) COLLATE utf8mb4_bin NOT NULL, year INT NOT NULL, "
+                   "PRIMARY KEY (venue, year)) DEFAULT CHARSET = utf8mb4;")
+    cursor.execute("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE();")
+    existing = {row[0] for row in cursor.fetchall()}
+    for trigger, definition in venue_year_triggers.items():
+        if trigger not in existing:
+            cursor.execute(f"CREATE TRIGGER {trigger} {definition};")
+
+
+def refresh_venue_year_rank(connection: pymysql.connections.Connection, full: bool = False) -> int:
+    """
+    :param connection: 数据库连接
+    :param full: 为True时清空venue_year_rank后重新计算所有论文
+    :return: 本次计算的(venue, year)数
+
+    论文的分区只取决于(venue, year)，因此把分区物化到venue_year_rank表中，get_rank_dict查论文时一并查出。
+    paper表上的触发器在论文增删、venue或年份变化时把受影响的(venue, year)记入venue_year_dirty，每次只重算其中
+    仍有论文的键，并删除已没有论文的键。分区表或表结构有变化时自动全量重算。全部结果在同一个事务中提交
+    """
+    fingerprint = rank_fingerprint()
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS rank_watermark("
+                       "name VARCHAR(64) NOT NULL PRIMARY KEY, value TEXT) DEFAULT CHARSET = utf8mb4;")
+        cursor.execute("SELECT name, value FROM rank_watermark;")
+        watermark = dict(cursor.fetchall())
+        rebuild = watermark.get('materialize_version') != str(materialize_version)
+        create_venue_year_tables(cursor, rebuild)
+        if rebuild:
+            cursor.execute("DELETE FROM rank_watermark;")
+    connection.commit()  # 结束建表的事务，之后的读取从最新的数据开始
+
+    with connection.cursor() as cursor:
+        # 先锁住要处理的脏键：此时并发写入paper的触发器会等到本事务提交后再标记，不会被这里删掉
+        if full or rebuild or watermark.get('rank_fingerprint') != fingerprint:
+            cursor.execute("DELETE FROM venue_year_dirty;")
+            cursor.execute("DELETE FROM venue_year_rank;")
+            cursor.execute("SELECT DISTINCT CAST(venue AS BINARY), year FROM paper "
+                           "WHERE venue IS NOT NULL AND year IS NOT NULL;")
+            pairs = [(venue.decode('utf8'), year) for venue, year in cursor.fetchall()]
+        else:
+            cursor.execute("SELECT venue, year FROM venue_year_dirty FOR UPDATE;")
+            dirty = list(cursor.fetchall())
+            cursor.execute("SELECT DISTINCT d.venue, d.year FROM paper "
+                           "JOIN venue_year_dirty d ON d.venue = paper.venue AND d.year = paper.year;")
+            pairs = list(cursor.fetchall())
+            removed = list(set(dirty) - set(pairs))
+            for start in range(0, len(dirty), insert_batch_size):
+                cursor.executemany("DELETE FROM venue_year_dirty WHERE venue = %s AND year = %s;",
+                                   dirty[start: start + insert_batch_size])
+            for start in range(0, len(removed), insert_batch_size):
+                cursor.executemany("DELETE FROM venue_year_rank WHERE venue = %s AND year = %s;",
+                                   removed[start: start + insert_batch_size])
+        pairs = pd.DataFrame(pairs, columns=['venue', 'year'])
+        if not pairs.empty:
+            pairs = annotate_achievements(pairs)
+            rows = [(venue, year, json.dumps(jcr, ensure_ascii=False), json.dumps(cas, ensure_ascii=False),
+                     json.dumps(ccf, ensure_ascii=False))
+                    for venue, year, jcr, cas, ccf in zip(pairs['venue'], pairs['year'], pairs['汤森路透分区'],
+                                                         pairs['中科院分区'], pairs['CCF'])]
+            for start in range(0, len(rows), insert_batch_size):
+                cursor.executemany("INSERT INTO venue_year_rank(venue, year, jcr, cas, ccf) VALUES (%s, %s, %s, %s, %s) "
+                                   "ON DUPLICATE KEY UPDATE jcr = VALUES(jcr), cas = VALUES(cas), ccf = VALUES(ccf);",
+                                   rows[start: start + insert_batch_size])
+        cursor.executemany("REPLACE INTO rank_watermark(name, value) VALUES (%s, %s);",
+                           [('materialize_version', str(materialize_version)), ('rank_fingerprint', fingerprint)])
+    connection.commit()
+    return len(pairs)
+
+
+def connect_mysql() -> pymysql.connections.Connection:
+    """
+    :return: 按ScholarDataset/config.json建立的数据库连接
+    """
+    connection_config = json.load(open(os.path.join(rank_dir, '..', 'ScholarDataset', 'config.json')))
+    return pymysql.connect(host=connection_config['host'],
+                           user=connection_config['user'],
+                           password=connection_config['password'],
+                           database=connection_config['database'])
 
 
 def get_ccf_rank_dict(venue: str, year: str) -> dict:
@@ -92,37 +373,7 @@ def get_ccf_rank_dict(venue: str, year: str) -> dict:
 
     由于无法区分两种情况的值，所以依次搜索两列，凡可得到结果的情况就作为结果
     """
-    if int(year) >= 2019:
-        year = '2019'
-    else:
-        year = '2015'
-    ccf_data = pd.read_csv(f'ccf_{year}.csv', header=0, index_col=[0])
-    ccf_data.fillna('', inplace=True)
-
-    if venue in ccf_data.index:  # 全称，直接访问索引
-        target_row = ccf_data.loc[venue]
-        ccf_rank_dict = {
-            'CCF Abbr': target_row['CCF简称'],
-            'Venue Full Name': target_row['全称'],
-            'Field': target_row['领域'],
-            'Rank': target_row['评级']
-        }
-        return ccf_rank_dict
-
-    # 会议，依次搜索“DBLP简称”，“CCF简称”两列。这里不是访问索引，因此需要访问第0个元素
-    target_row = ccf_data.loc[ccf_data['DBLP简称'] == venue]
-    if target_row.empty:
-        target_row = ccf_data.loc[ccf_data['CCF简称'] == venue.upper()]
-        if target_row.empty:
-            return {}
-
-    ccf_rank_dict = {
-        'CCF Abbr': target_row['CCF简称'][0],
-        'Venue Full Name': target_row['全称'][0],
-        'Field': target_row['领域'][0],
-        'Rank': target_row['评级'][0]
-    }
-    return ccf_rank_dict
+    return get_rank_index().get_ccf(venue, year)
 
 
 def get_jcr_rank_dict(venue: str, year: str) -> dict:
@@ -130,17 +381,7 @@ def get_jcr_rank_dict(venue: str, year: str) -> dict:
     :param venue只有一种情况：期刊。直接查表即可
     :param year 年份，'2015'-'2020'之间的值
     """
-    if int(year) >= 2020:
-        year = '2020'
-    elif int(year) < 2015:
-        year = '2015'
-    jcr_rank_dict = {}
-    if not pd.isna(venue):
-        jcr = json.load(open(f'jcr_{year}.json'))
-        jcr = CIMultiDict(jcr)
-        if jcr.get(venue):
-            jcr_rank_dict = jcr.get(venue)
-    return jcr_rank_dict
+    return get_rank_index().get_jcr(venue, year)
 
 
 def get_cas_rank_dict(venue: str, year: str) -> dict:
@@ -148,20 +389,385 @@ def get_cas_rank_dict(venue: str, year: str) -> dict:
     :param venue只有一种情况：期刊。直接查表即可
     :param year 年份，'2015'-'2019'之间的值
     """
-    if int(year) >= 2019:
-        year = '2019'
-    elif int(year) < 2015:
-        year = '2015'
-    cas_rank_dict = {}
-    if not pd.isna(venue):
-        cas = json.load(open(f'cas_{year}.json'))
-        cas = CIMultiDict(cas)
-        if cas.get(venue):
-            cas_rank_dict = cas.get(venue)
-    return cas_rank_dict
+    return get_rank_index().get_cas(venue, year)
+
 
+def source_files(data_dir: str = rank_dir) -> List[str]:
+    """
+    :param data_dir: 分区表文件所在的文件夹
+    :return: 所有jcr_*.json、cas_*.json、ccf_*.csv文件的路径
+    """
+    files = []
+    for pattern in ('jcr_*.json', 'cas_*.json', 'ccf_*.csv'):
+        files.extend(sorted(glob.glob(os.path.join(data_dir, pattern))))
+    return files
 
+
+def source_fingerprint(data_dir: str = rank_dir) -> str:
+    """
+    :param data_dir: 分区表文件所在的文件夹
+    :return: 由编译格式版本和各分区表文件的名称、大小、修改时间组成的字符串，任一文件变化都会改变该值
+    """
+    fingerprint = [rank_db_version]
+    for file in source_files(data_dir):
+        stat = os.stat(file)
+        fingerprint.append([os.path.basename(file), stat.st_size, stat.st_mtime_ns])
+    return json.dumps(fingerprint)
+
+
+def table_year(file: str) -> int:
+    """
+    :param file: 分区表文件路径，例如jcr_2015.json
+    :return: 文件名中的年份
+    """
+    return int(os.path.splitext(os.path.basename(file))[0].split('_')[-1])
+
+
+def build_rank_db(data_dir: str = rank_dir, db_file: str = rank_db_file, force: bool = False) -> bool:
+    """
+    :param data_dir: 分区表文件所在的文件夹
+    :param db_file: 编译结果，SQLite数据库文件
+    :param force: 为True时无论分区表文件是否变化都重新编译
+    :return: 是否重新编译了
+
+    把所有JCR、中科院、CCF分区表编译为一个SQLite文件，分区字典以JSON文本保存，查询时才解析。
+    jcr、cas表的键分小写期刊名（name）和normalize_venue的结果（norm）两种；
+    ccf表的键分“索引”（index）、“DBLP简称”（dblp）、“CCF简称”（abbr）和全称的normalize_venue结果（norm）四种。
+    重复的键均取第一个，与原先查表的结果一致。先写入临时文件再替换，正在读取旧文件的进程不受影响
+    """
+    fingerprint = source_fingerprint(data_dir)
+    if not force and read_db_fingerprint(db_file) == fingerprint:
+        return False
+
+    tmp_file = f'{db_file}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    with closing(sqlite3.connect(tmp_file)) as db:
+        db.execute("CREATE TABLE meta(key TEXT PRIMARY KEY, value TEXT);")
+        for table in rank_tables:
+            db.execute(f"CREATE TABLE {table}(year INTEGER, kind TEXT, venue TEXT, data TEXT, "
+                       f"PRIMARY KEY(year, kind, venue)) WITHOUT ROWID;")
+        for file in source_files(data_dir):
+            table = os.path.basename(file).split('_')[0]
+            year = table_year(file)
+            rows = []
+            if table == 'ccf':
+                ccf_data = pd.read_csv(file, header=0, index_col=[0])
+                ccf_data.fillna('', inplace=True)
+                for row in ccf_data.itertuples():
+                    data = json.dumps({
+                        'CCF Abbr': row.CCF简称,
+                        'Venue Full Name': row.全称,
+                        'Field': row.领域,
+                        'Rank': row.评级
+                    }, ensure_ascii=False)
+                    rows.extend([(year, 'index', row.Index, data),
+                                 (year, 'dblp', row.DBLP简称, data),
+                                 (year, 'abbr', row.CCF简称, data),
+                                 (year, 'norm', normalize_venue(row.全称), data)])
+            else:
+                with open(file, encoding='utf8') as f:
+                    rank_table = json.load(f)
+                for venue, rank_dict in rank_table.items():
+                    data = json.dumps(rank_dict, ensure_ascii=False)
+                    rows.extend([(year, 'name', venue.lower(), data),
+                                 (year, 'norm', normalize_venue(venue), data)])
+            db.executemany(f"INSERT OR IGNORE INTO {table} VALUES (?, ?, ?, ?);", rows)
+        for table in rank_tables:
+            db.execute(f"DELETE FROM {table} WHERE kind = 'norm' AND venue = '';")
+        db.execute("INSERT INTO meta VALUES ('fingerprint', ?);", (fingerprint,))
+        db.commit()
+    os.replace(tmp_file, db_file)
+    return True
+
+
+def read_db_fingerprint(db_file: str) -> str:
+    """
+    :param db_file: 编译结果
+    :return: 编译时记录的source_fingerprint，文件不存在或损坏时返回空字符串
+    """
+    if not os.path.exists(db_file):
+        return ''
+    try:
+        with closing(sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)) as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'fingerprint';").fetchone()
+    except sqlite3.Error:
+        return ''
+    return row[0] if row else ''
+
+
+def normalize_venue(venue: str) -> str:
+    """
+    :param venue: Venue名称，例如"IEEE Trans. on Pattern Analysis & Machine Intelligence"
+    :return: 三种分区表共用的规范键：小写、只保留字母，展开常见缩写并去掉虚词，
+        例如"ieeetransactionspatternanalysismachineintelligence"
+    """
+    words = re.findall(r'[a-z]+', venue.lower())
+    return ''.join(venue_abbreviations.get(word, word) for word in words if word not in venue_stop_words)
+
+
+def trigrams(key: str) -> set:
+    """
+    :param key: normalize_venue的结果
+    :return: 首尾补位后的所有三字母片段
+    """
+    padded = f'  {key} '
+    return {padded[i: i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    规范键的三字母片段倒排索引，用于近似匹配
+
+    相似度为两个片段集合的Dice系数。查询时按片段出现次数从少到多，只用前缀过滤所需的最少几个片段收集候选，
+    再用长度和集合交集验证，因此几千个键的表也能在毫秒以内查完
+    """
+
+    def __init__(self, keys):
+        """
+        :param keys: 规范键
+        """
+        self.key_set = set(keys)
+        self.keys = sorted(self.key_set)
+        self.grams = [trigrams(key) for key in self.keys]
+        self.postings = {}  # {片段: [键的下标]}
+        for i, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(i)
+
+    def best_match(self, key: str, threshold: float) -> str:
+        """
+        :param key: 规范键
+        :param threshold: 相似度下限，0到1之间
+        :return: 相似度不低于threshold的键中最相似的一个（相同时取字典序最小的），没有时返回空字符串
+        """
+        query = trigrams(key)
+        size = len(query)
+        # Dice系数不低于threshold的候选至少与query共享min_overlap个片段，因此只需看出现最少的前prefix个片段
+        min_overlap = math.ceil(size * threshold / (2 - threshold))
+        prefix = size - min_overlap + 1
+        candidates = set()
+        for gram in sorted(query, key=lambda g: len(self.postings.get(g, ())))[:prefix]:
+            candidates.update(self.postings.get(gram, ()))
+
+        best_key, best_score = '', threshold
+        for i in candidates:
+            grams = self.grams[i]
+            if not size * threshold / (2 - threshold) <= len(grams) <= size * (2 - threshold) / threshold:
+                continue
+            score = 2 * len(query & grams) / (size + len(grams))
+            if score > best_score or (score == best_score and (not best_key or self.keys[i] < best_key)):
+                best_key, best_score = self.keys[i], score
+        return best_key
+
+
+class RankIndex:
+    """
+    JCR、中科院、CCF分区表的索引，数据来自build_rank_db编译的SQLite文件
+
+    文件在第一次查询时才打开，并以mmap方式读取，多个进程共享同一份页缓存。每个线程、每个进程各用一个连接。
+    查到的分区字典会缓存在内存中，之后相同的查询不再访问文件。
+    原有的精确查询都查不到时，再用normalize_venue的规范键查询，仍查不到且开启了近似匹配时，取最相似的规范键查询
+    """
+
+    def __init__(self, db_file: str = rank_db_file, data_dir: str = rank_dir,
+                 fuzzy_threshold: float = venue_fuzzy_threshold):
+        """
+        :param db_file: 编译结果，不存在或分区表文件有变化时会先自动编译
+        :param data_dir: 分区表文件所在的文件夹
+        :param fuzzy_threshold: 近似匹配的相似度下限，为None时不做近似匹配
+        """
+        self.db_file = db_file
+        self.data_dir = data_dir
+        self.fuzzy_threshold = fuzzy_threshold
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.years = None  # {'jcr': [2015, ...], 'cas': [...], 'ccf': [...]}
+        self.cache = {}
+        self.frames = {}  # {表名: 整张表的DataFrame}，供join使用
+        self.decoded = {}  # {JSON文本: 分区字典}
+        self.trigram_indexes = {}  # {表名: 该表所有年份规范键的TrigramIndex}
+        self.resolved = {}  # {(表名, Venue名称): 规范键}
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        :return: 当前线程的只读连接，fork出的子进程会重新打开
+        """
+        if getattr(self.local, 'pid', None) != os.getpid():
+            with self.lock:
+                if self.years is None:
+                    build_rank_db(self.data_dir, self.db_file)
+            db = sqlite3.connect(f'file:{self.db_file}?mode=ro', uri=True, check_same_thread=False)
+            db.execute(f'PRAGMA mmap_size = {rank_db_mmap_size};')
+            self.local.db = db
+            self.local.pid = os.getpid()
+            if self.years is None:
+                self.years = {table: [row[0] for row in db.execute(f"SELECT DISTINCT year FROM {table} ORDER BY year;")]
+                              for table in rank_tables}
+        return self.local.db
+
+    def select_year(self, table: str, year: str) -> int:
+        """
+        :param table: jcr、cas或ccf
+        :param year: 论文发表年份
+        :return: 不晚于发表年份的最近一版分区表的年份，发表年份早于所有版本时取最早一版
+        """
+        years = self.years[table]
+        year = int(year)
+        return max((y for y in years if y <= year), default=years[0])
+
+    def select_years(self, table: str, years: pd.Series) -> pd.Series:
+        """
+        :param table: jcr、cas或ccf
+        :param years: 论文发表年份
+        :return: 对每个发表年份执行select_year的结果
+        """
+        table_years = np.array(self.years[table])
+        positions = np.searchsorted(table_years, pd.to_numeric(years).astype(int).to_numpy(), side='right') - 1
+        return pd.Series(table_years[np.maximum(positions, 0)], index=years.index)
+
+    def frame(self, table: str) -> pd.DataFrame:
+        """
+        :param table: jcr、cas或ccf
+        :return: 整张表，列为year、kind、venue、data
+        """
+        db = self.connection()
+        if table not in self.frames:
+            self.frames[table] = pd.read_sql_query(f"SELECT * FROM {table};", db)
+        return self.frames[table]
+
+    def resolve(self, table: str, venue: str) -> str:
+        """
+        :param table: jcr、cas或ccf
+        :param venue: Venue名称
+        :return: 用于查询kind为norm的键：规范键本身在表中时即为规范键，否则为近似匹配的结果（可能为空字符串）
+        """
+        key = (table, venue)
+        if key not in self.resolved:
+            norm = normalize_venue(venue)
+            if table not in self.trigram_indexes:
+                sql = f"SELECT DISTINCT venue FROM {table} WHERE kind = 'norm';"
+                self.trigram_indexes[table] = TrigramIndex(row[0] for row in self.connection().execute(sql))
+            index = self.trigram_indexes[table]
+            if norm and self.fuzzy_threshold is not None and norm not in index.key_set:
+                norm = index.best_match(norm, self.fuzzy_threshold)
+            self.resolved[key] = norm
+        return self.resolved[key]
+
+    def join(self, table: str, years: pd.Series, venues: pd.Series, kind: str, decode: bool = True) -> pd.Series:
+        """
+        :param table: jcr、cas或ccf
+        :param years: 论文发表年份
+        :param venues: 表中的键，与years一一对应
+        :param kind: 键的种类
+        :param decode: 为True时返回分区字典（查不到为空字典），否则返回JSON文本（查不到为NaN）
+        :return: 与years索引相同的查询结果
+        """
+        frame = self.frame(table)
+        frame = frame[frame['kind'] == kind]
+        left = pd.DataFrame({'year': self.select_years(table, years), 'venue': venues})
+        data = left.merge(frame[['year', 'venue', 'data']], how='left', on=['year', 'venue'])['data']
+        data.index = years.index
+        return self.decode(data) if decode else data
+
+    def join_resolved(self, table: str, years: pd.Series, venues: pd.Series, data: pd.Series) -> pd.Series:
+        """
+        :param table: jcr、cas或ccf
+        :param years: 论文发表年份
+        :param venues: Venue名称
+        :param data: 精确查询的JSON文本，查不到为NaN
+        :return: 用规范键补全了data中查不到的行的JSON文本。每个不同的Venue名称只做一次resolve
+        """
+        missing = data.isna() & venues.notna()
+        if missing.any():
+            keys = venues[missing].map({venue: self.resolve(table, venue) for venue in venues[missing].unique()})
+            data = data.copy()
+            data[missing] = self.join(table, years[missing], keys, 'norm', decode=False)
+        return data
+
+    def decode(self, data: pd.Series) -> pd.Series:
+        """
+        :param data: JSON文本，缺失为NaN
+        :return: 分区字典，缺失为空字典。相同的文本只解析一次
+        """
+        for text in data.dropna().unique():
+            if text not in self.decoded:
+                self.decoded[text] = json.loads(text)
+        return pd.Series([self.decoded[text] if isinstance(text, str) else {} for text in data], index=data.index,
+                         dtype=object)
+
+    def lookup(self, table: str, year: str, venue: str, kind: str) -> dict:
+        """
+        :param table: jcr、cas或ccf
+        :param year: 论文发表年份
+        :param venue: 表中的键
+        :param kind: 键的种类
+        :return: 分区字典，没有时返回空字典
+        """
+        db = self.connection()
+        key = (table, self.select_year(table, year), kind, venue)
+        if key not in self.cache:
+            sql = f"SELECT data FROM {table} WHERE year = ? AND kind = ? AND venue = ?;"
+            row = db.execute(sql, key[1:]).fetchone()
+            self.cache[key] = json.loads(row[0]) if row else {}
+        return self.cache[key]
+
+    def get_jcr(self, venue: str, year: str) -> dict:
+        if pd.isna(venue):
+            return {}
+        return self.lookup('jcr', year, venue.lower(), 'name') or self.lookup('jcr', year, self.resolve('jcr', venue), 'norm')
+
+    def get_cas(self, venue: str, year: str) -> dict:
+        if pd.isna(venue):
+            return {}
+        return self.lookup('cas', year, venue.lower(), 'name') or self.lookup('cas', year, self.resolve('cas', venue), 'norm')
+
+    def get_ccf(self, venue: str, year: str) -> dict:
+        if pd.isna(venue):
+            return {}
+        # 依次查“索引”（全称）、“DBLP简称”、“CCF简称”，最后查全称的规范键
+        return self.lookup('ccf', year, venue, 'index') or self.lookup('ccf', year, venue, 'dblp') \
+            or self.lookup('ccf', year, venue.upper(), 'abbr') or self.lookup('ccf', year, self.resolve('ccf', venue), 'norm')
+
+
+_rank_index = None
+
+
+def get_rank_index() -> RankIndex:
+    """
+    :return: 进程内共享的RankIndex
+    """
+    global _rank_index
+    if _rank_index is None:
+        _rank_index = RankIndex()
+    return _rank_index
+
+
+# 参数示例： --rid 3 或 --rids 3 4 5 --output ../data/rank.jsonl 或 --all 或 build 或 materialize --full
 if __name__ == '__main__':
-    rid = 3
-    result = get_rank_dict(rid)
-    json.dump(result, open(f'../data/{rid}.json', 'w', encoding='utf8'), indent=4, ensure_ascii=False)
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rid', help='单个researcher的id，结果写入../data/{rid}.json', dest='rid', type=int, default=3)
+    ap.add_argument('--rids', help='多个researcher的id', dest='rids', nargs='+', type=int)
+    ap.add_argument('--all', help='计算researcher表中的所有researcher', dest='all', action='store_true')
+    ap.add_argument('--output', help='--rids/--all的输出文件，每行一个researcher', dest='output', type=str,
+                    default='../data/rank.jsonl')
+    ap.add_argument('--processes', help='--rids/--all使用的进程数，默认为CPU核数', dest='processes', type=int)
+    subparsers = ap.add_subparsers(dest='command')
+    build_parser = subparsers.add_parser('build', help='把分区表编译为rank.db，分区表文件没有变化时跳过')
+    build_parser.add_argument('--force', help='强制重新编译', dest='force', action='store_true')
+    materialize_parser = subparsers.add_parser('materialize', help='把有变化的(venue, year)的分区写入venue_year_rank表')
+    materialize_parser.add_argument('--full', help='清空后重新计算所有论文', dest='full', action='store_true')
+    args = ap.parse_args()
+    if args.command == 'build':
+        print('rank.db已重新编译' if build_rank_db(force=args.force) else 'rank.db已是最新，无需编译')
+    elif args.command == 'materialize':
+        with connect_mysql() as connection:
+            print(f'计算了{refresh_venue_year_rank(connection, args.full)}个(venue, year)的分区')
+    elif args.all:
+        rank_all(args.output, args.processes)
+    elif args.rids:
+        rank_many(args.rids, args.output, args.processes)
+    else:
+        rid = args.rid
+        result = get_rank_dict(rid)
+        json.dump(result, open(f'../data/{rid}.json', 'w', encoding='utf8'), indent=4, ensure_ascii=False)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 15:40
+# @File    : server
+import argparse
+import json
+import logging
+import queue
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pymysql
+from rank import connect_mysql, get_rank_dict, get_rank_index
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+handler = logging.FileHandler("server_log.txt", encoding='utf8')
+handler.setLevel(logging.WARNING)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+rank_path_pattern = re.compile(r'^/researcher/(\d+)/rank/?$')
+
+
+class ConnectionPool:
+    """
+    固定大小的数据库连接池，连接在启动时建立，取出时检查是否断线
+
+    连接开启autocommit：否则第一次查询开始的事务一直不结束，REPEATABLE READ下之后的查询都读同一个快照，
+    author_paper_fingerprint看不到新写入的数据，缓存永远不会失效
+    """
+
+    def __init__(self, size: int):
+        self.connections = queue.Queue()
+        for i in range(0, size):
+            conn = connect_mysql()
+            conn.autocommit(True)
+            self.connections.put(conn)
+
+    @contextmanager
+    def connection(self) -> pymysql.connections.Connection:
+        conn = self.connections.get()
+        try:
+            conn.ping(reconnect=True)
+            yield conn
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+
+class RankCache:
+    """
+    researcher分区结果的LRU缓存，最多保存max_size个researcher
+
+    每个结果与计算时该researcher的author_paper指纹一起保存，指纹变了就视为失效
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # {rid: (指纹, JSON字节串)}
+        self.lock = threading.Lock()
+
+    def get(self, rid: int, fingerprint: tuple) -> bytes:
+        """
+        :return: 指纹一致时返回缓存的结果，否则返回None
+        """
+        with self.lock:
+            entry = self.entries.get(rid)
+            if entry is None:
+                return None
+            if entry[0] != fingerprint:
+                del self.entries[rid]
+                return None
+            self.entries.move_to_end(rid)
+            return entry[1]
+
+    def put(self, rid: int, fingerprint: tuple, body: bytes):
+        with self.lock:
+            self.entries[rid] = (fingerprint, body)
+            self.entries.move_to_end(rid)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+def author_paper_fingerprint(connection: pymysql.connections.Connection, rid: int) -> tuple:
+    """
+    :param connection: 数据库连接
+    :param rid: researcher的id
+    :return: 该researcher的author_paper行数及其内容的校验和，有行被增删改时随之变化
+    """
+    sql = "SELECT COUNT(*), IFNULL(SUM(CRC32(CONCAT_WS(',', author_paper.aid, author_paper.pid, " \
+          "author_paper.contribution))), 0) " \
+          "FROM author JOIN author_paper ON author_paper.aid = author.id WHERE author.rid = %s;"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (rid,))
+        count, checksum = cursor.fetchone()
+    return count, int(checksum)
+
+
+class RankService:
+    """
+    为RankRequestHandler提供分区结果：分区表常驻内存，数据库连接复用，结果缓存在RankCache中
+    """
+
+    def __init__(self, pool_size: int, cache_size: int):
+        get_rank_index().connection()  # 启动时就打开分区表，第一个请求不再付出这部分开销
+        self.pool = ConnectionPool(pool_size)
+        self.cache = RankCache(cache_size)
+
+    def get_rank(self, rid: int) -> bytes:
+        """
+        :param rid: researcher的id
+        :return: get_rank_dict结果的JSON字节串，researcher不存在时返回None
+        """
+        with self.pool.connection() as connection:
+            fingerprint = author_paper_fingerprint(connection, rid)
+            body = self.cache.get(rid, fingerprint)
+            if body is None:
+                result = get_rank_dict(rid, connection)
+                if result is None:
+                    return None
+                body = json.dumps(result, ensure_ascii=False).encode('utf8')
+                self.cache.put(rid, fingerprint, body)
+        return body
+
+
+class RankRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /researcher/{rid}/rank：返回该researcher的分区结果
+    """
+    service = None  # RankService，由serve设置
+
+    def do_GET(self):
+        match = rank_path_pattern.match(self.path.split('?')[0])
+        if not match:
+            self.send_json(404, b'{"error": "not found"}')
+            return
+        rid = int(match.group(1))
+        try:
+            body = self.service.get_rank(rid)
+        except Exception as e:
+            logger.error(f'计算rid={rid}的分区时发生类型为{type(e)}的错误：{repr(e)}')
+            self.send_json(500, b'{"error": "internal error"}')
+            return
+        if body is None:
+            self.send_json(404, b'{"error": "researcher not found"}')
+        else:
+            self.send_json(200, body)
+
+    def send_json(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info(format % args)
+
+
+def serve(host: str, port: int, pool_size: int, cache_size: int):
+    RankRequestHandler.service = RankService(pool_size, cache_size)
+    server = ThreadingHTTPServer((host, port), RankRequestHandler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        RankRequestHandler.service.pool.close()
+
+
+# 参数示例： --port 8000，之后访问 http://127.0.0.1:8000/researcher/3/rank
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', help='监听地址', dest='host', type=str, default='127.0.0.1')
+    ap.add_argument('--port', help='监听端口', dest='port', type=int, default=8000)
+    ap.add_argument('--pool_size', help='数据库连接数，即同时处理的请求数', dest='pool_size', type=int, default=4)
+    ap.add_argument('--cache_size', help='最多缓存的researcher数', dest='cache_size', type=int, default=1024)
+    args = ap.parse_args()
+    serve(args.host, args.port, args.pool_size, args.cache_size)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 18:40
+# @File    : test_archive.py
+import os
+import pytest
+from benchmarks.pipeline import file_fixtures, fixtures_dir
+from ScholarDataset.archive import ResponseArchive
+from ScholarDataset.items import ScholardatasetItem
+from ScholarDataset.pipelines import ArchivePipeline
+from ScholarDataset.spiders.replay import ArchiveReplaySpider
+
+
+class CrawlingSpider:
+    def __init__(self, name: str):
+        self.name = name
+
+
+def object_files(archive_dir) -> list:
+    return [os.path.join(root, name) for root, _, names in os.walk(os.path.join(archive_dir, 'objects'))
+            for name in names]
+
+
+@pytest.mark.parametrize('source', ['ACM', 'IEEExplore', 'WebOfScience'])
+def test_replay_returns_archived_content(tmp_path, source):
+    fixtures = file_fixtures(source, fixtures_dir, 10)
+    pipeline = ArchivePipeline(str(tmp_path))
+    for paper_id, (query, content) in enumerate(fixtures, start=1):
+        item = ScholardatasetItem()
+        item['content'], item['query'], item['paper_id'] = content, query, paper_id
+        assert pipeline.process_item(item, CrawlingSpider(source)) is item
+    pipeline.close_spider(CrawlingSpider(source))
+
+    query_list = {paper_id: query for paper_id, (query, _) in enumerate(fixtures, start=1)}
+    query_list[99] = 'Never Archived'
+    spider = ArchiveReplaySpider(name=source, query_list=query_list, archive_dir=str(tmp_path))
+    replayed = list(spider.parse(None))
+    assert [(item['paper_id'], item['query']) for item in replayed] == list(query_list.items())[:-1]
+    for item, (_, content) in zip(replayed, fixtures):
+        assert type(item['content']) is type(content)
+        assert item['content'] == content
+
+    # 重放时不再存档
+    for item in replayed:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    assert len(ResponseArchive(str(tmp_path)).load_index(source)) == len(fixtures)
+
+
+def test_same_content_stored_once_and_latest_entry_wins(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    first = archive.put('ACM', 'A Title', 1, '<html>same</html>')
+    assert archive.put('ACM', 'Another Title', 2, '<html>same</html>') == first
+    archive.put('ACM', 'A Title', 1, '<html>newer</html>')
+    archive.close()
+    assert len(object_files(tmp_path)) == 2
+
+    with open(archive.index_path('ACM'), 'a', encoding='utf-8') as f:
+        f.write('{"query": "Half written", "paper_id": 3, "dig')  # 写入时中断
+    entries = ResponseArchive(str(tmp_path)).load_index('ACM')
+    assert set(entries) == {'A Title', 'Another Title'}
+    assert archive.read(entries['A Title']) == '<html>newer</html>'
+    assert archive.read(entries['Another Title']) == '<html>same</html>'
+    assert ResponseArchive(str(tmp_path)).load_index('IEEExplore') == {}
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 16:40
+# @File    : test_benchmarks.py
+import json
+import os
+import random
+import subprocess
+import sys
+import pytest
+from benchmarks import pipeline
+from benchmarks.pipeline import fixtures_dir, measure_stages, seed_database, synthetic_fixtures
+from ScholarDataset.items import ScholardatasetItem
+from ScholarDataset.pipelines import IEEEPipeline
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_benchmark(tmp_path, *args) -> dict:
+    """
+    main中会启动reactor，而reactor在一个进程中只能启动一次，因此在子进程中运行
+    """
+    output = tmp_path / 'result.json'
+    subprocess.run([sys.executable, '-m', 'benchmarks.pipeline', '--researchers', '20', '--output', str(output),
+                    *args], cwd=root, check=True, capture_output=True, timeout=300)
+    return json.loads(output.read_text(encoding='utf-8'))
+
+
+@pytest.mark.parametrize('source, written', [('ACM', 2), ('IEEExplore', 3), ('WebOfScience', 2)])
+def test_benchmark_runs_on_committed_fixtures(tmp_path, source, written):
+    results = run_benchmark(tmp_path, '--source', source, '--fixtures', fixtures_dir)
+    assert results['items'] == 3
+    assert results['written'] == written
+    assert results['stages']['sql_update']['count'] == written
+    assert results['dropped'] == {}
+
+
+@pytest.mark.parametrize('source', ['ACM', 'IEEExplore', 'WebOfScience'])
+def test_benchmark_runs_on_synthetic_fixtures(tmp_path, source):
+    results = run_benchmark(tmp_path, '--source', source, '--count', '60')
+    assert results['items'] == 60
+    assert results['dropped'] == {}
+    assert results['written'] == results['stages']['sql_update']['count'] > 0
+
+
+def test_synthetic_authors_are_distinct():
+    rng = random.Random(0)
+    for _, content in synthetic_fixtures('IEEExplore', 200, 10, rng):
+        names = [author['name'] for author in content['authors']]
+        assert len(names) == len(set(names))
+
+
+def test_measure_stages_counts_failed_items_as_dropped(tmp_path, monkeypatch):
+    pipeline_class = type('IEEEPipeline', (IEEEPipeline,), {'db_api_module': 'benchmarks.standin_db'})
+    connection_config = {'user': '', 'password': '', 'host': '', 'database': str(tmp_path / 'seed.db')}
+    items = []
+    for paper_id, (query, content) in enumerate(synthetic_fixtures('IEEExplore', 5, 40, random.Random(1)), start=1):
+        item = ScholardatasetItem()
+        item['content'], item['query'], item['paper_id'] = content, query, paper_id
+        items.append(item)
+    seed_database(connection_config['database'], pipeline_class(connection_config=connection_config), items, 40,
+                  random.Random(1))
+    update = pipeline.update_sql_from_author_list
+    failed = []
+
+    def fail_first_paper(connection, author_list, paper_id):
+        if not failed:
+            failed.append(paper_id)
+            raise ValueError(f'pid={paper_id}')
+        return update(connection, author_list, paper_id)
+
+    monkeypatch.setattr(pipeline, 'update_sql_from_author_list', fail_first_paper)
+    results, dropped = measure_stages(pipeline_class(connection_config=connection_config), items,
+                                      connection_config['database'], False)
+    assert dropped == {'ValueError': 1}
+    # 出错的item之后的item照常处理
+    assert len(results['parse']['times']) == 5
+    assert len(results['sql_update']['times']) == len(results['fill_rid']['times']) - 1 > 0
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 11:20
+# @File    : test_extractors.py
+import pytest
+from benchmarks.acm_extract import soup_article, soup_entries, synthetic_article_page, synthetic_search_page
+from ScholarDataset.extractors import extract_acm_article, extract_acm_entries, find_elements, parse_wos_record, \
+    wos_fields
+
+# 模拟页面之外，BeautifulSoup与正则定位容易不一致的写法：单引号、无引号、data-class、同名标签嵌套、缺少结束标签
+article_variants = [
+    '<html><body><ul><li class=\'loa__item x\'><a title="A B">A</a><div><ul><li>inner</li></ul></div>'
+    '<p>Lab, Univ X</p></li><li data-class="loa__item" class="other"><a title="no">n</a><p>x</p></li>'
+    '<li\n id=x class=loa__item><a title="C D">C</a><p>Dept, Univ Y</p></li></ul>'
+    '<ol class=" rlist  organizational-chart"><li><h6>T <b>x</b></h6></li></ol></body></html>',
+    '<html><body><ol class="rlist organizational-chart"><li><h6>Title</h6></li></ol>'
+    '<ul><li class="loa__item"><a title="E F">E</a><p>a, b, U</p>',
+]
+search_variants = [
+    '<ul><li class="search__item issue-item-container"><h5><a href="/doi/1">One <i>x</i></a></h5></li>'
+    '<li class="search__item issue-item-container"><a href="/doi/2">Two</a></li>'
+    '<li class="search__item issue-item-container">none</li><li class="search__item">skip</li></ul>',
+]
+
+
+def test_parse_wos_record_keeps_unicode_line_separators():
+    tags = list(wos_fields)
+    values = [f'value{i}' for i in range(len(tags))]
+    values[-1] = 'first\u2028second\x0bthird\x1cfourth'
+    content = ('\t'.join(tags) + '\r\n' + '\t'.join(values) + '\r\n').encode('utf-8-sig')
+    record = parse_wos_record(content)
+    assert record == {wos_fields[tag]: value for tag, value in zip(tags, values)}
+
+
+@pytest.mark.parametrize('html', [synthetic_article_page(i) for i in range(3)] + article_variants)
+def test_extract_acm_article_matches_beautifulsoup(html):
+    assert extract_acm_article(html) == soup_article(html)
+
+
+@pytest.mark.parametrize('html', [synthetic_search_page(i) for i in range(3)] + search_variants)
+def test_extract_acm_entries_matches_beautifulsoup(html):
+    assert extract_acm_entries(html) == soup_entries(html)
+
+
+def test_find_elements_builds_only_selected_subtrees():
+    html = synthetic_article_page(0)
+    authors = find_elements(html, 'li', lambda class_value: 'loa__item' in class_value.split())
+    assert len(authors) == 8
+    for author in authors:
+        root = author.getroottree().getroot()
+        # 每个作者条目单独解析，树中没有页面其余部分的元素
+        assert not any(element.get('class', '').startswith('section') for element in root.iter())
+        assert [element.tag for element in author.iter()] == ['li', 'a', 'p']
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 10:00
+# @File    : test_insert_mysql.py
+import json
+import os
+import re
+import pytest
+from benchmarks import standin_db
+from insert_mysql import BulkInserter, IngestCache, IngestManifest, StagingInserter, load_data_line, \
+    read_raw_csv_rows
+
+load_data_escapes = {'N': None, '0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a', '\\': '\\'}
+
+
+def parse_load_data_line(line: str) -> list:
+    """
+    按LOAD DATA（FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'）的规则还原一行，\\N为None
+    """
+    values = []
+    for field in line.rstrip('\n').split('\t'):
+        if field == '\\N':
+            values.append(None)
+        else:
+            values.append(re.sub(r'\\(.)', lambda m: load_data_escapes.get(m.group(1), m.group(1)), field))
+    return values
+
+
+class RecordingCursor:
+    """
+    记录写入暂存表的行：executemany的参数，或LOAD DATA文件还原后的行
+    """
+
+    def __init__(self, tables: dict, statements: list):
+        self.tables = tables
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, args=None):
+        self.statements.append(sql)
+        match = re.search(r'LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE (\w+)', sql)
+        if match:
+            with open(args[0], encoding='utf8') as f:
+                self.tables.setdefault(match.group(1), []).extend(parse_load_data_line(line) for line in f)
+
+    def executemany(self, sql, rows):
+        self.statements.append(sql)
+        table = re.search(r'INSERT (?:IGNORE )?INTO (\w+)', sql).group(1)
+        # pymysql把None转为NULL，其余值转为字符串字面量
+        self.tables.setdefault(table, []).extend([None if value is None else str(value) for value in row]
+                                                 for row in rows)
+
+    def fetchone(self):
+        return 'local_infile', 'ON'
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.tables = {}
+        self.statements = []
+
+    def cursor(self, *args):
+        return RecordingCursor(self.tables, self.statements)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def staged_tables(csv_file: str, load_data: bool) -> dict:
+    connection = RecordingConnection()
+    inserter = StagingInserter(connection, load_data=load_data, run_id='test')
+    for author_name, rows in read_raw_csv_rows(csv_file):
+        inserter.add_rows(inserter.insert_author(author_name, True, 'Professor', 'Uni\tversity'), rows)
+    inserter.flush()
+    return connection.tables
+
+
+def test_load_data_line_writes_null_marker():
+    assert load_data_line((1, None, 'a\tb', 'c\\d')) == '1\t\\N\ta\\tb\tc\\\\d\n'
+
+
+def test_staging_paths_stage_same_rows(tmp_path):
+    csv_file = tmp_path / 'author_disambiguation_article.csv'
+    csv_file.write_text('name,key,title,year,kind,venue,author_count,is_first_author\n'
+                        'Ann Lee,k1,A title,2020,<journal>x,VLDB,3,True\n'
+                        'Ann Lee,k2,,,,,,\n'
+                        'Ann Lee,k3,Back\\slash,2021,<crossref>y,None,,False\n', encoding='utf8')
+    by_insert = staged_tables(str(csv_file), load_data=False)
+    by_load_data = staged_tables(str(csv_file), load_data=True)
+    assert by_load_data == by_insert
+    assert by_insert['stg_paper_test'][1][2:] == [None] * 6
+
+
+def test_staging_tables_are_private_to_each_run():
+    connection = RecordingConnection()
+    first, second = StagingInserter(connection), StagingInserter(connection)
+    assert not set(first.tables.values()) & set(second.tables.values())
+    first.drop_staging_tables()
+    dropped = [sql for sql in connection.statements if sql.startswith('DROP TABLE')]
+    assert dropped == [f'DROP TABLE IF EXISTS {table};' for table in first.tables.values()]
+    assert not any(sql.startswith('DROP TABLE') for sql in connection.statements[:-len(dropped)])
+
+
+def test_cache_warm_keeps_newest_papers(tmp_path):
+    path = str(tmp_path / 'ingest.db')
+    standin_db.create_database(path)
+    connection = standin_db.connect(database=path)
+    with connection.cursor() as cursor:
+        cursor.executemany("INSERT INTO venue(name, kind) VALUES (%s, %s);", [('VLDB', 'journal'), ('SIGMOD', 'conference')])
+        cursor.executemany("INSERT INTO paper(id, title) VALUES (%s, %s);", [(i, f'Paper {i}') for i in range(1, 6)])
+    connection.commit()
+    cache = IngestCache(3)
+    cache.warm(connection)
+    connection.close()
+    assert cache.has_venue('VLDB') and cache.has_venue('SIGMOD')
+    assert [cache.get_paper(f'Paper {i}') for i in range(1, 6)] == [None, None, 3, 4, 5]
+    # 最久未用的论文最先被淘汰
+    cache.get_paper('Paper 3')
+    cache.add_paper('Paper 6', 6)
+    assert cache.get_paper('Paper 4') is None
+    assert [cache.get_paper(f'Paper {i}') for i in (3, 5, 6)] == [3, 5, 6]
+
+
+def test_cache_hits_only_identical_titles():
+    cache = IngestCache(10, max_venues=1)
+    cache.add_paper('Deep Learning', 1)
+    # 大小写、空白不同的写法交给数据库比较
+    assert cache.get_paper('deep learning') is None
+    assert cache.get_paper('Deep Learning ') is None
+    assert cache.get_paper('Deep Learning') == 1
+    cache.add_venue('VLDB')
+    cache.add_venue('vldb')
+    assert not cache.has_venue('VLDB')
+    assert cache.has_venue('vldb')
+
+
+def pending_rows(titles: list) -> list:
+    return [(7, 'VLDB', 'journal', title, '2020', 3, 'FIRST_AUTHOR') for title in titles]
+
+
+def test_flush_skips_venue_and_paper_queries_on_cache_hits():
+    cache = IngestCache(10)
+    cache.add_venue('VLDB')
+    cache.add_paper('A', 11)
+    cache.add_paper('B', 12)
+    connection = RecordingConnection()
+    inserter = BulkInserter(connection, cache=cache, upsert_lock=True)
+    inserter.pending = pending_rows(['A', 'B', 'A'])
+    inserter.flush()
+    # 全部命中缓存：不查询venue、paper，也不需要命名锁
+    assert connection.statements == ["INSERT IGNORE INTO author_paper(aid, pid, contribution) VALUES (%s, %s, %s);"]
+    assert connection.tables['author_paper'] == [['7', '11', 'FIRST_AUTHOR'], ['7', '12', 'FIRST_AUTHOR'],
+                                                 ['7', '11', 'FIRST_AUTHOR']]
+
+
+class PaperCursor(RecordingCursor):
+    """
+    在内存中模拟paper表：INSERT IGNORE INTO paper分配自增id，select_paper_ids的查询按题目查找
+    """
+
+    def __init__(self, connection):
+        super().__init__(connection.tables, connection.statements)
+        self.connection = connection
+        self.result = []
+
+    def execute(self, sql, args=None):
+        super().execute(sql, args)
+        if 'JOIN paper' in sql:
+            pairs = zip(args[::2], args[1::2])
+            self.result = [(i, self.connection.papers[title]) for i, title in pairs if title in self.connection.papers]
+
+    def executemany(self, sql, rows):
+        if 'author_paper' in sql and self.connection.fail_author_paper:
+            raise RuntimeError('connection lost')
+        super().executemany(sql, rows)
+        if 'INTO paper' in sql:
+            for row in rows:
+                self.connection.papers.setdefault(row[0], len(self.connection.papers) + 100)
+
+    def fetchall(self):
+        return self.result
+
+
+class PaperConnection(RecordingConnection):
+    def __init__(self, fail_author_paper: bool = False):
+        super().__init__()
+        self.papers = {}
+        self.fail_author_paper = fail_author_paper
+
+    def cursor(self, *args):
+        return PaperCursor(self)
+
+
+def test_cache_updated_only_after_commit():
+    cache = IngestCache(10)
+    inserter = BulkInserter(PaperConnection(fail_author_paper=True), cache=cache)
+    inserter.pending = pending_rows(['A'])
+    with pytest.raises(RuntimeError):
+        inserter.flush()
+    # 回滚的venue和论文不进入缓存
+    assert not cache.has_venue('VLDB')
+    assert cache.get_paper('A') is None
+
+    connection = PaperConnection()
+    inserter = BulkInserter(connection, cache=cache)
+    inserter.pending = pending_rows(['A'])
+    inserter.flush()
+    assert cache.has_venue('VLDB')
+    assert cache.get_paper('A') == connection.papers['A']
+    # 之后同一篇论文不再查询paper表
+    inserter.pending = pending_rows(['A'])
+    statements = len(connection.statements)
+    inserter.flush()
+    assert connection.statements[statements:] == ["INSERT IGNORE INTO author_paper(aid, pid, contribution) "
+                                                  "VALUES (%s, %s, %s);"]
+
+
+def write_csv(path, title: str) -> str:
+    path.write_text('name,key,title,year,kind,venue,author_count,is_first_author\n'
+                    f'Ann Lee,k1,{title},2020,<journal>x,VLDB,3,True\n', encoding='utf8')
+    return str(path)
+
+
+def test_manifest_skips_only_unchanged_files_done_in_same_database(tmp_path):
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+    done, failed, changed, touched = (write_csv(tmp_path / f'{name}.csv', name)
+                                      for name in ('done', 'failed', 'changed', 'touched'))
+    manifest = IngestManifest(manifest_path, 'host/db')
+    for csv_file in (done, changed, touched):
+        manifest.record(csv_file, 'done')
+    manifest.record(failed, 'failed', 'RuntimeError()')
+    manifest.close()
+
+    write_csv(tmp_path / 'changed.csv', 'CHANGED')  # 大小不变，内容变了
+    os.utime(changed, ns=(10 ** 9, 10 ** 9))  # 文件系统的时间精度较粗时，修改时间也可能没变
+    os.utime(touched, ns=(0, 0))  # 只有修改时间变了
+    manifest = IngestManifest(manifest_path, 'host/db')
+    assert [manifest.is_done(csv_file) for csv_file in (done, failed, changed, touched)] == [True, False, False, True]
+    assert manifest.entries[os.path.abspath(touched)]['mtime'] == 0  # 记录已更新，下次不必再算哈希
+    manifest.close()
+    other = IngestManifest(manifest_path, 'host/other_db')
+    assert not other.is_done(done)
+    other.close()
+
+
+def test_manifest_ignores_half_written_line(tmp_path):
+    manifest_path = tmp_path / 'manifest.jsonl'
+    csv_file = write_csv(tmp_path / 'a.csv', 'a')
+    manifest = IngestManifest(str(manifest_path), 'host/db')
+    manifest.record(csv_file, 'failed', 'x')
+    manifest.record(csv_file, 'done')
+    manifest.close()
+    with open(manifest_path, 'a', encoding='utf8') as f:
+        f.write('{"path": "/data/b.csv", "size": 1')  # 写入时中断
+    manifest = IngestManifest(str(manifest_path), 'host/db')
+    assert manifest.is_done(csv_file)
+    manifest.close()
+    # 重写后每个文件只剩最后一条记录
+    lines = manifest_path.read_text(encoding='utf8').splitlines()
+    assert [json.loads(line)['status'] for line in lines] == ['done']
+
+
+def test_interrupted_bulk_ingest_resumes_from_uncommitted_files(tmp_path):
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+    first, second = write_csv(tmp_path / 'first.csv', 'A'), write_csv(tmp_path / 'second.csv', 'B')
+    manifest = IngestManifest(manifest_path, 'host/db')
+    inserter = BulkInserter(PaperConnection(), batch_size=2, manifest=manifest)
+    inserter.pending = pending_rows(['A', 'A2'])
+    inserter.finish_file(first)  # 攒够一批，提交后记为done
+    inserter.pending = pending_rows(['B'])
+    inserter.finish_file(second)  # 还没有提交
+    manifest.close()  # 进程在此中断
+
+    manifest = IngestManifest(manifest_path, 'host/db')
+    assert manifest.is_done(first)
+    assert not manifest.is_done(second)
+    manifest.close()
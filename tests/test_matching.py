@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/20 10:40
+# @File    : test_matching.py
+from ScholarDataset.matching import TitleMatcher, min_title_score, normalize_title, title_score
+from ScholarDataset.pipelines import is_same_title
+
+expect = 'Deep Residual Learning for Image Recognition'
+
+
+def score(got: str) -> float:
+    return title_score(normalize_title(expect), normalize_title(got))
+
+
+def test_normalize_title_ignores_tags_case_and_punctuation():
+    assert normalize_title('<i>Deep</i> Residual-Learning, for IMAGE recognition 2') == \
+        normalize_title(expect)
+
+
+def test_title_score_tiers():
+    assert score(expect) == 1.0
+    assert min_title_score <= score(expect + ': Extended Version') < 1.0
+    assert 0.8 <= score('On ' + expect + ' and More') < min_title_score
+    assert score('Attention Is All You Need') < 0.8
+    # 题目越完整，前缀得分越高
+    assert score(expect + ' revisited') > score(expect + ': a survey of everything ever written about it')
+
+
+def test_best_picks_highest_score():
+    candidates = [('Deep Residual Learning', 'partial'), (expect + ' (extended)', 'extended'),
+                  (expect, 'exact'), (expect, 'exact again')]
+    assert TitleMatcher(expect).best(candidates) == (1.0, expect, 'exact')
+
+
+def test_best_keeps_first_of_tied_candidates():
+    candidates = [(expect + ' A', 'first'), (expect + ' B', 'second')]
+    best = TitleMatcher(expect).best(candidates)
+    assert best[2] == 'first'
+    assert best[0] == score(expect + ' B')
+
+
+def test_best_returns_none_when_no_candidate_qualifies():
+    candidates = [('Attention Is All You Need', 1), ('', 2), ('<b></b>', 3)]  # 空题目不作为候选
+    assert TitleMatcher(expect).best(candidates) is None
+    assert TitleMatcher(expect).best([]) is None
+
+
+def test_near_miss_needs_fuzzy_matching():
+    near_miss = 'Deep Residual Learning for Image Regognition'  # 拼写不同，不互为前缀
+    assert score(near_miss) >= min_title_score
+    assert TitleMatcher(expect).best([(near_miss, 1)]) is None
+    assert TitleMatcher(expect, fuzzy=True).best([(near_miss, 1)])[2] == 1
+    assert not is_same_title(expect, near_miss)
+    assert is_same_title(expect, near_miss, fuzzy=True)
+
+
+def test_is_same_title_keeps_prefix_semantics():
+    assert is_same_title(expect, expect.upper() + '.')
+    assert is_same_title(expect, 'Deep Residual Learning')
+    assert is_same_title(expect, '')
+    assert not is_same_title(expect, 'On ' + expect)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 10:30
+# @File    : test_middlewares.py
+import gzip
+from types import SimpleNamespace
+import pytest
+from scrapy import Request
+from scrapy.core.downloader.middleware import DownloaderMiddlewareManager
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+from ScholarDataset.middlewares import AdaptiveRateMiddleware, SourceBudget
+
+
+def process_response(request, response):
+    """
+    按项目设置的DOWNLOADER_MIDDLEWARES顺序依次调用各中间件的process_response，直到某个中间件返回请求
+    """
+    settings = Settings()
+    settings.setmodule('ScholarDataset.settings')
+    settings.set('TWISTED_REACTOR', None)  # 不启动下载器，不需要特定的reactor
+    crawler = get_crawler(Spider, settings.copy_to_dict())
+    manager = DownloaderMiddlewareManager.from_crawler(crawler)
+    slot = SimpleNamespace(delay=2.0, concurrency=1)
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={'acm': slot}))
+    spider = Spider('acm')
+    for method in manager.methods['process_response']:
+        response = method(request=request, response=response, spider=spider)
+        if isinstance(response, Request):
+            break
+    return crawler, slot, response
+
+
+def test_captcha_detected_in_compressed_response():
+    body = gzip.compress(b'<html><body><div class="g-recaptcha"></div></body></html>')
+    request = Request('https://dl.acm.org/doi/10.1145/1')
+    response = HtmlResponse(request.url, body=body, request=request,
+                            headers={'Content-Encoding': 'gzip', 'Content-Type': 'text/html'})
+    crawler, slot, result = process_response(request, response)
+    assert isinstance(result, Request) and result.meta['captcha_retries'] == 1
+    assert crawler.stats.get_value('rate_control/acm/captchas') == 1
+    assert crawler.stats.get_value('rate_control/acm/backoffs') == 1
+    assert slot.delay > 2.0
+
+
+def test_runs_between_retry_and_compression():
+    priorities = Settings()
+    priorities.setmodule('ScholarDataset.settings')
+    priority = priorities.getdict('DOWNLOADER_MIDDLEWARES')['ScholarDataset.middlewares.AdaptiveRateMiddleware']
+    assert 550 < priority < 590
+    assert AdaptiveRateMiddleware.is_captcha(HtmlResponse('https://dl.acm.org', body=b'<html>ok</html>')) is False
+
+
+source_config = {'domains': ['dl.acm.org'], 'concurrency': 1, 'delay': 2, 'max_concurrency': 3, 'min_delay': 0.5,
+                 'max_delay': 10}
+
+
+def test_budget_increases_additively_and_decreases_multiplicatively():
+    budget = SourceBudget('acm', source_config)
+    assert (budget.rate, budget.concurrency) == (0.5, 1)
+    for _ in range(20):
+        budget.increase(0.25)
+    assert (budget.rate, budget.concurrency) == (2.0, 3)  # 不超过1/min_delay和max_concurrency
+    budget.decrease()
+    assert (budget.rate, budget.concurrency) == (1.0, 1)
+    budget.decrease(min_interval=4)  # Retry-After: 4
+    assert budget.rate == 0.25
+    for _ in range(5):
+        budget.decrease()
+    assert (budget.rate, budget.concurrency) == (0.1, 1)  # 不低于1/max_delay
+    assert budget.matches('dl.acm.org') and budget.matches('www.dl.acm.org')
+    assert not budget.matches('evil-dl.acm.org')
+
+
+def rate_middleware(window: int = 4):
+    settings = Settings()
+    settings.set('TWISTED_REACTOR', None)
+    crawler = get_crawler(Spider, settings.copy_to_dict())
+    slot = SimpleNamespace(delay=2.0, concurrency=1)
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={'acm': slot}))
+    middleware = AdaptiveRateMiddleware(crawler, {'acm': source_config}, window=window, target_latency=5.0,
+                                        max_error_rate=0.25, rate_step=0.25, max_captcha_retries=3)
+    return middleware, crawler.stats, slot
+
+
+def respond(middleware, status: int = 200, latency: float = 1.0, headers: dict = None, url='https://dl.acm.org/doi/1'):
+    request = Request(url, meta={'download_latency': latency})
+    response = HtmlResponse(url, status=status, body=b'<html>ok</html>', request=request, headers=headers)
+    return middleware.process_response(request, response, Spider('acm'))
+
+
+def test_window_adjusts_slot():
+    middleware, stats, slot = rate_middleware()
+    budget = middleware.budgets[0]
+    for _ in range(3):
+        respond(middleware)
+    assert slot.delay == 2.0  # 窗口未满，不调整
+    respond(middleware)
+    assert (budget.rate, slot.concurrency, slot.delay) == (0.75, 2, pytest.approx(1 / 0.75))
+    assert stats.get_value('rate_control/acm/rate') == 0.75
+    # 一个窗口内出错率不超过max_error_rate仍算正常
+    respond(middleware, status=500)
+    for _ in range(3):
+        respond(middleware)
+    assert (budget.rate, slot.concurrency) == (1.0, 3)
+    # 平均延迟超过target_latency的窗口减半
+    for _ in range(4):
+        respond(middleware, latency=8.0)
+    assert (budget.rate, slot.concurrency) == (0.5, 1)
+    assert stats.get_value('rate_control/acm/backoffs') == 1
+
+
+def test_download_errors_count_against_window():
+    middleware, stats, slot = rate_middleware()
+    for _ in range(2):
+        respond(middleware)
+    for _ in range(2):
+        request = Request('https://dl.acm.org/doi/2', meta={'download_latency': 1.0})
+        assert middleware.process_exception(request, TimeoutError(), Spider('acm')) is None
+    assert middleware.budgets[0].rate == 0.25  # 错误率0.5
+    assert stats.get_value('rate_control/acm/backoffs') == 1
+
+
+def test_throttle_response_backs_off_immediately():
+    middleware, stats, slot = rate_middleware()
+    for _ in range(3):
+        respond(middleware)
+    response = respond(middleware, status=429, headers={'Retry-After': '8'})
+    assert response.status == 429  # 交给RetryMiddleware重试
+    budget = middleware.budgets[0]
+    assert (budget.rate, slot.delay) == (0.125, 8.0)
+    assert budget.responses == 0  # 限流后重新开始一个窗口
+    assert stats.get_value('rate_control/acm/backoffs') == 1
+    # 其他网站的响应不影响该来源
+    respond(middleware, status=503, url='https://example.org/')
+    assert (budget.rate, stats.get_value('rate_control/acm/backoffs')) == (0.125, 1)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/20 09:30
+# @File    : test_pipelines.py
+import copy
+import pytest
+from benchmarks import standin_db
+from ScholarDataset.pipelines import Author, WebOfSciencePipeline, update_sql_from_author_list
+
+
+def update_row_by_row(conn, author_list, paper_id):
+    """
+    改为批量之前的update_sql_from_author_list：逐个作者查询、插入、UPDATE，作为对照
+    """
+    with conn.cursor() as cursor:
+        for author in author_list:
+            if not author.researcher_id:
+                continue
+            cursor.execute("SELECT id FROM author WHERE rid = %s AND email = %s AND university = %s AND college = %s "
+                           "AND lab = %s;",
+                           (author.researcher_id, author.email, author.university, author.college, author.lab))
+            result = cursor.fetchone()
+            if not result:
+                cursor.execute("SELECT need_disambiguation FROM author WHERE rid = %s;", (author.researcher_id,))
+                need_disambiguation = cursor.fetchone()[0]
+                cursor.execute("INSERT INTO author(rid, email, university, college, lab, need_disambiguation) "
+                               "VALUES (%s, %s, %s, %s, %s, %s);",
+                               (author.researcher_id, author.email, author.university, author.college, author.lab,
+                                need_disambiguation))
+                author_id = cursor.lastrowid
+            else:
+                author_id = result[0]
+            cursor.execute("SELECT contribution FROM author_paper WHERE (aid = %s OR aid = %s) AND pid = %s;",
+                           (author.researcher_id, author_id, paper_id))
+            current_contribution = cursor.fetchone()[0]
+            if current_contribution != 'PAPER_AUTHOR':
+                author.contribution = current_contribution
+            cursor.execute("UPDATE author_paper SET aid = %s, contribution = %s WHERE aid = %s AND pid = %s;",
+                           (author_id, author.contribution, author.researcher_id, paper_id))
+    conn.commit()
+
+
+def make_author(rid, email='', contribution='PAPER_AUTHOR', university='') -> Author:
+    author = Author()
+    author.researcher_id = rid
+    author.email = email
+    author.contribution = contribution
+    author.university = university
+    return author
+
+
+def create_database(path, authors: list, author_papers: list):
+    standin_db.create_database(str(path))
+    conn = standin_db.connect(str(path))
+    with conn.cursor() as cursor:
+        for rid in range(1, 5):
+            cursor.execute("INSERT INTO researcher(id, name) VALUES (%s, %s);", (rid, f'Researcher {rid}'))
+        for row in authors:
+            cursor.execute("INSERT INTO author(id, rid, email, need_disambiguation) VALUES (%s, %s, %s, %s);", row)
+        for row in author_papers:
+            cursor.execute("INSERT INTO author_paper(aid, pid, contribution) VALUES (%s, %s, %s);", row)
+    conn.commit()
+    return conn
+
+
+def dump(conn) -> tuple:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT id, rid, email, university, need_disambiguation FROM author ORDER BY id;")
+        authors = cursor.fetchall()
+        cursor.execute("SELECT aid, pid, contribution FROM author_paper ORDER BY pid, aid;")
+        return authors, cursor.fetchall()
+
+
+def run_both(tmp_path, authors, author_papers, author_list, paper_id):
+    results = []
+    for name, update in (('row', update_row_by_row), ('batch', update_sql_from_author_list)):
+        conn = create_database(tmp_path / f'{name}.db', authors, author_papers)
+        author_list_ = copy.deepcopy(author_list)
+        update(conn, author_list_, paper_id)
+        results.append((dump(conn), [author.contribution for author in author_list_]))
+        conn.close()
+    return results
+
+
+# 作者1需要消歧，已有作者101（rid=2，邮箱b@x）；author_paper的aid最初为researcher id
+authors = [(100, 1, '', 1), (101, 2, 'b@x', 0), (102, 2, '', 0), (103, 3, '', 1)]
+
+
+def test_batch_update_matches_row_by_row(tmp_path):
+    author_papers = [(1, 7, 'FIRST_AUTHOR'), (2, 7, 'PAPER_AUTHOR'), (3, 7, 'CORRESPONDING_AUTHOR'),
+                     (101, 8, 'FIRST_AUTHOR')]
+    author_list = [make_author(1, 'a@x', 'PAPER_AUTHOR', 'Uni'),  # 新作者，need_disambiguation沿用rid=1的
+                   make_author(2, 'b@x'),  # 沿用已有的作者101
+                   make_author(None, 'x@x'),  # 没有rid，忽略
+                   make_author(3, '', 'FIRST_AUTHOR')]  # 已有贡献不是PAPER_AUTHOR时沿用
+    row, batch = run_both(tmp_path, authors, author_papers, author_list, 7)
+    assert batch == row
+    assert row[1] == ['FIRST_AUTHOR', 'PAPER_AUTHOR', 'PAPER_AUTHOR', 'CORRESPONDING_AUTHOR']
+
+
+def test_already_updated_paper_is_unchanged(tmp_path):
+    author_papers = [(101, 8, 'FIRST_AUTHOR')]
+    row, batch = run_both(tmp_path, authors, author_papers, [make_author(2, 'b@x')], 8)
+    assert batch == row
+    assert row[0][1] == [(101, 8, 'FIRST_AUTHOR')]
+
+
+def test_author_ids_overlapping_researcher_ids(tmp_path):
+    # author id与researcher id取值范围重叠：author 1、2分别属于researcher 4、1
+    authors_ = [(1, 4, 'd@x', 0), (2, 1, '', 0), (3, 2, '', 0)]
+    author_papers = [(1, 9, 'FIRST_AUTHOR'), (2, 9, 'PAPER_AUTHOR')]
+    author_list = [make_author(1, 'e@x'), make_author(2, '')]  # rid=1 -> 新作者4；rid=2 -> 已有作者3
+    row, batch = run_both(tmp_path, authors_, author_papers, author_list, 9)
+    assert batch == row
+
+
+@pytest.mark.parametrize('order', [[1, 2], [2, 1]])
+def test_chained_aids(tmp_path, order):
+    # rid=2的作者对应author id 1，恰好是rid=1的作者修改前的aid
+    authors_ = [(1, 2, 'b@x', 0), (5, 1, '', 0), (6, 2, '', 0)]
+    author_papers = [(1, 9, 'FIRST_AUTHOR'), (2, 9, 'PAPER_AUTHOR')]
+    author_list = [make_author(1, 'a@x') if rid == 1 else make_author(2, 'b@x') for rid in order]
+    results = []
+    for name, update in (('row', update_row_by_row), ('batch', update_sql_from_author_list)):
+        conn = create_database(tmp_path / f'{name}.db', authors_, author_papers)
+        try:
+            update(conn, copy.deepcopy(author_list), 9)
+            results.append(dump(conn))
+        except Exception as e:  # 逐条执行会违反主键约束的顺序，批量执行也必须同样失败
+            results.append(type(e).__name__)
+        conn.close()
+    assert results[1] == results[0]
+
+
+def test_batch_update_is_one_statement(tmp_path, monkeypatch):
+    conn = create_database(tmp_path / 'count.db', authors, [(1, 7, 'FIRST_AUTHOR'), (2, 7, 'PAPER_AUTHOR'),
+                                                           (3, 7, 'PAPER_AUTHOR')])
+    statements = []
+    execute = standin_db.Cursor.execute
+    monkeypatch.setattr(standin_db.Cursor, 'execute',
+                        lambda self, sql, args=None: statements.append(sql) or execute(self, sql, args))
+    update_sql_from_author_list(conn, [make_author(1, 'a@x'), make_author(2, 'b@x'), make_author(3)], 7)
+    assert len([sql for sql in statements if sql.startswith('UPDATE')]) == 1
+
+
+def wos_record(emails: str) -> dict:
+    return {'Article Title': 'A Title', 'Authors': 'Lee, A; Kim, B', 'Author Full Names': 'Lee, Ann; Kim, Bo',
+            'Email Addresses': emails, 'Addresses': '[Lee, Ann; Kim, Bo] Univ A, Dept B, City, Country',
+            'Reprint Addresses': 'Lee, A (corresponding author), Univ A'}
+
+
+def test_wos_missing_email_matches_existing_rows():
+    pipeline = WebOfSciencePipeline(connection_config={'database': ':memory:'})
+    author_list = pipeline.init_author_list(wos_record(''))
+    # 与之前读取Excel时str(NaN)的结果相同，select_author_ids才能匹配到已导入的作者
+    assert [author.email for author in author_list] == ['nan', '']
+    author_list = pipeline.init_author_list(wos_record('ann@a.edu'))
+    assert [author.email for author in author_list] == ['ann@a.edu', '']
+    assert [author.contribution for author in author_list] == ['CORRESPONDING_AUTHOR', 'PAPER_AUTHOR']
+    assert author_list[1].university == 'Univ A'
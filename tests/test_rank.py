@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 17:10
+# @File    : test_rank.py
+import json
+import os
+import random
+import sys
+import pandas as pd
+import pytest
+
+rank_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rank')
+sys.path.insert(0, rank_dir)
+from rank import RankIndex, TrigramIndex, achievement_columns, annotate_achievements, build_rank_db, \
+    normalize_venue, trigrams  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def rank_index(tmp_path_factory):
+    """
+    用仓库中的分区表编译到临时文件，不改动rank/rank.db
+    """
+    db_file = str(tmp_path_factory.mktemp('rank') / 'rank.db')
+    build_rank_db(rank_dir, db_file)
+    return RankIndex(db_file, rank_dir)
+
+
+def sample_venues(rng: random.Random) -> list:
+    """
+    :return: 分区表中的Venue名称及其大小写、缩写变体，另加查不到的名称和缺失值
+    """
+    venues = []
+    for file in ('jcr_2019.json', 'cas_2017.json'):
+        with open(os.path.join(rank_dir, file), encoding='utf8') as f:
+            names = list(json.load(f))
+        venues.extend(rng.sample(names, 30))
+    ccf = pd.read_csv(os.path.join(rank_dir, 'ccf_2019.csv'), header=0, index_col=[0]).fillna('')
+    for row in ccf.sample(30, random_state=rng.randrange(1000)).itertuples():
+        venues.extend([row.Index, row.DBLP简称, row.CCF简称.lower(), row.全称])
+    venues.extend([venue.upper() for venue in venues[:10]] + [venue.lower() for venue in venues[10:20]])
+    venues.extend(['IEEE Trans. on Pattern Analysis & Machine Intelligence', 'Jornal of Machine Lerning Research',
+                   'Proceedings of an Unknown Workshop', '', None, float('nan')])
+    return venues
+
+
+def test_join_matches_per_row_lookup(rank_index):
+    rng = random.Random(0)
+    venues = sample_venues(rng)
+    # 覆盖早于所有版本、各版本之间和晚于所有版本的年份
+    rows = [(f'title {i}', 'FIRST_AUTHOR', venue, 'journal', str(rng.randint(2010, 2023)))
+            for i, venue in enumerate(venues * 3)]
+    achievements = pd.DataFrame(rows, columns=achievement_columns)
+    joined = annotate_achievements(achievements, rank_index)
+    for (_, _, venue, _, year), jcr, cas, ccf in zip(rows, joined['汤森路透分区'], joined['中科院分区'], joined['CCF']):
+        assert jcr == rank_index.get_jcr(venue, year), (venue, year)
+        assert cas == rank_index.get_cas(venue, year), (venue, year)
+        assert ccf == rank_index.get_ccf(venue, year), (venue, year)
+    # 确实查到了分区，而不是两边都为空
+    assert sum(1 for jcr in joined['汤森路透分区'] if jcr) > 30
+    assert sum(1 for ccf in joined['CCF'] if ccf) > 30
+
+
+def test_join_keeps_row_order_and_other_columns(rank_index):
+    achievements = pd.DataFrame([('b', 'PAPER_AUTHOR', 'Unknown Venue', 'conference', '2019'),
+                                 ('a', 'FIRST_AUTHOR', 'IEEE Trans on Pattern Analysis and Machine Intelligence',
+                                  'journal', '2018')],
+                                columns=achievement_columns, index=[7, 3])
+    joined = annotate_achievements(achievements, rank_index)
+    assert list(joined['title']) == ['b', 'a']
+    assert list(joined['contribution']) == ['PAPER_AUTHOR', 'FIRST_AUTHOR']
+    assert joined['CCF'][0] == {}
+    assert joined['CCF'][1]['CCF Abbr'] == 'TPAMI'
+
+
+@pytest.mark.parametrize('venue, key', [
+    ('IEEE Trans. on Pattern Analysis & Machine Intelligence', 'ieeetransactionspatternanalysismachineintelligence'),
+    ('IEEE Transactions on Pattern Analysis and Machine Intelligence',
+     'ieeetransactionspatternanalysismachineintelligence'),
+    ('J. Mach. Learn. Res.', 'journalmachinelearnresearch'),
+    ('Proc. of the Int. Conf. on Data Eng.', 'proceedingsinternationalconferencedataengineering'),
+    ('ACM SIGMOD', 'acmsigmod'),
+    ('2021', ''),
+])
+def test_normalize_venue(venue, key):
+    assert normalize_venue(venue) == key
+
+
+def brute_force_match(keys: list, key: str, threshold: float) -> str:
+    """
+    与所有键逐一计算Dice系数
+    """
+    query = trigrams(key)
+    best_key, best_score = '', threshold
+    for candidate in sorted(keys):
+        grams = trigrams(candidate)
+        score = 2 * len(query & grams) / (len(query) + len(grams))
+        if score > best_score or (score == best_score and not best_key):
+            best_key, best_score = candidate, score
+    return best_key
+
+
+def misspell(key: str, rng: random.Random) -> str:
+    """
+    :return: 随机删除、替换或交换一两个字母后的键
+    """
+    chars = list(key)
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars) - 1)
+        operation = rng.choice(('delete', 'replace', 'swap'))
+        if operation == 'delete':
+            del chars[i]
+        elif operation == 'replace':
+            chars[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        else:
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+
+@pytest.mark.parametrize('threshold', [0.6, 0.8, 0.9])
+def test_trigram_index_matches_brute_force(rank_index, threshold):
+    keys = [row[0] for row in rank_index.connection().execute("SELECT DISTINCT venue FROM jcr WHERE kind = 'norm';")]
+    index = TrigramIndex(keys)
+    rng = random.Random(threshold)
+    queries = [misspell(key, rng) for key in rng.sample(keys, 150)] + rng.sample(keys, 20) + ['x', 'zzzzqqqq']
+    for query in queries:
+        assert index.best_match(query, threshold) == brute_force_match(keys, query, threshold), query
+
+
+def test_fuzzy_venue_match(rank_index):
+    venue = 'IEEE Transactions on Patern Analysis and Machine Inteligence'  # 拼写错误
+    assert rank_index.get_jcr(venue, '2019') == rank_index.get_jcr('IEEE Transactions on Pattern Analysis and '
+                                                                   'Machine Intelligence', '2019') != {}
+    assert rank_index.get_ccf(venue, '2019')['CCF Abbr'] == 'TPAMI'
+    assert rank_index.get_jcr('Journal of Something Else Entirely', '2019') == {}
+    # 关闭近似匹配时只认规范键完全相同的名称
+    exact_index = RankIndex(rank_index.db_file, rank_dir, fuzzy_threshold=None)
+    assert exact_index.get_jcr(venue, '2019') == {}
+    assert exact_index.get_jcr('IEEE Trans. on Pattern Analysis & Machine Intelligence', '2019') != {}
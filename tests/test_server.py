@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 17:50
+# @File    : test_server.py
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rank'))
+import server  # noqa: E402
+from server import RankCache, RankService  # noqa: E402
+
+
+def test_cache_hit_requires_same_fingerprint():
+    cache = RankCache(4)
+    cache.put(3, (2, 100), b'first')
+    assert cache.get(3, (2, 100)) == b'first'
+    # author_paper有变化，结果失效并被删除，之后即使指纹变回来也不再命中
+    assert cache.get(3, (3, 250)) is None
+    assert cache.get(3, (2, 100)) is None
+    assert cache.get(4, (2, 100)) is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = RankCache(2)
+    cache.put(1, (1, 1), b'1')
+    cache.put(2, (1, 2), b'2')
+    assert cache.get(1, (1, 1)) == b'1'  # 1变为最近使用
+    cache.put(3, (1, 3), b'3')
+    assert cache.get(2, (1, 2)) is None
+    assert cache.get(1, (1, 1)) == b'1'
+    assert cache.get(3, (1, 3)) == b'3'
+    cache.put(1, (2, 5), b'1 again')  # 覆盖已有的条目不淘汰其他条目
+    assert cache.get(3, (1, 3)) == b'3'
+    assert cache.get(1, (2, 5)) == b'1 again'
+
+
+class SingleConnectionPool:
+    @contextmanager
+    def connection(self):
+        yield 'connection'
+
+
+def test_service_recomputes_only_when_author_paper_changes(monkeypatch):
+    fingerprints = {3: (2, 100)}
+    computed = []
+
+    def get_rank_dict(rid, connection):
+        computed.append(rid)
+        return {'Researcher Name': ('R',), 'Achievements': [len(computed)]} if rid in fingerprints else None
+
+    monkeypatch.setattr(server, 'author_paper_fingerprint', lambda connection, rid: fingerprints.get(rid, (0, 0)))
+    monkeypatch.setattr(server, 'get_rank_dict', get_rank_dict)
+    service = RankService.__new__(RankService)
+    service.pool = SingleConnectionPool()
+    service.cache = RankCache(8)
+
+    first = service.get_rank(3)
+    assert json.loads(first)['Achievements'] == [1]
+    assert service.get_rank(3) == first
+    assert computed == [3]
+    fingerprints[3] = (3, 180)  # 新增了一条author_paper
+    assert json.loads(service.get_rank(3))['Achievements'] == [2]
+    assert computed == [3, 3]
+    # 不存在的researcher不缓存
+    assert service.get_rank(5) is None
+    assert service.get_rank(5) is None
+    assert computed == [3, 3, 5, 5]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/20 11:30
+# @File    : test_update_mysql.py
+from benchmarks import standin_db
+from ScholarDataset.archive import ResponseArchive
+from update_mysql import select_archived_papers
+
+
+def test_replay_selects_every_archived_paper(tmp_path):
+    standin_db.create_database(str(tmp_path / 'db.sqlite'))
+    connection = standin_db.connect(str(tmp_path / 'db.sqlite'))
+    with connection.cursor() as cursor:
+        for paper_id in range(1, 6):
+            cursor.execute("INSERT INTO paper(id, title) VALUES (%s, %s);", (paper_id, f'Paper {paper_id}'))
+    archive = ResponseArchive(str(tmp_path / 'archive'))
+    # 论文1、2、4已经处理过也要重放；论文9已从数据库中删除；IEEExplore的存档不属于ACM
+    for paper_id in (4, 1, 2, 1, 9):
+        archive.put('ACM', f'Paper {paper_id}', paper_id, f'<html>{paper_id}</html>')
+    archive.put('IEEExplore', 'Paper 3', 3, {'title': 'Paper 3'})
+    archive.close()
+    with connection.cursor() as cursor:
+        batches = list(select_archived_papers(cursor, 'ACM', 2, str(tmp_path / 'archive')))
+    assert batches == [{1: 'Paper 1', 2: 'Paper 2'}, {4: 'Paper 4'}]
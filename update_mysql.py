@@ -10,6 +10,8 @@ import logging
 import pymysql
 import json
 import argparse
+from ScholarDataset.archive import ResponseArchive
+from ScholarDataset.spiders.replay import ArchiveReplaySpider
 
 configure_logging()
 runner = CrawlerRunner(get_project_settings())
@@ -23,6 +25,42 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
+def select_unprocessed_papers(cursor, crawler_name: str, crawler_paper_count: int):
+    """
+    :return: 每次产生一批{paper_id: paper_title}：作者还没有邮箱、机构信息的论文，wos爬虫只爬期刊，其他爬虫都爬
+    """
+    sql = \
+        "SELECT id, title FROM paper WHERE venue in (SELECT name FROM venue WHERE kind='journal') " \
+        "and id IN (SELECT pid FROM author_paper WHERE aid in " \
+        "(SELECT id FROM author WHERE email='' AND university='' AND college='' AND lab=''));" \
+            if crawler_name == 'WebOfScience' else \
+            "SELECT id, title FROM paper WHERE id IN (SELECT pid FROM author_paper " \
+            "WHERE aid in (SELECT id FROM author WHERE email='' AND university='' AND college='' AND lab=''));"
+    cursor.execute(sql)
+    result = cursor.fetchmany(crawler_paper_count)
+    while result:
+        yield {paper_id: paper_title for paper_id, paper_title in result}
+        result = cursor.fetchmany(crawler_paper_count)
+
+
+def select_archived_papers(cursor, crawler_name: str, crawler_paper_count: int, replay_dir: str):
+    """
+    :return: 每次产生一批{paper_id: paper_title}：存档中有该爬虫内容的所有论文，不论是否已经处理过，
+        这样修改了解析或匹配逻辑后可以重新处理整个语料
+    """
+    entries = ResponseArchive(replay_dir).load_index(crawler_name).values()
+    paper_ids = sorted({entry['paper_id'] for entry in entries if entry.get('paper_id') is not None})
+    if not paper_ids:
+        logger.warning(f'{replay_dir}中没有{crawler_name}的存档')
+    for start in range(0, len(paper_ids), crawler_paper_count):
+        # 题目以数据库为准，已删除的论文不再重放
+        cursor.execute("SELECT id, title FROM paper WHERE id IN %s ORDER BY id;",
+                       (paper_ids[start: start + crawler_paper_count],))
+        query_list = {paper_id: paper_title for paper_id, paper_title in cursor.fetchall()}
+        if query_list:
+            yield query_list
+
+
 @defer.inlineCallbacks
 def update_mysql(args):
     crawler_paper_count = args.crawler_paper_count
@@ -33,28 +71,20 @@ def update_mysql(args):
                          password=connection_config['password'],
                          database=connection_config['database']) as connection:
         with connection.cursor() as cursor:
-            # wos爬虫只爬期刊，其他爬虫都爬
-            sql = \
-                "SELECT id, title FROM paper WHERE venue in (SELECT name FROM venue WHERE kind='journal') " \
-                "and id IN (SELECT pid FROM author_paper WHERE aid in " \
-                "(SELECT id FROM author WHERE email='' AND university='' AND college='' AND lab=''));" \
-                    if crawler_name == 'WebOfScience' else \
-                    "SELECT id, title FROM paper WHERE id IN (SELECT pid FROM author_paper " \
-                    "WHERE aid in (SELECT id FROM author WHERE email='' AND university='' AND college='' AND lab=''));"
-            cursor.execute(sql)
-
-            result = cursor.fetchmany(crawler_paper_count)
-            while result:
-                query_list = {}
-                for i in result:
-                    paper_id = i[0]
-                    paper_title = i[1]
-                    query_list[paper_id] = paper_title
+            if args.replay_dir:
+                query_lists = select_archived_papers(cursor, crawler_name, crawler_paper_count, args.replay_dir)
+            else:
+                query_lists = select_unprocessed_papers(cursor, crawler_name, crawler_paper_count)
+            for query_list in query_lists:
                 try:
-                    yield runner.crawl(crawler_name, query_list=query_list)
+                    if args.replay_dir:
+                        # 离线重放：用存档的原始内容代替下载
+                        yield runner.crawl(ArchiveReplaySpider, name=crawler_name, query_list=query_list,
+                                           archive_dir=args.replay_dir)
+                    else:
+                        yield runner.crawl(crawler_name, query_list=query_list)
                 except SystemExit:
                     logger.error(f'发生了{crawler_name}爬虫错误，请检查该文件夹内爬虫日志文件')
-                result = cursor.fetchmany(crawler_paper_count)
 
     reactor.stop()
 
@@ -64,6 +94,8 @@ if __name__ == '__main__':
     ap.add_argument('--paper_count', help='爬虫每次爬取的论文数', dest='crawler_paper_count', type=int, default=150)
     ap.add_argument('--crawler_name', help='爬虫名称，只能为WebOfScience/ACM/IEEExplore', dest='crawler_name', type=str, required=True,
                     choices=['WebOfScience', 'ACM', 'IEEExplore'])
+    ap.add_argument('--replay_dir', help='不访问网络，用该目录中存档的原始内容（settings.py中的ARCHIVE_DIR）重新处理存档中的所有论文',
+                    dest='replay_dir', type=str, default=None)
     args = ap.parse_args()
     update_mysql(args=args)
     reactor.run()